@@ -0,0 +1,417 @@
+import asyncio
+import math
+import os
+import random
+import struct
+import time
+import uuid
+
+from redis.exceptions import RedisError
+
+from app.catalog import namespaced
+from app.local_cache import LocalCache
+from app.locks import RELEASE_LOCK_SCRIPT
+from app.logger_setup import logger
+from app.metrics import count_cache, timed
+from app.rate_limiter import charge_miss
+from app.resilience import current_deadline, degraded, remaining_time
+from app.utils import get_redis_binary_client
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+# Expired entries stay in Redis this much longer; they are served while
+# the search engine is degraded, a refresh is running or a refresh fails
+CACHE_STALE_SECONDS = int(os.getenv("CACHE_STALE_SECONDS", "600"))
+# How long a worker may hold the fill lock for a key
+CACHE_LOCK_TTL_MS = int(os.getenv("CACHE_LOCK_TTL_MS", "5000"))
+CACHE_LOCK_POLL_SECONDS = float(os.getenv("CACHE_LOCK_POLL_SECONDS", "0.05"))
+# XFetch beta; higher refreshes earlier, 0 disables probabilistic early refresh
+CACHE_EARLY_REFRESH_BETA = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+
+# Entries are prefixed with the time it took to compute them (milliseconds)
+ENTRY_HEADER = struct.Struct("<I")
+# Pub/sub channel carrying keys to drop from every worker's L1 ("*" = all)
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+def encode_entry(payload: bytes, compute_ms: int) -> bytes:
+    return ENTRY_HEADER.pack(min(compute_ms, 0xFFFFFFFF)) + payload
+
+
+def decode_entry(entry: bytes):
+    """
+    Splits a stored entry into (payload, compute time in milliseconds).
+    """
+    (compute_ms,) = ENTRY_HEADER.unpack_from(entry)
+    return entry[ENTRY_HEADER.size :], compute_ms
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within a process: the first
+    caller runs the function, later callers await the same task.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded so one cancelled caller does not cancel the shared work
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+single_flight = SingleFlight()
+# L1 in front of Redis (L2), keyed the same way
+local_cache = LocalCache()
+l2_stats = {"hits": 0, "misses": 0}
+
+
+def cache_stats():
+    """
+    Hit/miss/eviction counters per cache tier.
+    """
+    return {
+        "l1": {
+            **local_cache.stats,
+            "entries": len(local_cache),
+            "bytes": local_cache.size,
+        },
+        "l2": dict(l2_stats),
+    }
+
+
+def _remember(key, payload, ttl_seconds, compute_ms):
+    expires_at = time.monotonic() + ttl_seconds
+    local_cache.set(key, payload, ttl_seconds, (expires_at, compute_ms))
+
+
+def should_refresh_early(compute_ms, ttl_ms, beta=CACHE_EARLY_REFRESH_BETA):
+    """
+    Probabilistic early expiration (XFetch): the closer an entry is to
+    expiry, and the longer it took to compute, the likelier a refresh.
+    """
+    if not beta or compute_ms <= 0 or ttl_ms <= 0:
+        return False
+    return -compute_ms * beta * math.log(1.0 - random.random()) >= ttl_ms
+
+
+async def _read(key):
+    pipe = get_redis_binary_client().pipeline(transaction=False)
+    pipe.get(key)
+    pipe.pttl(key)
+    entry, ttl_ms = await pipe.execute()
+    return entry, ttl_ms
+
+
+async def _wait_for_fill(key):
+    """
+    Polls for the value another worker is computing, for at most one lock
+    TTL or until the request deadline.
+    """
+    wait = CACHE_LOCK_TTL_MS / 1000
+    remaining = remaining_time()
+    deadline = time.monotonic() + (wait if remaining is None else min(wait, remaining))
+    redis = get_redis_binary_client()
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_LOCK_POLL_SECONDS)
+        entry = await redis.get(key)
+        if entry is not None:
+            return decode_entry(entry)[0]
+        if not await redis.exists(f"lock:{key}"):
+            return None
+    return None
+
+
+async def _fill(key, compute, ttl, wait=True, stale=None):
+    """
+    Computes and stores `key` under its fill lock. Without the lock, waits
+    for the worker holding it if `wait`, or returns `stale` if given.
+    """
+    redis = get_redis_binary_client()
+    token = uuid.uuid4().hex
+    try:
+        locked = await redis.set(f"lock:{key}", token, nx=True, px=CACHE_LOCK_TTL_MS)
+    except RedisError as e:
+        logger.warning(f"Cache lock failed for {key}: {e}")
+        locked = None
+    if not locked and stale is not None:
+        return stale
+    if not locked and wait:
+        try:
+            payload = await _wait_for_fill(key)
+        except RedisError:
+            payload = None
+        if payload is not None:
+            return payload
+    elif not locked:
+        return None
+
+    try:
+        started = time.monotonic()
+        payload = await compute()
+        compute_ms = int((time.monotonic() - started) * 1000)
+        if payload is not None:
+            _remember(key, payload, ttl, compute_ms)
+            try:
+                with timed("cache_set"):
+                    await redis.set(
+                        key,
+                        encode_entry(payload, compute_ms),
+                        ex=ttl + CACHE_STALE_SECONDS,
+                    )
+            except RedisError as e:
+                logger.warning(f"Cache write failed for {key}: {e}")
+        return payload
+    finally:
+        if locked:
+            try:
+                await redis.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+            except RedisError:
+                pass
+
+
+# Keeps early-refresh tasks referenced until they finish
+_background = set()
+
+
+async def _refresh(key, compute, ttl):
+    # Runs in its own task: not bound by the deadline of the request that
+    # triggered it
+    current_deadline.set(None)
+    logger.info(
+        "Refreshing ahead of expiry", extra={"event": "cache_refresh", "key": key}
+    )
+    try:
+        await single_flight.do(key, lambda: _fill(key, compute, ttl, wait=False))
+    except Exception as e:
+        logger.warning(f"Early refresh failed for {key}: {e}")
+
+
+async def cached(key, compute, ttl=CACHE_TTL):
+    """
+    Returns the cached bytes for `key`, computing them with `compute()` on a
+    miss. `compute` returns bytes, or None for results that must not be
+    cached.
+
+    Hits are served from the in-process L1 when possible, then from Redis.
+    Concurrent misses in this process share one computation, and a short
+    Redis lock makes other workers wait for that result instead of
+    recomputing it. Hot entries are refreshed in the background shortly
+    before they expire; expired ones are kept for CACHE_STALE_SECONDS as a
+    fallback (see `_serve_stale`).
+
+    Keys live in the namespace of the current catalog version. Misses that
+    start a computation are charged to the client's cache-miss budget.
+    """
+    family_key, key = key, namespaced(key)
+    local = local_cache.get(key)
+    count_cache(family_key, "l1", "miss" if local is None else "hit")
+    if local is not None:
+        payload, (expires_at, compute_ms) = local
+        ttl_ms = (expires_at - time.monotonic()) * 1000
+        _maybe_refresh_early(key, compute, ttl, compute_ms, ttl_ms)
+        return payload
+
+    try:
+        with timed("cache_get"):
+            entry, ttl_ms = await _read(key)
+    except RedisError as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+        entry, ttl_ms = None, -2
+
+    # Whatever is left beyond the grace period is the entry's freshness
+    fresh_ms = ttl_ms - CACHE_STALE_SECONDS * 1000 if ttl_ms > 0 else ttl_ms
+    if entry is not None and ttl_ms > 0 and fresh_ms <= 0:
+        return await _serve_stale(family_key, key, compute, ttl, entry)
+
+    count_cache(family_key, "l2", "miss" if entry is None else "hit")
+    if entry is not None:
+        l2_stats["hits"] += 1
+        payload, compute_ms = decode_entry(entry)
+        logger.debug("Cache hit", extra={"event": "cache_hit", "key": key})
+        if fresh_ms > 0:
+            _remember(key, payload, fresh_ms / 1000, compute_ms)
+        _maybe_refresh_early(key, compute, ttl, compute_ms, fresh_ms)
+        return payload
+
+    l2_stats["misses"] += 1
+    if not single_flight.in_flight(key):
+        await charge_miss()
+    return await single_flight.do(key, lambda: _fill(key, compute, ttl))
+
+
+async def _serve_stale(family_key, key, compute, ttl, entry):
+    """
+    An expired entry still in its grace period: returned as is while the
+    search engine is degraded or a refresh is already running, otherwise
+    recomputed, falling back to it if that fails.
+    """
+    stale, _ = decode_entry(entry)
+    if not degraded() and not single_flight.in_flight(key):
+        try:
+            payload = await single_flight.do(
+                key, lambda: _fill(key, compute, ttl, stale=stale)
+            )
+        except Exception as e:
+            logger.warning(f"Refresh of {key} failed, serving it stale: {e}")
+        else:
+            if payload is not stale:
+                count_cache(family_key, "l2", "expired")
+                return payload
+    count_cache(family_key, "l2", "stale")
+    return stale
+
+
+async def cached_many(keys, compute, ttl=CACHE_TTL):
+    """
+    Batch variant of `cached`, returning a list aligned with `keys`.
+
+    Keys missing from L1 are read in one round trip (MGET plus their TTLs),
+    and the ones Redis does not have either are computed together by
+    `compute(missing_keys)`, which returns a dict of key -> bytes (keys left
+    out are not cached). Fills are written back in one pipeline; batch
+    fills skip the per-key locks. Keys are expected to share a family.
+    """
+    full_keys = [namespaced(key) for key in keys]
+    results = [None] * len(keys)
+    pending = []
+    for i, key in enumerate(full_keys):
+        local = local_cache.get(key)
+        if local is None:
+            pending.append(i)
+        else:
+            results[i] = local[0]
+    if keys:
+        count_cache(keys[0], "l1", "hit", len(keys) - len(pending))
+        count_cache(keys[0], "l1", "miss", len(pending))
+    if not pending:
+        return results
+
+    redis = get_redis_binary_client()
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.mget([full_keys[i] for i in pending])
+        for i in pending:
+            pipe.pttl(full_keys[i])
+        with timed("cache_get"):
+            entries, *ttls = await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cache batch read failed: {e}")
+        entries, ttls = [None] * len(pending), [-2] * len(pending)
+
+    missing = []
+    # Expired entries, recomputed unless the search engine is degraded and
+    # served if that fails
+    stale = {}
+    serve_stale = degraded()
+    for i, entry, ttl_ms in zip(pending, entries, ttls):
+        if entry is None:
+            missing.append(i)
+            continue
+        payload, compute_ms = decode_entry(entry)
+        fresh_ms = ttl_ms - CACHE_STALE_SECONDS * 1000
+        if 0 < ttl_ms and fresh_ms <= 0 and not serve_stale:
+            stale[i] = payload
+            missing.append(i)
+            continue
+        l2_stats["hits"] += 1
+        results[i] = payload
+        if fresh_ms > 0:
+            _remember(full_keys[i], payload, fresh_ms / 1000, compute_ms)
+    l2_stats["misses"] += len(missing)
+    count_cache(keys[0], "l2", "hit", len(pending) - len(missing))
+    count_cache(keys[0], "l2", "miss", len(missing))
+    if not missing:
+        return results
+
+    await charge_miss()
+    started = time.monotonic()
+    try:
+        computed = await compute([keys[i] for i in missing])
+    except Exception as e:
+        if len(stale) < len(missing):
+            raise
+        logger.warning(f"Batch refresh failed, serving {len(stale)} stale: {e}")
+        for i in missing:
+            results[i] = stale[i]
+        count_cache(keys[0], "l2", "stale", len(stale))
+        return results
+    compute_ms = int((time.monotonic() - started) * 1000)
+    pipe = redis.pipeline(transaction=False)
+    for i in missing:
+        payload = computed.get(keys[i])
+        if payload is None:
+            continue
+        results[i] = payload
+        _remember(full_keys[i], payload, ttl, compute_ms)
+        pipe.set(
+            full_keys[i],
+            encode_entry(payload, compute_ms),
+            ex=ttl + CACHE_STALE_SECONDS,
+        )
+    try:
+        with timed("cache_set"):
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cache batch write failed: {e}")
+    return results
+
+
+def _maybe_refresh_early(key, compute, ttl, compute_ms, ttl_ms):
+    if should_refresh_early(compute_ms, ttl_ms) and not single_flight.in_flight(key):
+        task = asyncio.ensure_future(_refresh(key, compute, ttl))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+
+async def invalidate(*keys):
+    """
+    Deletes keys from Redis and from the L1 of every worker.
+    """
+    if not keys:
+        return
+    keys = [namespaced(key) for key in keys]
+    for key in keys:
+        local_cache.delete(key)
+    redis = get_redis_binary_client()
+    pipe = redis.pipeline(transaction=False)
+    pipe.delete(*keys)
+    for key in keys:
+        pipe.publish(INVALIDATION_CHANNEL, key)
+    await pipe.execute()
+
+
+async def listen_for_invalidations():
+    """
+    Background task applying invalidations published by other workers.
+    """
+    while True:
+        pubsub = get_redis_binary_client().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while disconnected
+            local_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                key = message["data"].decode()
+                if key == "*":
+                    local_cache.clear()
+                else:
+                    local_cache.delete(key)
+        except RedisError as e:
+            logger.warning(f"Cache invalidation listener disconnected: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
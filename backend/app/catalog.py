@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+
+from redis.exceptions import RedisError
+
+from app.logger_setup import logger
+from app.utils import get_redis_client
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_VERSION_POLL_SECONDS = float(os.getenv("CATALOG_VERSION_POLL_SECONDS", "5"))
+# Readiness waits at most this long for the first warm-up to finish
+CACHE_WARM_TIMEOUT = float(os.getenv("CACHE_WARM_TIMEOUT", "60"))
+
+# Version of the catalog this worker serves; prefixes every result cache key
+catalog_version = "0"
+# Whether the namespace of that version has been warmed up
+cache_warm = False
+# Monotonic start of this worker's first warm-up, and whether one finished
+warm_started_at = None
+warmed_once = False
+
+
+def get_catalog_version():
+    return catalog_version
+
+
+def set_catalog_version(version):
+    global catalog_version
+    catalog_version = version
+
+
+def get_cache_warm_status():
+    return cache_warm
+
+
+def set_cache_warm(warm: bool):
+    global cache_warm, warm_started_at, warmed_once
+    cache_warm = warm
+    if warm:
+        warmed_once = True
+    elif warm_started_at is None:
+        warm_started_at = time.monotonic()
+
+
+def warm_up_settled() -> bool:
+    """
+    Whether readiness may flip: the first warm-up finished, or has run for
+    longer than CACHE_WARM_TIMEOUT. Warm-ups after a catalog switch don't
+    take a serving worker out of rotation.
+    """
+    if warmed_once:
+        return True
+    return (
+        warm_started_at is not None
+        and time.monotonic() - warm_started_at >= CACHE_WARM_TIMEOUT
+    )
+
+
+def namespaced(key: str) -> str:
+    """
+    Result cache key for the current catalog version. A new catalog switches
+    namespaces, and keys of the previous one simply age out.
+    """
+    return f"v:{catalog_version}:{key}"
+
+
+def version_for(fingerprint: str) -> str:
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+
+
+async def load_catalog_version(fingerprint=None):
+    """
+    Adopts the catalog version recorded in Redis.
+
+    `fingerprint` identifies a catalog that was just ingested and publishes
+    a new version for it; without one, the recorded version is kept (and
+    one is recorded if there is none yet).
+    """
+    redis = get_redis_client()
+    if fingerprint is not None:
+        version = version_for(fingerprint)
+        await redis.set(CATALOG_VERSION_KEY, version)
+        logger.info(f"Published catalog version {version}")
+    else:
+        await redis.set(CATALOG_VERSION_KEY, version_for(uuid.uuid4().hex), nx=True)
+        version = await redis.get(CATALOG_VERSION_KEY)
+    set_catalog_version(version)
+    return version
+
+
+async def watch_catalog_version(on_change=None):
+    """
+    Background task following version switches made by other workers;
+    `on_change()` is awaited after each switch.
+    """
+    while True:
+        await asyncio.sleep(CATALOG_VERSION_POLL_SECONDS)
+        try:
+            version = await get_redis_client().get(CATALOG_VERSION_KEY)
+        except RedisError as e:
+            logger.warning(f"Catalog version poll failed: {e}")
+            continue
+        if version is None or version == catalog_version:
+            continue
+        logger.info(f"Switching to catalog version {version}")
+        set_catalog_version(version)
+        if on_change is not None:
+            await on_change()
@@ -0,0 +1,169 @@
+import hashlib
+import math
+import os
+import struct
+import unicodedata
+
+import dotenv
+import openai
+
+from app.logger_setup import logger
+from app.utils import get_redis_binary_client
+
+# Load environment variables
+dotenv.load_dotenv()
+
+# Must match the vectorizer configured on the `Product` collection
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+# 0 keeps embeddings forever; they only depend on the query text and model
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "0"))
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a query used to key the embedding cache.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def pack_vector(vector) -> bytes:
+    """
+    Packs a vector as little-endian float32.
+    """
+    return struct.pack(f"<{len(vector)}f", *vector)
+
+
+def unpack_vector(data: bytes) -> list:
+    return list(struct.unpack(f"<{len(data) // 4}f", data))
+
+
+class QueryEmbedder:
+    """
+    Turns a query string into a vector. Subclasses set a unique `name`,
+    which namespaces their entries in the embedding cache.
+    """
+
+    name = "base"
+
+    async def embed(self, text: str) -> list:
+        raise NotImplementedError
+
+
+class OpenAIEmbedder(QueryEmbedder):
+    """
+    Embeds queries with the same OpenAI model Weaviate uses for the catalog.
+    """
+
+    def __init__(self, model=EMBEDDING_MODEL):
+        self.model = model
+        self.name = f"openai:{model}"
+        self._client = None
+
+    async def embed(self, text: str) -> list:
+        if self._client is None:
+            self._client = openai.AsyncOpenAI()
+        response = await self._client.embeddings.create(model=self.model, input=text)
+        return response.data[0].embedding
+
+
+class HashEmbedder(QueryEmbedder):
+    """
+    Deterministic, dependency-free stand-in for offline runs and tests.
+
+    Tokens are hashed into a fixed number of signed buckets and the result is
+    L2-normalized, so identical texts always map to identical vectors and
+    texts sharing words have a positive cosine similarity.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hash:{dim}"
+
+    def embed_sync(self, text: str) -> list:
+        vector = [0.0] * self.dim
+        for token in normalize_query(text).split():
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else vector
+
+    async def embed(self, text: str) -> list:
+        return self.embed_sync(text)
+
+
+class EmbeddingCache:
+    """
+    Redis store of packed float32 query embeddings, kept apart from the
+    result cache so results can expire without forcing a re-embed.
+    """
+
+    def __init__(self, namespace: str, ttl=EMBEDDING_CACHE_TTL):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def key(self, normalized: str) -> str:
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"embedding:{self.namespace}:{digest}"
+
+    async def get(self, normalized: str):
+        try:
+            data = await get_redis_binary_client().get(self.key(normalized))
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return None
+        return unpack_vector(data) if data else None
+
+    async def set(self, normalized: str, vector):
+        try:
+            await get_redis_binary_client().set(
+                self.key(normalized), pack_vector(vector), ex=self.ttl or None
+            )
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+
+class CachedQueryEmbedder(QueryEmbedder):
+    """
+    Wraps an embedder with the persistent embedding cache.
+    """
+
+    def __init__(self, embedder: QueryEmbedder, cache: EmbeddingCache = None):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.cache = cache or EmbeddingCache(embedder.name)
+
+    async def embed(self, text: str) -> list:
+        normalized = normalize_query(text)
+        vector = await self.cache.get(normalized)
+        if vector is not None:
+            return vector
+        vector = await self.embedder.embed(normalized)
+        await self.cache.set(normalized, vector)
+        return vector
+
+
+EMBEDDERS = {
+    "openai": OpenAIEmbedder,
+    "hash": HashEmbedder,
+}
+
+# Lazy query embedder; None means Weaviate embeds queries itself (near_text)
+query_embedder = None
+
+
+def get_query_embedder():
+    """
+    Lazily builds the embedder selected by QUERY_EMBEDDER
+    ("openai", "hash" or "none").
+    """
+    global query_embedder
+    name = os.getenv("QUERY_EMBEDDER", "openai").lower()
+    if name == "none":
+        return None
+    if query_embedder is None:
+        if name not in EMBEDDERS:
+            raise ValueError(f"Unknown QUERY_EMBEDDER: {name}")
+        query_embedder = CachedQueryEmbedder(EMBEDDERS[name]())
+    return query_embedder
@@ -0,0 +1,191 @@
+"""
+Facet counts: products per store, price bucket and rating band.
+
+The catalog-wide table is accumulated while products are ingested and
+kept in Redis, and rebuilt from the collection should it go missing;
+query-scoped tables are counted over a search's candidate set. Both come
+from a FacetCounter, which buckets whole batches at once.
+"""
+
+import asyncio
+import os
+from collections import Counter
+
+import numpy as np
+import orjson
+
+from app.locks import renewing_lock
+from app.logger_setup import logger
+from app.search_backend import get_search_backend
+from app.utils import get_redis_client
+
+FACET_STORE_LIMIT = int(os.getenv("FACET_STORE_LIMIT", "50"))
+# Lower bounds of the buckets; the last one is open-ended
+PRICE_EDGES = (0, 10, 25, 50, 100, 200)
+RATING_EDGES = (0, 2, 3, 4, 4.5)
+FACET_PROPERTIES = ["store", "price", "average_rating"]
+FACET_SCAN_BATCH = 1000
+# How often workers check that the catalog-wide table exists
+FACET_CHECK_SECONDS = int(os.getenv("FACET_CHECK_SECONDS", "60"))
+# Renewed while a recount runs (see app.locks)
+FACET_LOCK_TTL_MS = int(os.getenv("FACET_LOCK_TTL_MS", "30000"))
+
+GLOBAL_FACETS_KEY = "facets:global"
+LOCK_KEY = "facets:lock"
+
+
+def bucket_counts(values, edges):
+    """
+    Counts of `values` per [edges[i], edges[i + 1]) bucket; missing (NaN)
+    and negative values are left out.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[values >= edges[0]]
+    buckets = np.searchsorted(edges, values, side="right") - 1
+    return np.bincount(buckets, minlength=len(edges))
+
+
+def bucket_table(counts, edges):
+    return [
+        {
+            "min": edges[i],
+            "max": edges[i + 1] if i + 1 < len(edges) else None,
+            "count": int(count),
+        }
+        for i, count in enumerate(counts)
+    ]
+
+
+class FacetCounter:
+    """
+    Running facet counts over batches of products.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.stores = Counter()
+        self.price = np.zeros(len(PRICE_EDGES), dtype=np.int64)
+        self.average_rating = np.zeros(len(RATING_EDGES), dtype=np.int64)
+
+    def add_columns(self, stores, prices, ratings):
+        """
+        Adds one batch given as aligned columns; None marks a missing value.
+        """
+        stores = np.asarray(stores, dtype=object)
+        known = stores[np.not_equal(stores, None)]
+        values, counts = np.unique(known.astype(str), return_counts=True)
+        self.stores.update(dict(zip(values.tolist(), counts.tolist())))
+        self.price += bucket_counts(prices, PRICE_EDGES)
+        self.average_rating += bucket_counts(ratings, RATING_EDGES)
+        self.total += len(stores)
+
+    def add(self, products):
+        """
+        Adds a batch of product property dicts.
+        """
+        if not products:
+            return
+        self.add_columns(
+            [product.get("store") or None for product in products],
+            [product.get("price") for product in products],
+            [product.get("average_rating") for product in products],
+        )
+
+    def table(self, store_limit=FACET_STORE_LIMIT) -> dict:
+        return {
+            "total": self.total,
+            "facets": {
+                "store": [
+                    {"value": store, "count": count}
+                    for store, count in self.stores.most_common(store_limit)
+                ],
+                "price": bucket_table(self.price, PRICE_EDGES),
+                "average_rating": bucket_table(self.average_rating, RATING_EDGES),
+            },
+        }
+
+
+def facets_from_index(index) -> FacetCounter:
+    """
+    Counts a local index (see app.vector_engine) from its columns directly.
+    """
+    counter = FacetCounter()
+    vocab = np.asarray([value or None for value in index.vocab["store"]], dtype=object)
+    counter.add_columns(
+        vocab[np.asarray(index.codes["store"])],
+        index.numeric["price"],
+        index.numeric["average_rating"],
+    )
+    return counter
+
+
+def facets_from_collection(collection) -> FacetCounter:
+    """
+    Counts a (synchronous) Weaviate collection in one scan of the faceted
+    properties.
+    """
+    counter = FacetCounter()
+    batch = []
+    for obj in collection.iterator(return_properties=FACET_PROPERTIES):
+        batch.append(obj.properties)
+        if len(batch) == FACET_SCAN_BATCH:
+            counter.add(batch)
+            batch = []
+    counter.add(batch)
+    return counter
+
+
+def save_global_facets(redis, counter: FacetCounter):
+    """
+    Stores the catalog-wide table counted by an ingestion run.
+    """
+    redis.set(GLOBAL_FACETS_KEY, orjson.dumps(counter.table()))
+
+
+async def load_global_facets():
+    """
+    The catalog-wide table, or None before the first ingestion wrote it.
+    """
+    data = await get_redis_client().get(GLOBAL_FACETS_KEY)
+    return orjson.loads(data) if data else None
+
+
+async def rebuild_global_facets(backend=None) -> bool:
+    """
+    Recounts the catalog-wide table from the search backend when it is
+    missing, e.g. on a deployment ingested before facets existed or after
+    Redis evicted it. Returns False if the table is there or another worker
+    is already counting.
+    """
+    redis = get_redis_client()
+    async with renewing_lock(LOCK_KEY, FACET_LOCK_TTL_MS) as acquired:
+        if not acquired:
+            return False
+        if await redis.exists(GLOBAL_FACETS_KEY):
+            return False
+        counter = FacetCounter()
+        batch = []
+        backend = backend or get_search_backend()
+        async for props, _ in backend.iter_products(properties=FACET_PROPERTIES):
+            batch.append(props)
+            if len(batch) == FACET_SCAN_BATCH:
+                counter.add(batch)
+                batch = []
+        counter.add(batch)
+        await redis.set(GLOBAL_FACETS_KEY, orjson.dumps(counter.table()))
+        logger.info(f"✅ Rebuilt facet counts over {counter.total} products")
+        return True
+
+
+async def rebuild_facets_periodically(is_ready):
+    """
+    Background task: restores the catalog-wide table whenever it is missing
+    while the catalog is ready.
+    """
+    while True:
+        try:
+            if await is_ready():
+                await rebuild_global_facets()
+        except Exception as e:
+            logger.error(f"Facet count rebuild failed: {e}")
+        await asyncio.sleep(FACET_CHECK_SECONDS)
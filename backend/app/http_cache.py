@@ -0,0 +1,183 @@
+"""
+HTTP caching for routes annotated with `utils.cache_control`: validators,
+conditional GETs, Cache-Control headers and transport compression.
+
+ETags combine the catalog version with a hash of the body, so they change
+with every new catalog even when a payload happens not to. Each worker
+remembers the validators it recently issued per URL; a conditional GET
+matching one is answered 304 before routing, without running the handler.
+"""
+
+import gzip
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.catalog import get_catalog_version
+from app.local_cache import L1_CACHE_MAX_TTL
+from app.response_cache import RESPONSE_COMPRESSION_MIN_BYTES, accepts_encoding
+
+try:
+    import brotli
+except ImportError:  # Optional: responses fall back to gzip without it
+    brotli = None
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+# How long a remembered validator answers conditional GETs without the
+# handler running; like L1 entries, it may be this stale at most
+HTTP_VALIDATOR_TTL = float(os.getenv("HTTP_VALIDATOR_TTL", str(L1_CACHE_MAX_TTL)))
+HTTP_VALIDATOR_ENTRIES = int(os.getenv("HTTP_VALIDATOR_ENTRIES", "10000"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Validators differ per content-coding; a URL rarely sees more than these
+MAX_ETAGS_PER_URL = 4
+
+
+def cache_control_header(max_age: int, stale_while_revalidate: int = 0) -> str:
+    value = f"public, max-age={max_age}"
+    if stale_while_revalidate:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    return value
+
+
+def make_etag(body: bytes, encoding: str = "identity") -> str:
+    digest = hashlib.blake2b(body, digest_size=8)
+    digest.update(encoding.encode())
+    return f'W/"{get_catalog_version()}-{digest.hexdigest()}"'
+
+
+def matching_etag(if_none_match: str, etags):
+    """
+    The first of `etags` an If-None-Match header matches by weak
+    comparison, or None.
+    """
+    if not if_none_match or not etags:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return etags[0]
+    for etag in etags:
+        if etag.removeprefix("W/") in candidates:
+            return etag
+    return None
+
+
+class Validators:
+    """
+    Bounded LRU of URL -> (expires at, Cache-Control value, issued ETags).
+    """
+
+    def __init__(self, max_entries=HTTP_VALIDATOR_ENTRIES, ttl=HTTP_VALIDATOR_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url: str):
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[url]
+            return None
+        return entry
+
+    def remember(self, url: str, etag: str, cache_control: str, max_age: int):
+        entry = self.get(url)
+        etags = entry[2] if entry is not None and entry[1] == cache_control else ()
+        if etag not in etags:
+            etags = (etag, *etags)[:MAX_ETAGS_PER_URL]
+        expires_at = time.monotonic() + min(self.ttl, max_age)
+        self._entries[url] = (expires_at, cache_control, etags)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+validators = Validators()
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=304,
+        headers={
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        },
+    )
+
+
+def negotiate_encoding(request: Request):
+    if brotli is not None and accepts_encoding(request, "br"):
+        return "br"
+    if accepts_encoding(request, "gzip"):
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5, mtime=0)
+
+
+def compressible(headers) -> bool:
+    return "content-encoding" not in headers and headers.get(
+        "content-type", ""
+    ).startswith(COMPRESSIBLE_TYPES)
+
+
+async def http_cache(request: Request, call_next):
+    """
+    Middleware: answers conditional GETs from remembered validators, then
+    sets ETag and Cache-Control on fresh 200s of annotated routes and
+    compresses them for clients that accept it. Bodies the response cache
+    already compressed are passed through as they are.
+    """
+    if not HTTP_CACHE_ENABLED or request.method != "GET":
+        return await call_next(request)
+    url = f"{get_catalog_version()}:{request.url.path}?{request.url.query}"
+    if_none_match = request.headers.get("if-none-match")
+    known = validators.get(url) if if_none_match else None
+    if known is not None:
+        etag = matching_etag(if_none_match, known[2])
+        if etag is not None:
+            return not_modified(etag, known[1])
+
+    response = await call_next(request)
+    route = request.scope.get("route")
+    policy = getattr(getattr(route, "endpoint", None), "__cache_control__", None)
+    if policy is None or response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name != "content-length"
+    }
+    cache_control = cache_control_header(*policy)
+    etag = make_etag(body, headers.get("content-encoding", "identity"))
+    validators.remember(url, etag, cache_control, policy[0])
+    if matching_etag(if_none_match, (etag,)):
+        return not_modified(etag, cache_control)
+
+    headers["etag"] = etag
+    headers["cache-control"] = cache_control
+    if compressible(headers) and len(body) >= RESPONSE_COMPRESSION_MIN_BYTES:
+        headers["vary"] = "Accept-Encoding"
+        encoding = negotiate_encoding(request)
+        if encoding is not None:
+            body = compress_body(body, encoding)
+            headers["content-encoding"] = encoding
+    return Response(content=body, status_code=200, headers=headers)
@@ -0,0 +1,690 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import orjson
+import requests
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
+
+from app.logger_setup import logger
+from app.metrics import record_ingestion
+from app.vector_engine import PRODUCT_COLUMNS
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_CHUNK_LINES = int(os.getenv("INGEST_CHUNK_LINES", "500"))
+INGEST_QUEUE_CHUNKS = int(os.getenv("INGEST_QUEUE_CHUNKS", "8"))
+INGEST_CHECKPOINT_EVERY = int(os.getenv("INGEST_CHECKPOINT_EVERY", "5000"))
+INGEST_CHECKPOINT_PATH = os.getenv(
+    "INGEST_CHECKPOINT_PATH", "data/ingest_checkpoint.json"
+)
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "data/ingest_manifest.json.gz")
+
+# Properties text2vec-openai embeds; only changes to these need a new vector
+VECTORIZED_FIELDS = ("title", "description")
+
+IMAGE_URL_PREFIX = "https://m.media-amazon.com/images/I/"
+
+
+def product_uuid(product_id: int) -> str:
+    """
+    Deterministic object UUID for a product, so re-ingesting is idempotent.
+    """
+    return generate_uuid5(product_id)
+
+
+def indexed_properties(props: dict) -> dict:
+    """
+    `props` as written to Weaviate, with `store_text`: a word-tokenized copy
+    of `store` for keyword search, since `store` itself matches whole values.
+    """
+    return {**props, "store_text": props.get("store") or ""}
+
+
+def has_legacy_uuids(collection, sample: int = 100) -> bool:
+    """
+    True if any of the first `sample` objects is not stored under its
+    `product_uuid`, as in collections ingested before UUIDs were derived.
+    """
+    result = collection.query.fetch_objects(
+        limit=sample, return_properties=["product_id"]
+    )
+    return any(
+        str(obj.uuid) != product_uuid(obj.properties["product_id"])
+        for obj in result.objects
+    )
+
+
+def rekey_legacy_objects(collection, batch_size: int = INGEST_CHUNK_LINES) -> int:
+    """
+    Moves objects stored under random UUIDs to their `product_uuid`, keeping
+    properties and vectors, so nothing is embedded again. Returns how many
+    objects were moved; an interrupted run is picked up by the next one.
+    """
+    moved = 0
+    pending = []
+
+    def flush():
+        nonlocal moved
+        if not pending:
+            return
+        with collection.batch.dynamic() as batch:
+            for obj in pending:
+                vector = obj.vector
+                if isinstance(vector, dict):
+                    vector = vector.get("default")
+                batch.add_object(
+                    properties=indexed_properties(obj.properties),
+                    uuid=product_uuid(obj.properties["product_id"]),
+                    vector=vector,
+                )
+        failed = {str(error.object_.uuid) for error in collection.batch.failed_objects}
+        # Old objects are only dropped once their copy is written
+        old = [
+            obj.uuid
+            for obj in pending
+            if product_uuid(obj.properties["product_id"]) not in failed
+        ]
+        if old:
+            collection.data.delete_many(where=Filter.by_id().contains_any(old))
+        moved += len(old)
+        pending.clear()
+
+    for obj in collection.iterator(include_vector=True):
+        if str(obj.uuid) == product_uuid(obj.properties["product_id"]):
+            continue
+        pending.append(obj)
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    return moved
+
+
+def transform_record(rec: dict, product_id: int) -> dict:
+    """
+    Maps a raw Amazon catalog record to `Product` properties.
+    """
+    images = rec.get("images", [])
+    return {
+        "product_id": product_id,
+        "parent_asin": rec.get("parent_asin") or "",
+        "title": rec.get("title", ""),
+        "store": rec.get("store", ""),
+        "description": (
+            " ".join(rec["description"])
+            if isinstance(rec.get("description", []), list)
+            else rec.get("description", "")
+        ),
+        "features": rec.get("features", []),
+        "average_rating": (
+            float(rec.get("average_rating"))
+            if rec.get("average_rating") is not None
+            else -1.0
+        ),
+        "rating_number": (
+            int(rec.get("rating_number"))
+            if rec.get("rating_number") is not None
+            else -1
+        ),
+        "price": float(rec.get("price")) if rec.get("price") is not None else -1.0,
+        "details": json.dumps(rec.get("details", {})),
+        "main_hi_res_image": (
+            next(
+                (
+                    (img.get("hi_res") or "").replace(IMAGE_URL_PREFIX, "")
+                    for img in images
+                    if img.get("variant", "").lower() == "main"
+                ),
+                "",
+            )
+            if isinstance(images, list)
+            else ""
+        ),
+    }
+
+
+def content_hash(props: dict) -> str:
+    """
+    16 hex chars: a hash of the vectorized fields followed by a hash of all
+    properties, so a delta run can tell re-embeds from metadata updates.
+    """
+    vectorized = orjson.dumps([props.get(name) for name in VECTORIZED_FIELDS])
+    everything = orjson.dumps(props, option=orjson.OPT_SORT_KEYS)
+    return (
+        hashlib.blake2b(vectorized, digest_size=4).hexdigest()
+        + hashlib.blake2b(everything, digest_size=4).hexdigest()
+    )
+
+
+def source_id(rec: dict, line_number: int) -> str:
+    """
+    Stable identity of a source record across catalog refreshes: its
+    `parent_asin`, or its line position for records without one.
+    """
+    return rec.get("parent_asin") or f"#{line_number}"
+
+
+def transform_lines(lines: list, first_product_id: int) -> list:
+    """
+    Parse/transform stage; runs in worker processes.
+    """
+    return [
+        transform_record(json.loads(line), product_id)
+        for product_id, line in enumerate(lines, start=first_product_id)
+    ]
+
+
+def open_source(source: str, offset: int = 0):
+    """
+    Opens a JSONL catalog (optionally gzip-compressed) from a URL, a file://
+    URL or a local path, positioned at `offset` bytes into the decompressed
+    stream.
+    """
+    if source.startswith(("http://", "https://")):
+        resp = requests.get(source, stream=True)
+        resp.raise_for_status()
+        raw = resp.raw
+        compressed = source.split("?")[0].endswith(".gz")
+    else:
+        path = source[len("file://") :] if source.startswith("file://") else source
+        raw = open(path, "rb")
+        compressed = raw.peek(2)[:2] == b"\x1f\x8b"
+    stream = gzip.GzipFile(fileobj=raw) if compressed else raw
+    if offset and stream.seekable():
+        # For gzip this decompresses and discards everything before the offset
+        stream.seek(offset)
+    elif offset:
+        while offset > 0:
+            data = stream.read(min(offset, 1 << 20))
+            if not data:
+                break
+            offset -= len(data)
+    return stream
+
+
+class Checkpoint:
+    """
+    On-disk ingestion progress: decompressed byte offset of the next unread
+    line and the last product_id known to be written.
+    """
+
+    def __init__(self, path=INGEST_CHECKPOINT_PATH):
+        self.path = path
+
+    def load(self, source: str):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return state if state.get("source") == source else None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def save(self, source: str, offset: int, last_product_id: int, inserted: int):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "source": source,
+                    "offset": offset,
+                    "last_product_id": last_product_id,
+                    "inserted": inserted,
+                },
+                f,
+            )
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Manifest:
+    """
+    On-disk map of source id -> (product_id, `content_hash`) as of the last
+    ingestion, with the next unused product_id, stored as gzipped JSON.
+    """
+
+    def __init__(self, path=INGEST_MANIFEST_PATH):
+        self.path = path
+        self.next_id = 1
+
+    def load(self):
+        try:
+            with gzip.open(self.path, "rb") as f:
+                data = orjson.loads(f.read())
+        except (FileNotFoundError, OSError, orjson.JSONDecodeError):
+            return None
+        if "products" not in data:
+            # Manifests keyed by product_id predate source ids; rebuild
+            return None
+        self.next_id = data["next_id"]
+        return {sid: (pid, h) for sid, (pid, h) in data["products"].items()}
+
+    def save(self, entries: dict, next_id: int):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.next_id = next_id
+        tmp = f"{self.path}.tmp"
+        with gzip.open(tmp, "wb") as f:
+            f.write(orjson.dumps({"next_id": next_id, "products": entries}))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@dataclass
+class Chunk:
+    records: list
+    last_product_id: int
+    end_offset: int
+
+
+class IngestionPipeline:
+    """
+    Staged, resumable catalog ingestion:
+
+      read/decompress -> parallel parse/transform -> dynamic batch writer
+
+    Stages are connected by bounded queues so a slow writer throttles the
+    reader. Progress is checkpointed after each flushed write window, and a
+    restart resumes from the last checkpoint. Written records are counted
+    into `facets` (a FacetCounter) on the way.
+    """
+
+    def __init__(
+        self,
+        collection,
+        source: str,
+        limit: int = None,
+        workers: int = None,
+        chunk_lines: int = INGEST_CHUNK_LINES,
+        checkpoint_every: int = INGEST_CHECKPOINT_EVERY,
+        checkpoint: Checkpoint = None,
+        facets=None,
+    ):
+        self.collection = collection
+        self.source = source
+        self.limit = limit
+        self.workers = workers or INGEST_WORKERS
+        self.chunk_lines = chunk_lines
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint = checkpoint or Checkpoint()
+        self.facets = facets
+        self.inserted = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=INGEST_QUEUE_CHUNKS)
+        self._writer_error = None
+        self._started_at = None
+        self._resumed_with = 0
+
+    @property
+    def resumed(self):
+        """
+        True if the run continued an earlier one, so records written before
+        the restart were not seen.
+        """
+        return self._resumed_with > 0
+
+    @property
+    def records_per_second(self):
+        """
+        Write throughput of this run, excluding records from before a resume.
+        """
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        return (self.inserted - self._resumed_with) / elapsed if elapsed else 0.0
+
+    def run(self) -> int:
+        state = self.checkpoint.load(self.source)
+        offset = state["offset"] if state else 0
+        next_product_id = state["last_product_id"] + 1 if state else 1
+        self.inserted = state["inserted"] if state else 0
+        if state:
+            logger.info(
+                f"⏩ Resuming ingestion at product {next_product_id} (offset {offset})"
+            )
+
+        self._started_at = time.monotonic()
+        self._resumed_with = self.inserted
+        writer = threading.Thread(target=self._write_loop, name="ingest-writer")
+        writer.start()
+        try:
+            self._read_and_transform(offset, next_product_id)
+        finally:
+            self._queue.put(None)
+            writer.join()
+        if self._writer_error:
+            raise self._writer_error
+
+        self.checkpoint.clear()
+        record_ingestion(self.inserted, self.failed, self.records_per_second)
+        logger.info(
+            f"✅ Finished ingestion. Total products inserted: {self.inserted} "
+            f"({self.records_per_second:.0f} records/s, {self.failed} failed)"
+        )
+        return self.inserted
+
+    def _chunks(self, stream, offset, next_product_id):
+        lines = []
+        for line in stream:
+            if self.limit is not None and next_product_id + len(lines) > self.limit:
+                break
+            offset += len(line)
+            lines.append(line)
+            if len(lines) == self.chunk_lines:
+                yield lines, next_product_id, offset
+                next_product_id += len(lines)
+                lines = []
+        if lines:
+            yield lines, next_product_id, offset
+
+    def _read_and_transform(self, offset, next_product_id):
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        in_flight = deque()
+        stream = open_source(self.source, offset)
+        try:
+            for lines, first_id, end_offset in self._chunks(
+                stream, offset, next_product_id
+            ):
+                if self._writer_error:
+                    break
+                last_id = first_id + len(lines) - 1
+                if executor is None:
+                    self._put(
+                        Chunk(transform_lines(lines, first_id), last_id, end_offset)
+                    )
+                    continue
+                future = executor.submit(transform_lines, lines, first_id)
+                in_flight.append((future, last_id, end_offset))
+                # Backpressure: keep at most two chunks per worker in flight
+                if len(in_flight) >= 2 * self.workers:
+                    self._put_result(*in_flight.popleft())
+            while in_flight and not self._writer_error:
+                self._put_result(*in_flight.popleft())
+        finally:
+            stream.close()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _put_result(self, future, last_id, end_offset):
+        self._put(Chunk(future.result(), last_id, end_offset))
+
+    def _put(self, chunk):
+        while not self._writer_error:
+            try:
+                self._queue.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _write_loop(self):
+        try:
+            done = False
+            while not done:
+                chunk = self._queue.get()
+                if chunk is None:
+                    return
+                done = self._write_window(chunk)
+        except Exception as e:
+            self._writer_error = e
+            # Drain so the reader is never blocked on a dead writer
+            while self._queue.get() is not None:
+                pass
+
+    def _write_window(self, chunk):
+        """
+        Writes chunks into one dynamic batch until the checkpoint window is
+        full, then flushes and records the checkpoint. Returns True when the
+        end-of-stream marker was consumed.
+        """
+        written = 0
+        done = False
+        last = chunk
+        with self.collection.batch.dynamic() as batch:
+            while True:
+                for props in chunk.records:
+                    batch.add_object(
+                        properties=indexed_properties(props),
+                        uuid=product_uuid(props["product_id"]),
+                    )
+                written += len(chunk.records)
+                if self.facets is not None:
+                    self.facets.add(chunk.records)
+                last = chunk
+                if written >= self.checkpoint_every:
+                    break
+                chunk = self._queue.get()
+                if chunk is None:
+                    done = True
+                    break
+
+        failed = len(self.collection.batch.failed_objects)
+        if failed:
+            logger.warning(f"⚠️ {failed} objects failed to ingest in this batch")
+        self.failed += failed
+        self.inserted += written - failed
+        self.checkpoint.save(
+            self.source, last.end_offset, last.last_product_id, self.inserted
+        )
+        record_ingestion(self.inserted, self.failed, self.records_per_second)
+        logger.info(
+            f"Ingested {self.inserted} products ({self.records_per_second:.0f} records/s)"
+        )
+        return done
+
+
+# Properties app.ranking rescores changed products from
+RANKING_FIELDS = ("product_id", "store", "average_rating", "rating_number")
+
+
+@dataclass
+class DeltaResult:
+    added: int = 0
+    reembedded: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    failed: int = 0
+    # Products added, deleted or with a new vector
+    vector_changes: list = field(default_factory=list)
+    # RANKING_FIELDS of upserted products, and ids of deleted ones
+    rescored: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return self.added + self.reembedded + self.updated + self.deleted
+
+
+class DeltaIngestion:
+    """
+    Syncs an already populated collection with the source:
+
+      - new products and products whose title/description changed are
+        upserted and embedded again,
+      - products with other changes are upserted with their stored vector,
+      - products missing from the source are deleted,
+      - everything else is left alone.
+
+    Changes are found by comparing `content_hash`es against the manifest of
+    the previous run. Without a manifest, one is built from the collection.
+    """
+
+    def __init__(
+        self,
+        collection,
+        source: str,
+        limit: int = None,
+        batch_size: int = INGEST_CHUNK_LINES,
+        manifest: Manifest = None,
+    ):
+        self.collection = collection
+        self.source = source
+        self.limit = limit
+        self.batch_size = batch_size
+        self.manifest = manifest or Manifest()
+        self.result = DeltaResult()
+
+    def run(self) -> DeltaResult:
+        previous = self.manifest.load()
+        if previous is None:
+            logger.info("No ingestion manifest found; building one from the collection")
+            previous = self.manifest_from_collection()
+        # Products keep their id; new ones get ids never used before, even
+        # by products deleted since
+        next_id = max(
+            self.manifest.next_id,
+            max((pid for pid, _ in previous.values()), default=0) + 1,
+        )
+        current = {}
+        embed, reuse = [], []
+
+        stream = open_source(self.source)
+        try:
+            for line_number, line in enumerate(stream, start=1):
+                if self.limit is not None and line_number > self.limit:
+                    break
+                rec = json.loads(line)
+                sid = source_id(rec, line_number)
+                if sid in current:
+                    logger.warning(f"Skipping duplicate source record {sid}")
+                    continue
+                legacy = f"#{line_number}"
+                if sid not in previous and legacy in previous:
+                    # Objects written before source ids were stored were
+                    # keyed by line position; adopt them once
+                    previous[sid] = previous.pop(legacy)
+                old = previous.get(sid)
+                if old is None:
+                    product_id, next_id = next_id, next_id + 1
+                else:
+                    product_id = old[0]
+                props = transform_record(rec, product_id)
+                new = content_hash(props)
+                current[sid] = (product_id, new)
+                if old is not None and old[1] == new:
+                    self.result.unchanged += 1
+                    continue
+                if old is None:
+                    self.result.added += 1
+                    self.result.vector_changes.append(product_id)
+                    embed.append((sid, props))
+                elif old[1][:8] != new[:8]:
+                    self.result.reembedded += 1
+                    self.result.vector_changes.append(product_id)
+                    embed.append((sid, props))
+                else:
+                    self.result.updated += 1
+                    reuse.append((sid, props))
+                if len(embed) + len(reuse) >= self.batch_size:
+                    self._upsert(embed, reuse, previous, current)
+                    embed, reuse = [], []
+            self._upsert(embed, reuse, previous, current)
+        finally:
+            stream.close()
+
+        removed = [pid for sid, (pid, _) in previous.items() if sid not in current]
+        for start in range(0, len(removed), self.batch_size):
+            # By property rather than UUID, so objects still under a legacy
+            # random UUID are deleted too
+            self.collection.data.delete_many(
+                where=Filter.by_property("product_id").contains_any(
+                    removed[start : start + self.batch_size]
+                )
+            )
+        self.result.deleted = len(removed)
+        self.result.vector_changes.extend(removed)
+        self.result.removed = removed
+
+        self.manifest.save(current, next_id)
+        logger.info(
+            f"✅ Delta ingestion: {self.result.added} added, "
+            f"{self.result.reembedded} re-embedded, {self.result.updated} updated, "
+            f"{self.result.deleted} deleted, {self.result.unchanged} unchanged, "
+            f"{self.result.failed} failed"
+        )
+        return self.result
+
+    def manifest_from_collection(self) -> dict:
+        fields = list(PRODUCT_COLUMNS)
+        manifest = {}
+        for obj in self.collection.iterator(return_properties=fields):
+            props = {name: obj.properties.get(name) for name in fields}
+            product_id = props["product_id"]
+            sid = props.get("parent_asin") or f"#{product_id}"
+            manifest[sid] = (product_id, content_hash(props))
+        return manifest
+
+    def _stored_vectors(self, products):
+        """
+        Current vectors of `products`, keyed by UUID.
+        """
+        if not products:
+            return {}
+        uuids = [product_uuid(props["product_id"]) for props in products]
+        result = self.collection.query.fetch_objects_by_ids(
+            uuids, limit=len(uuids), include_vector=True, return_properties=[]
+        )
+        vectors = {}
+        for obj in result.objects:
+            vector = obj.vector
+            if isinstance(vector, dict):
+                vector = vector.get("default")
+            vectors[str(obj.uuid)] = vector
+        return vectors
+
+    def _upsert(self, embed, reuse, previous, current):
+        if not embed and not reuse:
+            return
+        vectors = self._stored_vectors([props for _, props in reuse])
+        self.result.rescored.extend(
+            {name: props.get(name) for name in RANKING_FIELDS}
+            for _, props in embed + reuse
+        )
+        by_uuid = {}
+        with self.collection.batch.dynamic() as batch:
+            for sid, props in embed:
+                uuid = product_uuid(props["product_id"])
+                by_uuid[uuid] = sid
+                batch.add_object(properties=indexed_properties(props), uuid=uuid)
+            for sid, props in reuse:
+                uuid = product_uuid(props["product_id"])
+                by_uuid[uuid] = sid
+                # Without a stored vector Weaviate embeds the object itself
+                batch.add_object(
+                    properties=indexed_properties(props),
+                    uuid=uuid,
+                    vector=vectors.get(uuid),
+                )
+
+        # Keep the old hash of failed objects so the next run retries them
+        for error in self.collection.batch.failed_objects:
+            sid = by_uuid.get(str(error.object_.uuid))
+            if sid is None:
+                continue
+            self.result.failed += 1
+            if sid in previous:
+                current[sid] = previous[sid]
+            else:
+                current.pop(sid, None)
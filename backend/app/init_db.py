@@ -1,14 +1,33 @@
-import gzip
-import json
 import logging
 import os
+import time
 
 import dotenv
-import requests
 import weaviate
-from weaviate.classes.config import Configure, DataType, Property
+from redis.exceptions import RedisError
+from weaviate.classes.config import Configure, DataType, Property, Tokenization
 
+from app.facets import (
+    FacetCounter,
+    facets_from_collection,
+    facets_from_index,
+    save_global_facets,
+)
+from app.ingestion import (
+    Checkpoint,
+    DeltaIngestion,
+    IngestionPipeline,
+    Manifest,
+    has_legacy_uuids,
+    rekey_legacy_objects,
+)
+from app.locks import RenewingLock
 from app.logger_setup import logger  # Import your logger cleanly
+from app.ranking import reset_rankings, update_rankings
+from app.similar import mark_stale
+from app.snapshot import resolve_snapshot, restore_snapshot
+from app.utils import get_redis_client, get_redis_sync_client
+from app.vector_engine import LocalIndex
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -17,23 +36,114 @@ dotenv.load_dotenv()
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("weaviate").setLevel(logging.WARNING)
 
+# "delta" syncs an existing collection with RAW_URL on startup instead of
+# skipping ingestion; only new or changed products are written
+INGEST_MODE = os.getenv("INGEST_MODE", "full").lower()
+# Snapshot (or root of snapshots) to load an empty collection from, instead
+# of ingesting RAW_URL; see app.snapshot
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+
+# Stable identity of a source record; delta ingestion keys products by it
+SOURCE_ID_PROPERTY = Property(
+    name="parent_asin",
+    data_type=DataType.TEXT,
+    index_filterable=True,
+    index_searchable=False,
+    tokenization=Tokenization.FIELD,
+    module_config={"text2vec-openai": {"skip": True}},
+)
+
+# Word-tokenized copy of `store` that keyword search matches against; `store`
+# itself is FIELD-tokenized so store filters only match the whole name
+STORE_TEXT_PROPERTY = Property(
+    name="store_text",
+    data_type=DataType.TEXT,
+    index_filterable=False,
+    index_searchable=True,
+    tokenization=Tokenization.WORD,
+    module_config={"text2vec-openai": {"skip": True}},
+)
+
+# Shared by every worker: only the lock holder initializes the database
+INGESTION_STATUS_KEY = "ingestion:status"
+INGESTION_LOCK_KEY = "ingestion:lock"
+INGESTION_LOCK_TTL_MS = int(os.getenv("INGESTION_LOCK_TTL_MS", "30000"))
+# How long a worker trusts the shared status it last read
+INGESTION_STATUS_TTL = float(os.getenv("INGESTION_STATUS_TTL", "2"))
+
+# Last known status in this process, and when it was read; Redis holds the
+# shared one
 ingestion_complete = False
+ingestion_checked_at = 0.0
 
 
 def set_ingestion_complete():
     global ingestion_complete
     ingestion_complete = True
+    try:
+        get_redis_sync_client().set(INGESTION_STATUS_KEY, "complete")
+    except RedisError as e:
+        logger.warning(f"Could not publish ingestion status: {e}")
 
 
 def reset_ingestion_status():
     global ingestion_complete
     ingestion_complete = False
+    try:
+        # Set rather than deleted: a missing key means Redis lost it
+        get_redis_sync_client().set(INGESTION_STATUS_KEY, "in_progress")
+    except RedisError as e:
+        logger.warning(f"Could not reset ingestion status: {e}")
 
 
 def get_ingestion_status():
     return ingestion_complete
 
 
+async def load_ingestion_status():
+    """
+    Refreshes this worker's view of the shared ingestion status, at most
+    every INGESTION_STATUS_TTL seconds. The status is re-read even once
+    complete, since another worker may have started a re-ingestion.
+
+    If the key is gone (Redis restarted without its data), a worker that
+    knew ingestion was complete publishes that again, so workers started
+    since don't wait for an ingestion that will never run.
+    """
+    global ingestion_complete, ingestion_checked_at
+    if time.monotonic() - ingestion_checked_at >= INGESTION_STATUS_TTL:
+        try:
+            redis = get_redis_client()
+            status = await redis.get(INGESTION_STATUS_KEY)
+            if status is None and ingestion_complete:
+                await redis.set(INGESTION_STATUS_KEY, "complete", nx=True)
+                status = await redis.get(INGESTION_STATUS_KEY)
+            ingestion_complete = status == "complete"
+            ingestion_checked_at = time.monotonic()
+        except RedisError as e:
+            logger.warning(f"Could not read ingestion status: {e}")
+    return ingestion_complete
+
+
+class IngestionLock(RenewingLock):
+    """
+    Lock electing the one worker that initializes the database.
+    """
+
+    def __init__(self, key=INGESTION_LOCK_KEY, ttl_ms=INGESTION_LOCK_TTL_MS):
+        super().__init__(key, ttl_ms)
+
+    def acquire(self) -> bool:
+        """
+        True if this worker is the leader. Without Redis every worker is.
+        """
+        try:
+            return super().acquire()
+        except RedisError as e:
+            logger.warning(f"Ingestion lock unavailable, proceeding alone: {e}")
+            return True
+
+
 def wait_for_schema_ready(client, retries=30, delay=2):
     import time
 
@@ -49,6 +159,26 @@ def wait_for_schema_ready(client, retries=30, delay=2):
 
 
 def initialize_database():
+    """
+    Creates and populates the `Product` collection when needed. Returns a
+    fingerprint of the newly ingested catalog, or None if it was unchanged.
+
+    Only the worker holding the ingestion lock does this; the others return
+    at once and serve, picking up the result through the shared status and
+    catalog version.
+    """
+    lock = IngestionLock()
+    if not lock.acquire():
+        logger.info("Another worker is initializing the database; serving meanwhile.")
+        return None
+    try:
+        return _initialize_database()
+    finally:
+        lock.release()
+
+
+def _initialize_database():
+    fingerprint = None
     client = weaviate.connect_to_custom(
         http_host="weaviate",
         http_port=8080,
@@ -63,7 +193,10 @@ def initialize_database():
     force_initialize = os.getenv("FORCE_INITIALIZE_DB", "false").lower() == "true"
 
     if force_initialize and "Product" in client.collections.list_all():
+        reset_ingestion_status()
         client.collections.delete("Product")
+        Checkpoint().clear()
+        Manifest().clear()
         logger.info(
             "✅ Deleted 'Product' collection as requested by FORCE_INITIALIZE_DB"
         )
@@ -75,153 +208,230 @@ def initialize_database():
                 Property(
                     name="product_id",
                     data_type=DataType.INT,
+                    index_filterable=True,
+                    index_range_filters=True,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
+                SOURCE_ID_PROPERTY,
                 Property(
                     name="title",
                     data_type=DataType.TEXT,
+                    index_searchable=True,
+                    tokenization=Tokenization.WORD,
                     module_config={"text2vec-openai": {"vectorize": True}},
                 ),
                 Property(
                     name="average_rating",
                     data_type=DataType.NUMBER,
+                    index_filterable=True,
+                    index_range_filters=True,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
                 Property(
                     name="rating_number",
                     data_type=DataType.INT,
+                    index_filterable=True,
+                    index_range_filters=True,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
                 Property(
                     name="features",
                     data_type=DataType.TEXT_ARRAY,
+                    index_filterable=False,
+                    index_searchable=False,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
                 Property(
                     name="description",
                     data_type=DataType.TEXT,
+                    index_searchable=True,
+                    tokenization=Tokenization.WORD,
                     module_config={"text2vec-openai": {"vectorize": True}},
                 ),
                 Property(
                     name="price",
                     data_type=DataType.NUMBER,
+                    index_filterable=True,
+                    index_range_filters=True,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
                 Property(
                     name="store",
                     data_type=DataType.TEXT,
+                    index_filterable=True,
+                    index_searchable=True,
+                    tokenization=Tokenization.FIELD,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
+                STORE_TEXT_PROPERTY,
                 Property(
                     name="details",
                     data_type=DataType.TEXT,
+                    index_filterable=False,
+                    index_searchable=False,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
                 Property(
                     name="main_hi_res_image",
                     data_type=DataType.TEXT,
+                    index_filterable=False,
+                    index_searchable=False,
                     module_config={"text2vec-openai": {"skip": True}},
                 ),
             ],
             vectorizer_config=Configure.Vectorizer.text2vec_openai(
                 model="text-embedding-3-small"
             ),
+            # BM25 half of hybrid search
+            inverted_index_config=Configure.inverted_index(bm25_b=0.75, bm25_k1=1.2),
         )
         logger.info("✅ Created 'Product' schema.")
-        populate_collection(collection)
+        fingerprint = fill_collection(collection)
     else:
         collection = client.collections.get("Product")
-        if collection.aggregate.over_all(total_count=True).total_count == 0:
+        upgrade_schema(collection)
+        if has_legacy_uuids(collection):
+            # Lookups by id and delta upserts address objects by product_uuid
+            logger.info("Moving products stored under random UUIDs to product_uuid")
+            moved = rekey_legacy_objects(collection)
+            logger.info(f"✅ Re-keyed {moved} products.")
+        if Checkpoint().exists():
+            logger.info("✅ Found an unfinished ingestion checkpoint; resuming.")
+            fingerprint = populate_collection(collection)
+        elif collection.aggregate.over_all(total_count=True).total_count == 0:
             logger.info(
                 "✅ Found existing 'Product' collection with zero objects; populating."
             )
-            populate_collection(collection)
+            fingerprint = fill_collection(collection)
+        elif INGEST_MODE == "delta":
+            fingerprint = sync_collection(collection)
         else:
             logger.info("DB already initialized; skipping ingestion.")
             set_ingestion_complete()
 
     client.close()
     logger.info("✅ Weaviate client closed.")
+    return fingerprint
+
+
+def upgrade_schema(collection):
+    """
+    Adds properties introduced since `collection` was created. Tokenization
+    cannot change in place, so a word-tokenized `store` is only reported.
+    """
+    properties = {prop.name: prop for prop in collection.config.get().properties}
+    for prop in (SOURCE_ID_PROPERTY, STORE_TEXT_PROPERTY):
+        if prop.name not in properties:
+            collection.config.add_property(prop)
+    store = properties.get("store")
+    if store is not None and store.tokenization == Tokenization.WORD:
+        logger.warning(
+            "'store' is word-tokenized, so store filters also match stores "
+            "sharing a word; recreate the collection (FORCE_INITIALIZE_DB=true "
+            "or a snapshot) to filter on the exact name"
+        )
+
+
+def queue_similar_refresh(product_ids=None):
+    """
+    Asks the background job to rebuild neighbor lists: all of them, or
+    only those of `product_ids`.
+    """
+    try:
+        mark_stale(get_redis_sync_client(), product_ids)
+    except RedisError as e:
+        logger.warning(f"Could not queue neighbor list refresh: {e}")
 
 
-def populate_collection(collection):
+def queue_ranking_refresh(products=None, removed_ids=()):
+    """
+    Rescores changed products in the ranking tables, or with no `products`
+    asks the background job to rebuild them all.
+    """
+    try:
+        if products is None:
+            reset_rankings(get_redis_sync_client())
+        else:
+            update_rankings(get_redis_sync_client(), products, removed_ids)
+    except RedisError as e:
+        logger.warning(f"Could not queue ranking refresh: {e}")
+
+
+def store_global_facets(facets: FacetCounter):
+    try:
+        save_global_facets(get_redis_sync_client(), facets)
+    except RedisError as e:
+        logger.warning(f"Could not store facet counts: {e}")
+
+
+def source_config():
     raw_url = os.getenv("RAW_URL")
     if not raw_url:
         raise ValueError("RAW_URL is not set in environment variables.")
 
     no_of_products = os.getenv("NO_OF_PRODUCTS")
     no_of_products = int(no_of_products) if no_of_products else None
+    return raw_url, no_of_products
 
-    logger.info(f"🔗 Starting download and ingestion from {raw_url}")
 
-    resp = requests.get(raw_url, stream=True)
-    resp.raise_for_status()
-    logger.info("✅ Successfully downloaded and opened raw gzip file.")
+def fill_collection(collection):
+    """
+    Loads an empty collection from SNAPSHOT_PATH when a snapshot is there,
+    otherwise ingests RAW_URL. Returns the catalog fingerprint.
+    """
+    snapshot = resolve_snapshot(SNAPSHOT_PATH)
+    if snapshot is None:
+        return populate_collection(collection)
+    reset_ingestion_status()
+    version = restore_snapshot(collection, snapshot)
+    store_global_facets(facets_from_index(LocalIndex(snapshot, use_hnsw=False)))
+    set_ingestion_complete()
+    queue_similar_refresh()
+    queue_ranking_refresh()
+    # Every environment restored from one snapshot shares a catalog version
+    return f"snapshot:{version}"
+
+
+def populate_collection(collection, workers=None):
+    # Workers stop reporting ready until the collection is complete again
+    reset_ingestion_status()
+    raw_url, no_of_products = source_config()
+
+    logger.info(f"🔗 Starting download and ingestion from {raw_url}")
 
     if no_of_products:
         logger.info(f"🔢 Will ingest up to {no_of_products} products as configured.")
     else:
         logger.info("🔢 Will ingest all available products.")
 
-    # Full download is necessary to read the lines, but ingestion is limited by no_of_products
-    inserted_products = 0
-    batch = []
-    with gzip.GzipFile(fileobj=resp.raw) as gz:
-        for i, line in enumerate(gz, start=1):
-            if no_of_products is not None and i > no_of_products:
-                break
-            rec = json.loads(line.decode("utf-8"))
-
-            props = {
-                "product_id": i,
-                "title": rec.get("title", ""),
-                "store": rec.get("store", ""),
-                "description": (
-                    " ".join(rec["description"])
-                    if isinstance(rec.get("description", []), list)
-                    else rec.get("description", "")
-                ),
-                "features": rec.get("features", []),
-                "average_rating": (
-                    float(rec.get("average_rating"))
-                    if rec.get("average_rating") is not None
-                    else -1.0
-                ),
-                "rating_number": (
-                    int(rec.get("rating_number"))
-                    if rec.get("rating_number") is not None
-                    else -1
-                ),
-                "price": (
-                    float(rec.get("price")) if rec.get("price") is not None else -1.0
-                ),
-                "details": json.dumps(rec.get("details", {})),
-                "main_hi_res_image": (
-                    next(
-                        (
-                            (img.get("hi_res") or "").replace(
-                                "https://m.media-amazon.com/images/I/", ""
-                            )
-                            for img in rec.get("images", [])
-                            if img.get("variant", "").lower() == "main"
-                        ),
-                        "",
-                    )
-                    if isinstance(rec.get("images", []), list)
-                    else ""
-                ),
-            }
-            batch.append(props)
-            if len(batch) == 50:
-                collection.data.insert_many(batch)
-                inserted_products += len(batch)
-                batch.clear()
-                if inserted_products % 1000 == 0:
-                    logger.info(f"Ingested {inserted_products} products")
-
-    if batch:
-        collection.data.insert_many(batch)
-        inserted_products += len(batch)
-
-    logger.info(f"✅ Finished ingestion. Total products inserted: {inserted_products}")
+    facets = FacetCounter()
+    pipeline = IngestionPipeline(
+        collection, raw_url, limit=no_of_products, workers=workers, facets=facets
+    )
+    inserted = pipeline.run()
+    # Products written before a restart were not counted
+    store_global_facets(
+        facets_from_collection(collection) if pipeline.resumed else facets
+    )
+    set_ingestion_complete()
+    queue_similar_refresh()
+    queue_ranking_refresh()
+    return f"{raw_url}:{no_of_products}:{inserted}:{time.time_ns()}"
+
+
+def sync_collection(collection):
+    """
+    Delta ingestion: upserts new and changed products, deletes removed ones.
+    Returns a new catalog fingerprint, or None if nothing changed.
+    """
+    raw_url, no_of_products = source_config()
+    logger.info(f"🔗 Syncing 'Product' with {raw_url}")
+    result = DeltaIngestion(collection, raw_url, limit=no_of_products).run()
+    if result.changed:
+        store_global_facets(facets_from_collection(collection))
     set_ingestion_complete()
+    queue_similar_refresh(result.vector_changes)
+    queue_ranking_refresh(result.rescored, result.removed)
+    if not result.changed:
+        return None
+    return f"{raw_url}:{no_of_products}:delta:{time.time_ns()}"
@@ -0,0 +1,71 @@
+import os
+import time
+from collections import OrderedDict
+
+# In-process (L1) cache budget; entries also expire after at most this TTL
+L1_CACHE_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+L1_CACHE_MAX_TTL = float(os.getenv("L1_CACHE_MAX_TTL", "30"))
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU of bytes payloads with per-entry expiry.
+
+    Eviction is size-aware: entries are dropped least-recently-used first
+    until the total payload size fits in `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=L1_CACHE_MAX_BYTES, max_ttl=L1_CACHE_MAX_TTL):
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns (payload, metadata) for a live entry, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        payload, expires_at, metadata = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return payload, metadata
+
+    def set(self, key, payload, ttl, metadata=None):
+        """
+        Stores `payload` for min(ttl, max_ttl) seconds; callers pass the
+        remaining Redis TTL so L1 never outlives L2.
+        """
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0 or len(payload) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (payload, time.monotonic() + ttl, metadata)
+        self.size += len(payload)
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def delete(self, key):
+        self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import uuid
+from contextlib import asynccontextmanager
+
+from redis.exceptions import RedisError
+
+from app.logger_setup import logger
+from app.utils import get_redis_sync_client
+
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RenewingLock:
+    """
+    Redis lock for work of unknown length. The holder renews it every third
+    of `ttl_ms` from a background thread, so it outlives a long job (even
+    one blocking the event loop) but expires soon after the holder dies.
+    """
+
+    def __init__(self, key: str, ttl_ms: int):
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def acquire(self) -> bool:
+        acquired = get_redis_sync_client().set(
+            self.key, self.token, nx=True, px=self.ttl_ms
+        )
+        if acquired:
+            self._heartbeat = threading.Thread(target=self._renew, daemon=True)
+            self._heartbeat.start()
+        return bool(acquired)
+
+    def _renew(self):
+        while not self._stop.wait(self.ttl_ms / 3000):
+            try:
+                renewed = get_redis_sync_client().eval(
+                    EXTEND_LOCK_SCRIPT, 1, self.key, self.token, self.ttl_ms
+                )
+            except RedisError as e:
+                logger.warning(f"Could not renew lock {self.key}: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Lost lock {self.key}; another worker may take over")
+                return
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        try:
+            get_redis_sync_client().eval(RELEASE_LOCK_SCRIPT, 1, self.key, self.token)
+        except RedisError:
+            pass
+
+
+@asynccontextmanager
+async def renewing_lock(key: str, ttl_ms: int):
+    """
+    Holds a `RenewingLock` on `key` for the body, yielding whether it was
+    acquired; a worker that did not get it should skip the work.
+    """
+    lock = RenewingLock(key, ttl_ms)
+    acquired = await asyncio.to_thread(lock.acquire)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            await asyncio.to_thread(lock.release)
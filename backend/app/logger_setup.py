@@ -1,7 +1,14 @@
-import json
+import atexit
+import copy
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import orjson
 
 # Create logs directory if it doesn't exist
 os.makedirs("logs", exist_ok=True)
@@ -10,8 +17,31 @@ os.makedirs("logs", exist_ok=True)
 env = os.getenv("ENV", "development")
 log_level = logging.INFO if env == "production" else logging.DEBUG
 
+# Records waiting for the listener thread; beyond this they are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Per-event sampling, e.g. "request=0.1,cache_hit=0.01"; unlisted events keep all
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+# Most records per second kept for any one sampled event
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 100))
+
+# Attributes every LogRecord has; anything else came in through `extra`
+RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def parse_sample_rates(spec: str) -> dict:
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
 
 class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record. Structured fields passed via
+    `extra={...}` are emitted as top-level keys.
+    """
+
     def format(self, record):
         log_obj = {
             "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
@@ -19,7 +49,65 @@ class JsonFormatter(logging.Formatter):
             "message": record.getMessage(),
             "logger": record.name,
         }
-        return json.dumps(log_obj)
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS:
+                log_obj[key] = value
+        if record.exc_info:
+            log_obj["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(log_obj, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Thins out high-volume records tagged with `extra={"event": ...}`:
+    each event keeps a `rates[event]` fraction of its records, and at most
+    `limit` per second. Warnings and above, and untagged records, always pass.
+    """
+
+    def __init__(self, rates=None, limit=LOG_RATE_LIMIT):
+        super().__init__()
+        self.rates = parse_sample_rates(LOG_SAMPLE_RATES) if rates is None else rates
+        self.limit = limit
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(event, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return False
+        second = int(time.monotonic())
+        with self.lock:
+            window, count = self.windows.get(event, (second, 0))
+            if window != second:
+                window, count = second, 0
+            if count >= self.limit:
+                return False
+            self.windows[event] = (window, count + 1)
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Never blocks the caller: when the listener falls behind, records are
+    dropped instead of stalling the event loop.
+    """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record):
+        # Only merge the arguments here; JSON and tracebacks are rendered
+        # by the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
 # --- Single App Logger ---
@@ -29,11 +117,20 @@ logger.setLevel(log_level)
 # Console output (real-time)
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(JsonFormatter())
-logger.addHandler(console_handler)
 
 # Rotating file output (app.log)
 file_handler = RotatingFileHandler(
     "logs/app.log", maxBytes=10 * 1024 * 1024, backupCount=5
 )
 file_handler.setFormatter(JsonFormatter())
-logger.addHandler(file_handler)
+
+# Request code only enqueues; formatting and I/O happen on the listener thread
+queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+queue_handler.addFilter(SamplingFilter())
+logger.addHandler(queue_handler)
+
+listener = QueueListener(
+    queue_handler.queue, console_handler, file_handler, respect_handler_level=True
+)
+listener.start()
+atexit.register(listener.stop)
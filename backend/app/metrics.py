@@ -0,0 +1,196 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.requests import Request
+
+# Set PROMETHEUS_MULTIPROC_DIR (to an empty directory) when running several
+# workers; each worker then writes its samples there and /metrics merges them
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "request_stage_seconds",
+    "Time spent per request stage",
+    ["route", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups per key family, tier and result",
+    ["family", "tier", "result"],
+)
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "semantic_cache_lookups_total",
+    "Search queries by how the semantic cache resolved them",
+    ["result"],
+)
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "semantic_cache_similarity",
+    "Cosine similarity of new queries to their nearest recent query",
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.97, 0.98, 0.99, 1.0),
+)
+RESILIENCE_EVENTS = Counter(
+    "resilience_events_total",
+    "Timeouts, errors, breaker rejections and hedges per guarded dependency",
+    ["call", "event"],
+)
+BREAKER_OPEN = Gauge(
+    "circuit_breaker_open",
+    "1 while the circuit breaker of a dependency is open",
+    ["call"],
+    multiprocess_mode="max",
+)
+IN_FLIGHT = Gauge(
+    "requests_in_flight",
+    "Requests currently being served",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+INGEST_INSERTED = Gauge(
+    "ingestion_inserted_products",
+    "Products written by the running or last ingestion",
+    multiprocess_mode="max",
+)
+INGEST_FAILED = Gauge(
+    "ingestion_failed_products",
+    "Products rejected by the running or last ingestion",
+    multiprocess_mode="max",
+)
+INGEST_RATE = Gauge(
+    "ingestion_records_per_second",
+    "Write throughput of the running or last ingestion",
+    multiprocess_mode="max",
+)
+
+# Route template of the request being served, used to label stage timings
+current_route = ContextVar("current_route", default="none")
+
+
+def key_family(key: str) -> str:
+    """
+    Metric label for a cache key: its first segment, e.g. "query" or
+    "product_id".
+    """
+    return key.split(":", 1)[0]
+
+
+def observe(stage: str, seconds: float, route: str = None):
+    STAGE_SECONDS.labels(route or current_route.get(), stage).observe(seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Records the duration of the enclosed block as `stage` of the current route.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def count_cache(key: str, tier: str, result: str, amount: int = 1):
+    if amount:
+        CACHE_REQUESTS.labels(key_family(key), tier, result).inc(amount)
+
+
+def count_semantic(result: str, similarity: float = None):
+    SEMANTIC_CACHE_LOOKUPS.labels(result).inc()
+    if similarity is not None:
+        SEMANTIC_CACHE_SIMILARITY.observe(similarity)
+
+
+def count_resilience(call: str, event: str):
+    RESILIENCE_EVENTS.labels(call, event).inc()
+
+
+def set_breaker_open(call: str, is_open: bool):
+    BREAKER_OPEN.labels(call).set(1 if is_open else 0)
+
+
+def record_ingestion(inserted: int, failed: int, records_per_second: float):
+    INGEST_INSERTED.set(inserted)
+    INGEST_FAILED.set(failed)
+    INGEST_RATE.set(records_per_second)
+
+
+def route_template(request) -> str:
+    """
+    Path template of the route that served `request`, so labels stay bounded.
+    """
+    return getattr(request.scope.get("route"), "path", "unmatched")
+
+
+async def track_requests(request, call_next):
+    """
+    Middleware recording the total latency per route.
+    """
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        observe("total", time.perf_counter() - started, route_template(request))
+
+
+async def label_route(request: Request):
+    """
+    App-wide dependency: labels the stage timings of the endpoint with its
+    route and counts the request as in flight while the endpoint runs.
+    """
+    route = route_template(request)
+    current_route.set(route)
+    gauge = IN_FLIGHT.labels(route)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def render_metrics():
+    """
+    (body, content type) of the Prometheus text exposition; merges every
+    worker's samples in multiprocess mode.
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead():
+    """
+    Drops this worker's live gauges from the multiprocess samples on exit.
+    """
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -10,30 +10,78 @@ from fastapi.exceptions import RequestValidationError
 from starlette.responses import JSONResponse
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
-from app.init_db import initialize_database
+from app.cache import listen_for_invalidations
+from app.catalog import load_catalog_version, watch_catalog_version
+from app.facets import rebuild_facets_periodically
+from app.init_db import initialize_database, load_ingestion_status
 from app.logger_setup import logger
-from app.utils import get_redis_client, get_weaviate_client
+from app.metrics import mark_worker_dead
+from app.query_log import flush_periodically
+from app.ranking import refresh_rankings_periodically
+from app.similar import SIMILAR_BUILD_IN_WORKERS, refresh_similar_periodically
+from app.suggest import refresh_suggest_periodically
+from app.warmup import warm_cache_safely
+from app.weaviate_pool import get_weaviate_pool
+
+
+async def initialize_catalog():
+    """
+    Initializes the database (on the worker holding the ingestion lock) and
+    switches to the catalog it ingested. Runs after startup, so the worker
+    answers liveness probes during a long ingestion; readiness follows the
+    shared ingestion status.
+    """
+    try:
+        fingerprint = await asyncio.to_thread(initialize_database)
+    except Exception as e:
+        logger.error(f"Error initializing database on startup: {e}")
+        return
+    if fingerprint is None:
+        return
+    try:
+        version = await load_catalog_version(fingerprint)
+        logger.info(f"Serving catalog version {version}")
+    except Exception as e:
+        logger.error(f"Error publishing catalog version: {e}")
+        return
+    await warm_cache_safely()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    client = get_redis_client()
     try:
-        await client.flushdb()
-        logger.info("Cache cleared successfully at startup")
+        version = await load_catalog_version()
+        logger.info(f"Serving catalog version {version}")
+    except Exception as e:
+        logger.error(f"Error loading catalog version on startup: {e}")
 
-        await asyncio.gather(
-            asyncio.to_thread(initialize_database),
-        )
+    pool = get_weaviate_pool()
+    try:
+        await pool.open()
     except Exception as e:
-        logger.error(f"Error clearing Redis cache on startup: {e}")
-    yield
+        logger.error(f"Error opening Weaviate pool on startup: {e}")
+
+    background_tasks = [
+        asyncio.create_task(initialize_catalog()),
+        asyncio.create_task(refresh_rankings_periodically(load_ingestion_status)),
+        asyncio.create_task(refresh_suggest_periodically(load_ingestion_status)),
+        asyncio.create_task(rebuild_facets_periodically(load_ingestion_status)),
+        asyncio.create_task(listen_for_invalidations()),
+        asyncio.create_task(flush_periodically()),
+        asyncio.create_task(warm_cache_safely()),
+        asyncio.create_task(watch_catalog_version(warm_cache_safely)),
+    ]
+    if SIMILAR_BUILD_IN_WORKERS:
+        background_tasks.append(
+            asyncio.create_task(refresh_similar_periodically(load_ingestion_status))
+        )
     try:
-        client = get_weaviate_client()
-        yield client
+        yield
     finally:
-        client.close()
-        logger.info("Weaviate client closed successfully")
+        for task in background_tasks:
+            task.cancel()
+        await pool.close()
+        mark_worker_dead()
 
 
 async def log_slow_requests(request: Request, call_next):
@@ -44,21 +92,30 @@ async def log_slow_requests(request: Request, call_next):
     duration = time() - start_time
     if duration > 1.0:
         logger.warning(
-            f"Slow request: {request.method} {request.url} took {duration:.2f}s"
+            "Slow request",
+            extra={
+                "event": "slow_request",
+                "method": request.method,
+                "path": request.url.path,
+                "duration_s": round(duration, 3),
+            },
         )
     return response
 
 
 async def log_error_responses(request: Request, call_next):
     response = await call_next(request)
-    if response.status_code >= 500:
-        logger.error(
-            f"Server error {response.status_code} on {request.method} {request.url}"
-        )
-    elif response.status_code >= 400:
-        logger.warning(
-            f"Client error {response.status_code} on {request.method} {request.url}"
-        )
+    if response.status_code >= 400:
+        fields = {
+            "event": "error_response",
+            "status": response.status_code,
+            "method": request.method,
+            "path": request.url.path,
+        }
+        if response.status_code >= 500:
+            logger.error("Server error", extra=fields)
+        else:
+            logger.warning("Client error", extra=fields)
     return response
 
 
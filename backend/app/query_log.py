@@ -0,0 +1,78 @@
+import asyncio
+import os
+from collections import Counter
+
+from redis.exceptions import RedisError
+
+from app.logger_setup import logger
+from app.utils import get_redis_client
+
+QUERY_LOG_FLUSH_SECONDS = float(os.getenv("QUERY_LOG_FLUSH_SECONDS", "10"))
+# Entries kept per log; the long tail is trimmed on every flush
+QUERY_LOG_MAX_ENTRIES = int(os.getenv("QUERY_LOG_MAX_ENTRIES", "10000"))
+
+QUERY_LOG_KEYS = {
+    "query": "stats:queries",
+    "product_id": "stats:product_ids",
+    "store": "stats:stores",
+    # Projections of first result pages ("*" for every property), so
+    # warm-up fills the keys clients actually read
+    "fields": "stats:fields",
+}
+
+# Counts since the last flush, so requests never wait on Redis for logging
+pending = {kind: Counter() for kind in QUERY_LOG_KEYS}
+
+
+def record(kind: str, value):
+    pending[kind][str(value)] += 1
+
+
+async def flush():
+    """
+    Adds pending counts to the Redis popularity logs in one round trip.
+    """
+    batches = {kind: counts for kind, counts in pending.items() if counts}
+    if not batches:
+        return
+    for kind in batches:
+        pending[kind] = Counter()
+    pipe = get_redis_client().pipeline(transaction=False)
+    for kind, counts in batches.items():
+        key = QUERY_LOG_KEYS[kind]
+        for value, count in counts.items():
+            pipe.zincrby(key, count, value)
+        pipe.zremrangebyrank(key, 0, -QUERY_LOG_MAX_ENTRIES - 1)
+    await pipe.execute()
+
+
+async def top(kind: str, limit: int) -> list:
+    """
+    Most requested values of `kind`, most popular first.
+    """
+    if limit <= 0:
+        return []
+    return await get_redis_client().zrevrange(QUERY_LOG_KEYS[kind], 0, limit - 1)
+
+
+async def top_with_counts(kind: str, limit: int) -> list:
+    """
+    (value, count) of the most requested values of `kind`.
+    """
+    if limit <= 0:
+        return []
+    return await get_redis_client().zrevrange(
+        QUERY_LOG_KEYS[kind], 0, limit - 1, withscores=True
+    )
+
+
+async def flush_periodically():
+    """
+    Background task flushing the popularity logs.
+    """
+    while True:
+        await asyncio.sleep(QUERY_LOG_FLUSH_SECONDS)
+        try:
+            await flush()
+        except RedisError as e:
+            logger.warning(f"Query log flush failed: {e}")
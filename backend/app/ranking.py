@@ -0,0 +1,282 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from app.cache import invalidate
+from app.locks import renewing_lock
+from app.logger_setup import logger
+from app.search_backend import Condition, get_search_backend
+from app.utils import get_redis_client
+
+# Products kept per materialized ranking (global and per store)
+RANKING_SIZE = int(os.getenv("RANKING_SIZE", "200"))
+# Stores need at least this many products to get their own slice
+RANKING_STORE_MIN_PRODUCTS = int(os.getenv("RANKING_STORE_MIN_PRODUCTS", "5"))
+# How often workers check the tables' age, and the age at which they are rebuilt
+RANKING_CHECK_SECONDS = int(os.getenv("RANKING_CHECK_SECONDS", "300"))
+RANKING_REFRESH_SECONDS = int(os.getenv("RANKING_REFRESH_SECONDS", "3600"))
+# Renewed while a rebuild runs (see app.locks)
+RANKING_LOCK_TTL_MS = int(os.getenv("RANKING_LOCK_TTL_MS", "30000"))
+# Bayesian prior weight in ratings; 0 uses the median rating count
+RANKING_PRIOR_WEIGHT = float(os.getenv("RANKING_PRIOR_WEIGHT", "0"))
+
+RANKING_PROPERTIES = ["product_id", "average_rating", "rating_number", "store"]
+META_KEY = "ranking:meta"
+SLICES_KEY = "ranking:slices"
+LOCK_KEY = "ranking:lock"
+
+
+def bayesian_average(average_rating, rating_number, prior_mean, prior_weight):
+    """
+    Shrinks each product's rating towards the catalog mean by `prior_weight`
+    pseudo-ratings, so a 5.0 from two reviews does not outrank a 4.8 from
+    two thousand. Unrated products (-1 sentinels) get the prior mean.
+    """
+    rating = np.where(average_rating < 0, prior_mean, average_rating)
+    count = np.maximum(rating_number, 0)
+    return (count * rating + prior_weight * prior_mean) / (count + prior_weight)
+
+
+def best_seller_score(bayes, rating_number):
+    # Review volume is our sales proxy; weight it logarithmically by quality
+    return bayes * np.log1p(np.maximum(rating_number, 0))
+
+
+def trending_score(bayes, rating_number):
+    return bayes
+
+
+RANKINGS = {
+    "best_sellers": best_seller_score,
+    "trending": trending_score,
+}
+# Cache key of the endpoint payload built from each ranking
+PAYLOAD_KEYS = {
+    "best_sellers": "best_sellers",
+    "trending": "trending_products",
+}
+
+
+def ranking_key(name, store=None):
+    return f"ranking:{name}:store:{store}" if store else f"ranking:{name}"
+
+
+def payload_key(key: str) -> str:
+    """
+    Cache key of the endpoint payload served from ranking table `key`.
+    """
+    name, _, store = key.removeprefix("ranking:").partition(":store:")
+    base = PAYLOAD_KEYS[name]
+    return f"{base}:store:{store}" if store else base
+
+
+def compute_prior(average_rating, rating_number):
+    rated = rating_number > 0
+    if not rated.any():
+        return 0.0, max(RANKING_PRIOR_WEIGHT, 1.0)
+    prior_mean = float(np.average(average_rating[rated], weights=rating_number[rated]))
+    prior_weight = RANKING_PRIOR_WEIGHT or float(np.median(rating_number[rated]))
+    return prior_mean, max(prior_weight, 1.0)
+
+
+def compute_rankings(product_ids, average_rating, rating_number, stores):
+    """
+    Top RANKING_SIZE (product_id, score) pairs for every ranking and slice.
+
+    Returns ({redis key: [(product_id, score), ...]}, prior_mean, prior_weight).
+    """
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    average_rating = np.asarray(average_rating, dtype=np.float64)
+    rating_number = np.asarray(rating_number, dtype=np.int64)
+    store_names, store_codes = np.unique(
+        np.asarray(stores, dtype=object).astype(str), return_inverse=True
+    )
+    prior_mean, prior_weight = compute_prior(average_rating, rating_number)
+    bayes = bayesian_average(average_rating, rating_number, prior_mean, prior_weight)
+
+    tables = {}
+    store_sizes = np.bincount(store_codes, minlength=len(store_names))
+    for name, score_fn in RANKINGS.items():
+        scores = score_fn(bayes, rating_number)
+        top = np.argsort(-scores, kind="stable")[:RANKING_SIZE]
+        tables[ranking_key(name)] = list(
+            zip(product_ids[top].tolist(), scores[top].tolist())
+        )
+        # Group by store, best first within each store
+        order = np.lexsort((-scores, store_codes))
+        starts = np.searchsorted(store_codes[order], np.arange(len(store_names)))
+        for code, store in enumerate(store_names):
+            if not store or store_sizes[code] < RANKING_STORE_MIN_PRODUCTS:
+                continue
+            rows = order[
+                starts[code] : starts[code] + min(store_sizes[code], RANKING_SIZE)
+            ]
+            tables[ranking_key(name, store)] = list(
+                zip(product_ids[rows].tolist(), scores[rows].tolist())
+            )
+    return tables, prior_mean, prior_weight
+
+
+async def refresh_rankings(backend=None):
+    """
+    Recomputes every ranking from the full catalog and atomically swaps the
+    materialized sorted sets in Redis.
+    """
+    backend = backend or get_search_backend()
+    started = time.monotonic()
+    product_ids, average_rating, rating_number, stores = [], [], [], []
+    async for props, _ in backend.iter_products(properties=RANKING_PROPERTIES):
+        product_ids.append(props.get("product_id"))
+        average_rating.append(props.get("average_rating", -1.0))
+        rating_number.append(props.get("rating_number", -1))
+        stores.append(props.get("store") or "")
+    if not product_ids:
+        logger.warning("No products found; skipping ranking refresh")
+        return 0
+
+    tables, prior_mean, prior_weight = compute_rankings(
+        product_ids, average_rating, rating_number, stores
+    )
+    redis = get_redis_client()
+    old_keys = await redis.smembers(SLICES_KEY)
+    pipe = redis.pipeline(transaction=False)
+    for key, entries in tables.items():
+        pipe.delete(f"{key}:tmp")
+        pipe.zadd(f"{key}:tmp", {str(pid): score for pid, score in entries})
+        pipe.rename(f"{key}:tmp", key)
+    stale = set(old_keys) - set(tables)
+    if stale:
+        pipe.delete(*stale)
+    pipe.delete(SLICES_KEY)
+    pipe.sadd(SLICES_KEY, *tables)
+    pipe.hset(
+        META_KEY,
+        mapping={
+            "prior_mean": prior_mean,
+            "prior_weight": prior_weight,
+            "refreshed_at": time.time(),
+        },
+    )
+    await pipe.execute()
+    # Drop the cached endpoint payloads, store slices included, so they are
+    # rebuilt from the new tables
+    await invalidate(*{payload_key(key) for key in set(tables) | set(old_keys)})
+    logger.info(
+        f"✅ Refreshed {len(tables)} ranking tables over {len(product_ids)} products "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return len(tables)
+
+
+def update_rankings(redis, products, removed_ids=()):
+    """
+    Incrementally rescores changed products against the stored prior and
+    removes deleted ones, in the global tables and the existing store
+    slices. Cached payloads turn over with the catalog version; the prior
+    and new slices wait for the periodic full refresh.
+    """
+    meta = redis.hgetall(META_KEY)
+    if not meta:
+        return
+    prior_mean, prior_weight = float(meta["prior_mean"]), float(meta["prior_weight"])
+    slices = redis.smembers(SLICES_KEY)
+    pipe = redis.pipeline(transaction=False)
+    # Products may have moved store; drop them everywhere before re-adding
+    stale_ids = [str(pid) for pid in removed_ids]
+    stale_ids += [str(product["product_id"]) for product in products]
+    if stale_ids:
+        for key in slices:
+            pipe.zrem(key, *stale_ids)
+    if products:
+        average_rating = np.array([p.get("average_rating", -1.0) for p in products])
+        rating_number = np.array([p.get("rating_number", -1) for p in products])
+        bayes = bayesian_average(
+            average_rating, rating_number, prior_mean, prior_weight
+        )
+        for name, score_fn in RANKINGS.items():
+            scores = score_fn(bayes, rating_number)
+            keys = set()
+            for product, score in zip(products, scores.tolist()):
+                for key in {
+                    ranking_key(name),
+                    ranking_key(name, product.get("store") or None),
+                }:
+                    if key in slices:
+                        pipe.zadd(key, {str(product["product_id"]): score})
+                        keys.add(key)
+            for key in keys:
+                pipe.zremrangebyrank(key, 0, -RANKING_SIZE - 1)
+    pipe.execute()
+
+
+def reset_rankings(redis):
+    """
+    Makes the next periodic check rebuild every table, e.g. after a full
+    re-ingestion.
+    """
+    redis.delete(META_KEY)
+
+
+async def get_ranked_ids(name, store=None, limit=20):
+    """
+    Best `limit` product ids of a materialized ranking; empty if not built.
+    """
+    ids = await get_redis_client().zrevrange(ranking_key(name, store), 0, limit - 1)
+    return [int(pid) for pid in ids]
+
+
+async def top_products(name, store=None, limit=20):
+    """
+    Products of a materialized ranking. Until the tables have been built,
+    falls back to re-sorting the most-rated window at request time.
+    """
+    backend = get_search_backend()
+    ids = await get_ranked_ids(name, store, limit)
+    if ids:
+        return await backend.fetch_by_ids(ids)
+    products = await backend.fetch_objects(
+        limit=RANKING_SIZE,
+        sort_by="rating_number",
+        descending=True,
+        filters=(Condition("store", "eq", store),) if store else (),
+    )
+    return sorted(products, key=lambda x: x.get("average_rating", 0), reverse=True)[
+        :limit
+    ]
+
+
+async def refresh_rankings_if_stale(backend=None):
+    """
+    Rebuilds the tables when they are missing or older than
+    RANKING_REFRESH_SECONDS. Workers that find a rebuild in progress skip
+    it and pick up its tables.
+    """
+    redis = get_redis_client()
+    async with renewing_lock(LOCK_KEY, RANKING_LOCK_TTL_MS) as acquired:
+        if not acquired:
+            return 0
+        refreshed_at = await redis.hget(META_KEY, "refreshed_at")
+        if (
+            refreshed_at is not None
+            and time.time() - float(refreshed_at) < RANKING_REFRESH_SECONDS
+        ):
+            return 0
+        return await refresh_rankings(backend)
+
+
+async def refresh_rankings_periodically(is_ready):
+    """
+    Background task: builds the rankings once `await is_ready()` is true,
+    then keeps them fresh, pausing while a re-ingestion is under way.
+    """
+    while not await is_ready():
+        await asyncio.sleep(5)
+    while True:
+        try:
+            if await is_ready():
+                await refresh_rankings_if_stale()
+        except Exception as e:
+            logger.error(f"Ranking refresh failed: {e}")
+        await asyncio.sleep(RANKING_CHECK_SECONDS)
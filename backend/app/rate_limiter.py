@@ -0,0 +1,118 @@
+import math
+import os
+from contextvars import ContextVar
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
+
+from app.logger_setup import logger
+from app.utils import get_redis_client
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Budget for requests that miss the cache, on routes that don't set one
+RATE_LIMIT_MISSES = os.getenv("RATE_LIMIT_MISSES", "20/minute")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Token bucket refilled continuously at capacity / period. Uses the server
+# clock so every worker agrees on time. Returns {allowed, retry_after_ms}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period_ms = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call("TIME")
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * capacity / period_ms)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) * period_ms / capacity)
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", now)
+redis.call("PEXPIRE", KEYS[1], period_ms)
+return {allowed, retry_after}
+"""
+
+# (client, route, miss limit) of the request being served, if limited
+current_limit = ContextVar("current_limit", default=None)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def parse_limit(limit_string: str):
+    """
+    "60/minute" -> (60, 60000): bucket capacity and refill period (ms).
+    """
+    count, _, period = limit_string.partition("/")
+    return int(count), PERIODS[period.strip().rstrip("s")] * 1000
+
+
+def client_id(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def take(key: str, limit_string: str, cost: int = 1):
+    """
+    Takes `cost` tokens from the bucket at `key` in one atomic round trip.
+    Raises RateLimitExceeded when the bucket is empty. Fails open when
+    Redis is unavailable.
+    """
+    capacity, period_ms = parse_limit(limit_string)
+    try:
+        allowed, retry_after_ms = await get_redis_client().eval(
+            TOKEN_BUCKET_SCRIPT, 1, key, capacity, period_ms, cost
+        )
+    except RedisError as e:
+        logger.warning(f"Rate limit check failed for {key}: {e}")
+        return
+    if not allowed:
+        raise RateLimitExceeded(int(retry_after_ms) / 1000)
+
+
+async def enforce_rate_limit(request: Request):
+    """
+    App-wide dependency applying the route's `rate_limit` annotation to
+    the calling client, and arming its cache-miss budget for `charge_miss`.
+    """
+    route = request.scope.get("route")
+    limit_string = getattr(getattr(route, "endpoint", None), "__rate_limit__", None)
+    if not RATE_LIMIT_ENABLED or limit_string is None:
+        return
+    client = client_id(request)
+    await take(f"ratelimit:{route.path}:{client}", limit_string)
+    miss_limit = getattr(route.endpoint, "__miss_rate_limit__", RATE_LIMIT_MISSES)
+    current_limit.set((client, route.path, miss_limit))
+
+
+async def charge_miss(cost: int = 1):
+    """
+    Takes from the current client's cache-miss budget before work that has
+    to reach the search engine. A no-op outside rate-limited requests,
+    e.g. warm-up and background refreshes.
+    """
+    limit = current_limit.get()
+    if limit is None:
+        return
+    client, route, miss_limit = limit
+    await take(f"ratelimit:miss:{route}:{client}", miss_limit, cost)
+
+
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"ok": False, "error": "Rate limit exceeded"},
+        headers={"Retry-After": str(max(math.ceil(exc.retry_after), 1))},
+    )
@@ -0,0 +1,313 @@
+"""
+Keeps request latency bounded when Weaviate or the embedding service slow
+down or fail.
+
+Calls made through `guarded` run within the deadline of the route being
+served (see `utils.deadline`), through a circuit breaker per dependency
+that fails fast while it is unhealthy, and optionally get a hedged
+duplicate once they take longer than the dependency's recent p95. While a
+breaker is open, app.cache serves expired entries from their grace period
+instead of recomputing them.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from app.logger_setup import logger
+from app.metrics import count_resilience, set_breaker_open
+
+# Duplicate slow search queries after the recent p95 latency
+SEARCH_HEDGE_ENABLED = os.getenv("SEARCH_HEDGE_ENABLED", "false").lower() == "true"
+SEARCH_HEDGE_MIN_DELAY = float(os.getenv("SEARCH_HEDGE_MIN_DELAY", "0.05"))
+# Latencies kept per dependency, and how many are needed before hedging
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "512"))
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", "50"))
+# The breaker trips when, over the last window, at least BREAKER_MIN_CALLS
+# calls were made and too large a share of them failed or were slow
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "10"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "1.0"))
+# How long a tripped breaker rejects calls before letting a probe through
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "5"))
+
+# Monotonic time by which the request being served must be answered
+current_deadline = ContextVar("current_deadline", default=None)
+
+
+class SearchUnavailable(Exception):
+    """
+    A guarded dependency could not answer in time; served as a 503.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(SearchUnavailable):
+    def __init__(self, call: str):
+        super().__init__(f"{call} did not answer within the request deadline")
+
+
+class CircuitOpen(SearchUnavailable):
+    def __init__(self, call: str, retry_after: float):
+        super().__init__(f"{call} circuit breaker is open", retry_after)
+
+
+class CircuitBreaker:
+    """
+    Closed, it records the outcome of every call over a sliding window and
+    opens when enough calls failed or were slow. Open, it rejects calls for
+    `open_seconds`, then lets a single probe through (half-open) whose
+    outcome closes it or opens it again.
+    """
+
+    def __init__(
+        self,
+        name,
+        window=BREAKER_WINDOW_SECONDS,
+        min_calls=BREAKER_MIN_CALLS,
+        error_rate=BREAKER_ERROR_RATE,
+        slow_rate=BREAKER_SLOW_RATE,
+        slow_seconds=BREAKER_SLOW_SECONDS,
+        open_seconds=BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        # (finished at, failed, slow) of calls in the window, with totals
+        self.outcomes = deque()
+        self.failed = 0
+        self.slow = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpen when the call must not be made. Returns True if
+        the call is the half-open probe.
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        retry_after = self.opened_at + self.open_seconds - time.monotonic()
+        raise CircuitOpen(self.name, max(retry_after, 1.0))
+
+    def record(self, seconds: float, failed: bool, probe: bool = False):
+        slow = seconds >= self.slow_seconds
+        if self.opened_at is not None:
+            # Calls started before the breaker opened don't decide its state
+            if probe:
+                self.probing = False
+                if failed or slow:
+                    self._open()
+                else:
+                    self._close()
+            return
+        now = time.monotonic()
+        self.outcomes.append((now, failed, slow))
+        self.failed += failed
+        self.slow += slow
+        while self.outcomes[0][0] < now - self.window:
+            _, old_failed, old_slow = self.outcomes.popleft()
+            self.failed -= old_failed
+            self.slow -= old_slow
+        calls = len(self.outcomes)
+        if calls >= self.min_calls and (
+            self.failed >= calls * self.error_rate
+            or self.slow >= calls * self.slow_rate
+        ):
+            self._open()
+
+    def cancel_probe(self, probe: bool):
+        if probe:
+            self.probing = False
+
+    def _open(self):
+        if self.opened_at is None:
+            logger.warning(
+                f"Circuit breaker for {self.name} opened "
+                f"({self.failed} failed, {self.slow} slow of {len(self.outcomes)})"
+            )
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self.failed = self.slow = 0
+        set_breaker_open(self.name, True)
+
+    def _close(self):
+        logger.info(f"Circuit breaker for {self.name} closed")
+        self.opened_at = None
+        set_breaker_open(self.name, False)
+
+
+class LatencyTracker:
+    """
+    Ring buffer of recent successful call latencies; the p95 is recomputed
+    every few samples rather than per call.
+    """
+
+    def __init__(self, size=LATENCY_WINDOW, min_samples=LATENCY_MIN_SAMPLES):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.min_samples = min_samples
+        self.count = 0
+        self._p95 = None
+
+    def record(self, seconds: float):
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+        if self.count >= self.min_samples and self.count % 16 == 0:
+            filled = self.samples[: min(self.count, len(self.samples))]
+            self._p95 = float(np.percentile(filled, 95))
+
+    def p95(self):
+        return self._p95
+
+
+breakers = {}
+latencies = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = breakers.get(name)
+    if breaker is None:
+        breaker = breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def get_latencies(name: str) -> LatencyTracker:
+    tracker = latencies.get(name)
+    if tracker is None:
+        tracker = latencies[name] = LatencyTracker()
+    return tracker
+
+
+def degraded() -> bool:
+    """
+    True while any dependency's breaker is open (not while probing).
+    """
+    return any(breaker.state == "open" for breaker in breakers.values())
+
+
+def remaining_time():
+    """
+    Seconds left before the current request's deadline, or None.
+    """
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def hedged(call, delay: float, name: str):
+    """
+    Runs `call()`, and a second copy if the first has not finished after
+    `delay` seconds. The first successful result wins; the other is
+    cancelled.
+    """
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+        count_resilience(name, "hedged")
+        tasks.append(asyncio.ensure_future(call()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def guarded(name: str, call, hedge: bool = False):
+    """
+    Awaits `call()` for dependency `name` within the current deadline and
+    through its circuit breaker. With `hedge` (and SEARCH_HEDGE_ENABLED),
+    a duplicate call is started once the recent p95 latency has passed.
+    Raises SearchUnavailable when the deadline passes or the breaker is open.
+    """
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        count_resilience(name, "timeout")
+        raise DeadlineExceeded(name)
+    breaker = get_breaker(name)
+    try:
+        probe = breaker.before_call()
+    except CircuitOpen:
+        count_resilience(name, "rejected")
+        raise
+    tracker = get_latencies(name)
+    delay = tracker.p95() if hedge and SEARCH_HEDGE_ENABLED else None
+
+    started = time.monotonic()
+    try:
+        if delay is None:
+            work = call()
+        else:
+            work = hedged(call, max(delay, SEARCH_HEDGE_MIN_DELAY), name)
+        result = await asyncio.wait_for(work, remaining)
+    except asyncio.TimeoutError:
+        breaker.record(time.monotonic() - started, True, probe)
+        count_resilience(name, "timeout")
+        raise DeadlineExceeded(name)
+    except asyncio.CancelledError:
+        breaker.cancel_probe(probe)
+        raise
+    except Exception:
+        breaker.record(time.monotonic() - started, True, probe)
+        count_resilience(name, "error")
+        raise
+    elapsed = time.monotonic() - started
+    breaker.record(elapsed, False, probe)
+    tracker.record(elapsed)
+    return result
+
+
+async def start_deadline(request: Request):
+    """
+    App-wide dependency starting the route's `deadline` annotation, which
+    then bounds every guarded call made for the request.
+    """
+    route = request.scope.get("route")
+    seconds = getattr(getattr(route, "endpoint", None), "__deadline__", None)
+    if seconds is not None:
+        current_deadline.set(time.monotonic() + seconds)
+
+
+async def search_unavailable_handler(request: Request, exc: SearchUnavailable):
+    logger.warning(f"Search unavailable: {exc} on {request.url}")
+    return JSONResponse(
+        status_code=503,
+        content={"ok": False, "error": "Search temporarily unavailable"},
+        headers={"Retry-After": str(max(math.ceil(exc.retry_after), 1))},
+    )
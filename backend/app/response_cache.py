@@ -0,0 +1,132 @@
+import gzip
+import json
+import os
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.cache import CACHE_TTL, cached
+from app.metrics import timed
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd falls back to gzip without it
+    zstandard = None
+
+# "none", "gzip" or "zstd"; bodies are compressed once, at cache-fill time
+RESPONSE_CACHE_COMPRESSION = os.getenv("RESPONSE_CACHE_COMPRESSION", "gzip").lower()
+RESPONSE_COMPRESSION_MIN_BYTES = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")
+)
+JSON_MEDIA_TYPE = "application/json"
+
+
+def dumps(obj) -> bytes:
+    """
+    Fast compact JSON serialization for cache fills.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5, mtime=0)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(body)
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    return body
+
+
+def _fill_encoding(size):
+    encoding = RESPONSE_CACHE_COMPRESSION
+    if encoding == "none" or size < RESPONSE_COMPRESSION_MIN_BYTES:
+        return "identity"
+    if encoding == "zstd" and zstandard is None:
+        return "gzip"
+    return encoding
+
+
+def pack_body(body: bytes, media_type=JSON_MEDIA_TYPE) -> bytes:
+    """
+    Stored entry: "<content-encoding>\\n<content-type>\\n<body>".
+    """
+    encoding = _fill_encoding(len(body))
+    if encoding != "identity":
+        body = compress(body, encoding)
+    return b"%s\n%s\n%s" % (encoding.encode(), media_type.encode(), body)
+
+
+def unpack_body(entry: bytes):
+    """
+    Splits a stored entry into (encoding, media type, body).
+    """
+    encoding, media_type, body = entry.split(b"\n", 2)
+    return encoding.decode(), media_type.decode(), body
+
+
+def accepts_encoding(request: Request, encoding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() in (encoding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def render(request: Request, entry: bytes, status_code=200) -> Response:
+    """
+    Builds a raw response from a stored entry without re-encoding the body.
+    Compressed bodies are only decompressed for clients that cannot take them.
+    """
+    encoding, media_type, body = unpack_body(entry)
+    headers = {}
+    if encoding != "identity":
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_encoding(request, encoding):
+            headers["Content-Encoding"] = encoding
+        else:
+            body = decompress(body, encoding)
+    return Response(
+        content=body, status_code=status_code, media_type=media_type, headers=headers
+    )
+
+
+async def cached_entry(key: str, compute, ttl=CACHE_TTL):
+    """
+    Returns the stored entry for `key`, filling it from `compute()` on a
+    miss. `compute()` returns the response object to serialize, or None
+    when nothing should be cached; in that case None is returned.
+    """
+
+    async def fill():
+        content = await compute()
+        if content is None:
+            return None
+        with timed("serialize"):
+            return pack_body(dumps(content))
+
+    return await cached(key, fill, ttl)
+
+
+async def cached_response(request: Request, key: str, compute, ttl=CACHE_TTL):
+    """
+    Serves `key` as pre-serialized (and possibly compressed) bytes; see
+    `cached_entry`.
+    """
+    entry = await cached_entry(key, compute, ttl)
+    return None if entry is None else render(request, entry)
+
+
+def json_response(body: bytes, status_code=200) -> Response:
+    return Response(content=body, status_code=status_code, media_type=JSON_MEDIA_TYPE)
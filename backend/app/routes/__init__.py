@@ -1,6 +1,19 @@
 from app.routes.best_sellers import router as best_seller_router
+from app.routes.facets import router as facets_router
 from app.routes.health import router as health_router
+from app.routes.metrics import router as metrics_router
 from app.routes.products import router as products_router
+from app.routes.similar import router as similar_router
+from app.routes.suggest import router as suggest_router
 from app.routes.trending import router as trending_router
 
-routers = [products_router, health_router, trending_router, best_seller_router]
+routers = [
+    products_router,
+    facets_router,
+    similar_router,
+    suggest_router,
+    health_router,
+    trending_router,
+    best_seller_router,
+    metrics_router,
+]
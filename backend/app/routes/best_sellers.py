@@ -1,35 +1,38 @@
-import json
-
 from fastapi import APIRouter, Request
-from weaviate.classes.query import Sort
 
+from app import query_log
 from app.logger_setup import logger
-from app.utils import get_product_collection, get_redis_client, rate_limit
+from app.metrics import timed
+from app.ranking import top_products
+from app.response_cache import cached_entry, render
+from app.utils import cache_control, deadline, rate_limit
 
 router = APIRouter()
 
 
+async def best_sellers_entry(store: str = None):
+    """
+    Cached best sellers response entry, optionally for one store.
+    """
+    cache_key = f"best_sellers:store:{store}" if store else "best_sellers"
+
+    async def rank():
+        with timed("search"):
+            products = await top_products("best_sellers", store)
+        return {"ok": True, "products": products} if products else None
+
+    return await cached_entry(cache_key, rank)
+
+
 @router.get("/best-sellers")
 @rate_limit("60/minute")
-async def get_best_sellers(request: Request):
-    logger.info("Fetching best-sellers")
-    cached = await get_redis_client().get("best_sellers")
-    if cached:
-        logger.info("Cache hit for best-sellers")
-        return {"ok": True, "products": json.loads(cached)}
-
-    async with get_product_collection() as (client, product_collection):
-        result = product_collection.query.fetch_objects(
-            limit=200,
-            sort=Sort.by_property(name="rating_number", ascending=False),
-        )
-        if not result.objects:
-            return {"ok": False, "error": "No products found"}
-
-        top_20 = sorted(
-            [obj.properties for obj in result.objects],
-            key=lambda x: x.get("average_rating", 0),
-            reverse=True,
-        )[:20]
-        await get_redis_client().setex("best_sellers", 3600, json.dumps(top_20))
-        return {"ok": True, "products": top_20}
+@cache_control(120, stale_while_revalidate=600)
+@deadline(1.0)
+async def get_best_sellers(request: Request, store: str = None):
+    logger.info("Fetching best-sellers", extra={"event": "request", "store": store})
+    if store:
+        query_log.record("store", store)
+    entry = await best_sellers_entry(store)
+    if entry is None:
+        return {"ok": False, "error": "No products found"}
+    return render(request, entry)
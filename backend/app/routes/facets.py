@@ -0,0 +1,101 @@
+import os
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse
+
+from app.embedder import get_query_embedder
+from app.facets import FACET_PROPERTIES, FacetCounter, load_global_facets
+from app.logger_setup import logger
+from app.metrics import timed
+from app.response_cache import cached_entry, render
+from app.routes.products import (
+    SEARCH_HYBRID_ALPHA,
+    build_filters,
+    page_key,
+    search_products,
+)
+from app.search_backend import get_search_backend
+from app.semantic_cache import semantic_cache
+from app.utils import cache_control, deadline, rate_limit
+
+router = APIRouter()
+
+# Top results of a search (or matches of a filter) that facets count over
+FACET_CANDIDATES = int(os.getenv("FACET_CANDIDATES", "200"))
+
+
+async def global_facets_entry():
+    """
+    Cached entry of the catalog-wide table written at ingestion time.
+    """
+
+    async def load():
+        table = await load_global_facets()
+        return {"ok": True, **table} if table else None
+
+    return await cached_entry("facets", load)
+
+
+async def scoped_facets_entry(query: str, filters=(), alpha=SEARCH_HYBRID_ALPHA):
+    """
+    Cached facet entry for the FACET_CANDIDATES best results of `query`, or
+    the first matches of `filters` without a query. `truncated` tells
+    whether more products may match than were counted.
+    """
+    canonical, vector = "", None
+    if query:
+        canonical, query, vector = await semantic_cache.resolve(
+            query, get_query_embedder()
+        )
+
+    async def count():
+        if query:
+            products = await search_products(
+                query, vector, alpha, FACET_CANDIDATES, 0, filters, FACET_PROPERTIES
+            )
+        else:
+            with timed("search"):
+                products = await get_search_backend().fetch_objects(
+                    limit=FACET_CANDIDATES,
+                    filters=filters,
+                    properties=FACET_PROPERTIES,
+                )
+        counter = FacetCounter()
+        with timed("facets"):
+            counter.add(products)
+        truncated = len(products) >= FACET_CANDIDATES
+        return {"ok": True, **counter.table(), "truncated": truncated}
+
+    key = page_key(f"facets:{alpha:g}", None, FACET_CANDIDATES, 0, filters)
+    return await cached_entry(f"{key}:{canonical}", count)
+
+
+@router.get("/products/facets")
+@rate_limit("60/minute", misses="20/minute")
+@cache_control(60, stale_while_revalidate=300)
+@deadline(2.0)
+async def get_facets(
+    request: Request,
+    query: str = "",
+    alpha: float = Query(SEARCH_HYBRID_ALPHA, ge=0, le=1),
+    min_price: float = Query(None, ge=0),
+    max_price: float = Query(None, ge=0),
+    min_rating: float = Query(None, ge=0, le=5),
+    min_reviews: int = Query(None, ge=0),
+    store: str = None,
+):
+    """
+    Product counts per store, price bucket and rating band: for the whole
+    catalog, or for the results of a query and/or filters.
+    """
+    logger.info("Received facets", extra={"event": "request", "query": query})
+    filters = build_filters(min_price, max_price, min_rating, min_reviews, store)
+    if query or filters:
+        entry = await scoped_facets_entry(query, filters, alpha)
+    else:
+        entry = await global_facets_entry()
+    if entry is None:
+        return JSONResponse(
+            status_code=404, content={"ok": False, "error": "Facets not built yet"}
+        )
+    return render(request, entry)
@@ -1,25 +1,99 @@
+import asyncio
+import os
+import time
+
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
-from app.init_db import get_ingestion_status
+from app.catalog import get_cache_warm_status, warm_up_settled
+from app.init_db import load_ingestion_status
 from app.logger_setup import logger
-from app.utils import rate_limit
+from app.utils import get_redis_client, rate_limit
+from app.weaviate_pool import get_weaviate_pool
+
+# Probe results are reused for this long, so frequent probes stay cheap
+HEALTH_PROBE_TTL = float(os.getenv("HEALTH_PROBE_TTL", "2"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "1"))
 
 router = APIRouter()
 
 
+async def ping_redis():
+    await get_redis_client().ping()
+
+
+async def ping_weaviate():
+    async with get_weaviate_pool().acquire() as client:
+        if not await client.is_ready():
+            raise RuntimeError("Weaviate is not ready")
+
+
+PROBES = {"redis": ping_redis, "weaviate": ping_weaviate}
+# name -> (checked at, status)
+probe_results = {}
+
+
+async def probe(name: str) -> str:
+    """
+    "ok" or "error" for a dependency, cached for HEALTH_PROBE_TTL seconds.
+    """
+    checked_at, status = probe_results.get(name, (0.0, None))
+    if time.monotonic() - checked_at < HEALTH_PROBE_TTL:
+        return status
+    try:
+        await asyncio.wait_for(PROBES[name](), HEALTH_PROBE_TIMEOUT)
+        status = "ok"
+    except Exception as e:
+        logger.warning(f"Health probe {name} failed: {e}")
+        status = "error"
+    probe_results[name] = (time.monotonic(), status)
+    return status
+
+
+async def readiness():
+    redis_status, weaviate_status = await asyncio.gather(
+        probe("redis"), probe("weaviate")
+    )
+    ingestion_complete = await load_ingestion_status()
+    return {
+        "ok": redis_status == weaviate_status == "ok"
+        and ingestion_complete
+        and warm_up_settled(),
+        "redis": redis_status,
+        "weaviate": weaviate_status,
+        "ingestion_complete": ingestion_complete,
+        "cache_warm": get_cache_warm_status(),
+    }
+
+
 @rate_limit("60/minute")
 @router.get("/health")
 async def health_check():
+    """
+    Dependency and ingestion status for humans; always 200 while the
+    process serves. Orchestrators should use /health/live and /health/ready.
+    """
     try:
-        redis_status = "ok"
-        weaviate_status = "ok"
-        return {
-            "ok": True,
-            "redis": redis_status,
-            "weaviate": weaviate_status,
-            "ingestion_complete": get_ingestion_status(),
-        }
+        return {**await readiness(), "ok": True}
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return JSONResponse(status_code=500, content={"ok": False})
+
+
+@router.get("/health/live")
+async def liveness():
+    """
+    The event loop is responsive; restart the worker if this fails.
+    """
+    return {"ok": True}
+
+
+@router.get("/health/ready")
+async def ready():
+    """
+    503 until Redis and Weaviate answer, the catalog has been ingested and
+    the cache warmed up (see CACHE_WARM_TIMEOUT); route no traffic here
+    until then.
+    """
+    status = await readiness()
+    return JSONResponse(status_code=200 if status["ok"] else 503, content=status)
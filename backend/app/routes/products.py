@@ -1,59 +1,297 @@
+import base64
 import json
+import os
+from urllib.parse import urlencode
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
-from weaviate.classes.query import Filter
 
+from app import query_log
+from app.cache import cached, cached_many
+from app.embedder import get_query_embedder
 from app.logger_setup import logger
-from app.utils import get_product_collection, get_redis_client, rate_limit
+from app.metrics import timed
+from app.resilience import guarded
+from app.response_cache import cached_entry, dumps, json_response, render
+from app.search_backend import Condition, get_search_backend
+from app.semantic_cache import semantic_cache
+from app.utils import cache_control, deadline, rate_limit
+from app.vector_engine import PRODUCT_COLUMNS
 
 router = APIRouter()
 
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", "100"))
+# Deep offsets get expensive for vector search; cursors stop here
+MAX_OFFSET = int(os.getenv("PRODUCTS_MAX_OFFSET", "1000"))
+MAX_BATCH_IDS = int(os.getenv("PRODUCTS_MAX_BATCH_IDS", "100"))
+# Default vector weight of hybrid search; 1.0 is pure vector search
+SEARCH_HYBRID_ALPHA = float(os.getenv("SEARCH_HYBRID_ALPHA", "0.5"))
+
+
+def parse_fields(fields: str):
+    """
+    Validated, canonical (sorted) projection for `fields=`, or None for
+    every property. `product_id` is always included.
+    """
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - set(PRODUCT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return sorted(names | {"product_id"})
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Offset carried by an opaque pagination cursor.
+    """
+    if not cursor:
+        return 0
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))["o"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(offset, int) or not 0 <= offset <= MAX_OFFSET:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def build_filters(
+    min_price=None, max_price=None, min_rating=None, min_reviews=None, store=None
+):
+    """
+    Engine-neutral conditions for the typed filter parameters, in a fixed
+    order so equal requests share a cache key.
+    """
+    filters = []
+    if min_price is not None or max_price is not None:
+        # Products without a price are stored as -1 and never match a bound
+        filters.append(Condition("price", "gte", min_price or 0))
+    if max_price is not None:
+        filters.append(Condition("price", "lte", max_price))
+    if min_rating is not None:
+        filters.append(Condition("average_rating", "gte", min_rating))
+    if min_reviews is not None:
+        filters.append(Condition("rating_number", "gte", min_reviews))
+    if store:
+        filters.append(Condition("store", "eq", store))
+    return tuple(filters)
+
+
+def page_key(prefix: str, properties, limit: int, offset: int, filters=()) -> str:
+    fields = ",".join(properties) if properties else "*"
+    key = f"{prefix}:{limit}:{offset}:{fields}"
+    if filters:
+        key += ":" + urlencode([(f"{c.prop}.{c.op}", c.value) for c in filters])
+    return key
+
+
+def page(products, limit: int, offset: int):
+    """
+    Response object for one page; `next_cursor` is None on the last page.
+    """
+    more = len(products) == limit and offset + limit <= MAX_OFFSET
+    return {
+        "ok": True,
+        "products": products,
+        "next_cursor": encode_cursor(offset + limit) if more else None,
+    }
+
+
+async def product_json(product_id: int, properties=None):
+    """
+    Cached bare JSON of one product, or None when it does not exist. Product
+    entries hold only the product so they can be spliced into any response
+    body without decoding.
+    """
+
+    async def fetch_product():
+        with timed("search"):
+            found = await get_search_backend().fetch_by_ids([product_id], properties)
+        return dumps(found[0]) if found else None
+
+    key = f"product_id:{product_id}"
+    if properties:
+        key += f":{','.join(properties)}"
+    return await cached(key, fetch_product)
+
+
+async def products_json(product_ids):
+    """
+    Cached bare JSON of several products, aligned with `product_ids` (None
+    for unknown ids). Cache misses are fetched with one backend call.
+    """
+
+    async def fetch_products(keys):
+        with timed("search"):
+            found = await get_search_backend().fetch_by_ids(
+                [int(key.rsplit(":", 1)[1]) for key in keys]
+            )
+        return {f"product_id:{p['product_id']}": dumps(p) for p in found}
+
+    keys = [f"product_id:{product_id}" for product_id in product_ids]
+    return await cached_many(keys, fetch_products)
+
+
+async def search_products(
+    query: str, vector, alpha, limit, offset=0, filters=(), properties=None
+):
+    """
+    One ranked page of `query` from the search backend, embedding it first
+    unless `vector` is given.
+    """
+    embedder = get_query_embedder()
+    if vector is None and embedder is not None:
+        with timed("embed"):
+            vector = await guarded("embed", lambda: embedder.embed(query))
+    backend = get_search_backend()
+    with timed("search"):
+        if alpha >= 1 and vector is not None:
+            return await backend.near_vector(vector, limit, offset, filters, properties)
+        return await backend.hybrid(
+            query, vector, alpha, limit, offset, filters, properties
+        )
+
+
+async def search_entry(
+    query: str,
+    properties=None,
+    limit=PAGE_SIZE,
+    offset=0,
+    filters=(),
+    alpha=SEARCH_HYBRID_ALPHA,
+):
+    """
+    Cached search response entry for one page of `query`. Filters are
+    applied inside the engine, before ranking and pagination. Queries the
+    semantic cache considers equivalent share entries; the first one
+    answered is what gets searched.
+    """
+    canonical, query, vector = await semantic_cache.resolve(query, get_query_embedder())
+
+    async def search():
+        products = await search_products(
+            query, vector, alpha, limit, offset, filters, properties
+        )
+        return page(products, limit, offset)
+
+    # The query goes last as it may itself contain separators
+    key = page_key(f"query:{alpha:g}", properties, limit, offset, filters)
+    return await cached_entry(f"{key}:{canonical}", search)
+
+
+async def browse_entry(properties=None, limit=PAGE_SIZE, offset=0, filters=()):
+    """
+    Cached entry for one page of the unranked catalog listing.
+    """
+
+    async def browse():
+        with timed("search"):
+            products = await get_search_backend().fetch_objects(
+                limit=limit, offset=offset, filters=filters, properties=properties
+            )
+        return page(products, limit, offset)
+
+    key = page_key("browse", properties, limit, offset, filters)
+    return await cached_entry(key, browse)
+
+
+@router.get("/products/batch")
+@rate_limit("60/minute", misses="20/minute")
+@cache_control(60, stale_while_revalidate=300)
+@deadline(1.0)
+async def get_products_batch(request: Request, ids: str = ""):
+    try:
+        product_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        return JSONResponse(
+            status_code=400, content={"ok": False, "error": "Invalid ids"}
+        )
+    if not product_ids or len(product_ids) > MAX_BATCH_IDS:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "ok": False,
+                "error": f"Pass between 1 and {MAX_BATCH_IDS} ids",
+            },
+        )
+    logger.info(
+        "Received batch",
+        extra={"event": "request", "batch_size": len(product_ids)},
+    )
+
+    for product_id in product_ids:
+        query_log.record("product_id", product_id)
+    products = await products_json(product_ids)
+    found = [product for product in products if product is not None]
+    missing = [pid for pid, product in zip(product_ids, products) if product is None]
+    return json_response(
+        b'{"ok":true,"products":['
+        + b",".join(found)
+        + b'],"missing":'
+        + dumps(missing)
+        + b"}"
+    )
+
 
 @router.get("/products")
-@rate_limit("60/minute")
-async def get_products(request: Request, query: str = "", product_id: str = None):
-    logger.info(f"Received query: {query}, product_id: {product_id}")
+@rate_limit("60/minute", misses="20/minute")
+@cache_control(60, stale_while_revalidate=300)
+@deadline(2.0)
+async def get_products(
+    request: Request,
+    query: str = "",
+    product_id: str = None,
+    fields: str = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    alpha: float = Query(SEARCH_HYBRID_ALPHA, ge=0, le=1),
+    min_price: float = Query(None, ge=0),
+    max_price: float = Query(None, ge=0),
+    min_rating: float = Query(None, ge=0, le=5),
+    min_reviews: int = Query(None, ge=0),
+    store: str = None,
+):
+    logger.info(
+        "Received query",
+        extra={"event": "request", "query": query, "product_id": product_id},
+    )
     try:
         product_id = int(product_id) if product_id else None
     except (ValueError, TypeError):
         return JSONResponse(
             status_code=400, content={"ok": False, "error": "Invalid product_id"}
         )
+    try:
+        properties = parse_fields(fields)
+        offset = decode_cursor(cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": str(e)})
+    filters = build_filters(min_price, max_price, min_rating, min_reviews, store)
 
-    async with get_product_collection() as (client, product_collection):
-        if product_id is not None:
-            cached = await get_redis_client().get(f"product_id:{product_id}")
-            if cached:
-                logger.info(f"Cache hit for product_id: {product_id}")
-                return {"ok": True, "product": json.loads(cached)}
-
-            result = product_collection.query.fetch_objects(
-                filters=Filter.by_property("product_id").equal(product_id),
-                limit=1,
+    if product_id is not None:
+        query_log.record("product_id", product_id)
+        product = await product_json(product_id, properties)
+        if product is None:
+            return JSONResponse(
+                status_code=404,
+                content={"ok": False, "error": "Product not found"},
             )
-            if result.objects:
-                product = result.objects[0].properties
-                await get_redis_client().setex(
-                    f"product_id:{product_id}", 3600, json.dumps(product)
-                )
-                return {"ok": True, "product": product}
-            else:
-                return JSONResponse(
-                    status_code=404,
-                    content={"ok": False, "error": "Product not found"},
-                )
-
-        if query:
-            cached = await get_redis_client().get(f"query:{query}")
-            if cached:
-                logger.info(f"Cache hit for query: {query}")
-                return {"ok": True, "products": json.loads(cached)}
-
-            result = product_collection.query.near_text(query=query, limit=20)
-            products = [obj.properties for obj in result.objects]
-            await get_redis_client().setex(f"query:{query}", 3600, json.dumps(products))
-            return {"ok": True, "products": products}
-
-        result = product_collection.query.fetch_objects(limit=20)
-        return {"ok": True, "products": [obj.properties for obj in result.objects]}
+        return json_response(b'{"ok":true,"product":' + product + b"}")
+
+    first_page = not offset and not filters and alpha == SEARCH_HYBRID_ALPHA
+    if first_page and limit == PAGE_SIZE:
+        query_log.record("fields", ",".join(properties) if properties else "*")
+    if query:
+        if first_page:
+            query_log.record("query", query)
+        entry = await search_entry(query, properties, limit, offset, filters, alpha)
+        return render(request, entry)
+
+    return render(request, await browse_entry(properties, limit, offset, filters))
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Query, Request
+
+from app.logger_setup import logger
+from app.response_cache import json_response
+from app.routes.products import products_json
+from app.similar import SIMILAR_K, get_similar_ids
+from app.utils import cache_control, deadline, rate_limit
+
+router = APIRouter()
+
+
+@router.get("/products/{product_id}/similar")
+@rate_limit("120/minute")
+@cache_control(300, stale_while_revalidate=3600)
+@deadline(1.0)
+async def get_similar_products(
+    request: Request,
+    product_id: int,
+    limit: int = Query(10, ge=1, le=SIMILAR_K),
+):
+    """
+    Products most similar to `product_id`, from precomputed neighbor lists:
+    one Redis GET plus cached product lookups, never a vector search.
+    """
+    logger.info(
+        "Received similar", extra={"event": "request", "product_id": product_id}
+    )
+    similar_ids = await get_similar_ids(product_id, limit)
+    products = await products_json(similar_ids) if similar_ids else []
+    # Neighbors deleted since the lists were built are skipped
+    found = [product for product in products if product is not None]
+    return json_response(b'{"ok":true,"products":[' + b",".join(found) + b"]}")
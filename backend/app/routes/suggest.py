@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Query
+
+from app.response_cache import dumps, json_response
+from app.suggest import SUGGEST_LIMIT, get_suggest_index
+from app.utils import cache_control
+
+router = APIRouter()
+
+
+# Not rate limited: the limiter costs a Redis round trip, and this route
+# never reaches Redis or Weaviate otherwise
+@router.get("/suggest")
+@cache_control(60, stale_while_revalidate=600)
+async def get_suggestions(
+    prefix: str = Query("", max_length=100),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=SUGGEST_LIMIT),
+):
+    """
+    Typeahead suggestions for `prefix` from the worker's mapped index; empty
+    until the first index has been built.
+    """
+    index = get_suggest_index()
+    suggestions = index.suggest(prefix, limit) if index is not None else []
+    return json_response(dumps({"ok": True, "suggestions": suggestions}))
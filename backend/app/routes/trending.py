@@ -1,35 +1,38 @@
-import json
-
 from fastapi import APIRouter, Request
-from weaviate.classes.query import Sort
 
+from app import query_log
 from app.logger_setup import logger
-from app.utils import get_product_collection, get_redis_client, rate_limit
+from app.metrics import timed
+from app.ranking import top_products
+from app.response_cache import cached_entry, render
+from app.utils import cache_control, deadline, rate_limit
 
 router = APIRouter()
 
 
+async def trending_entry(store: str = None):
+    """
+    Cached trending response entry, optionally for one store.
+    """
+    cache_key = f"trending_products:store:{store}" if store else "trending_products"
+
+    async def rank():
+        with timed("search"):
+            products = await top_products("trending", store)
+        return {"ok": True, "products": products} if products else None
+
+    return await cached_entry(cache_key, rank)
+
+
 @router.get("/trending")
 @rate_limit("60/minute")
-async def get_trending(request: Request):
-    logger.info("Fetching trending")
-    cached = await get_redis_client().get("trending_products")
-    if cached:
-        logger.info("Cache hit for trending")
-        return {"ok": True, "products": json.loads(cached)}
-
-    async with get_product_collection() as (client, product_collection):
-        result = product_collection.query.fetch_objects(
-            limit=200,
-            sort=Sort.by_property(name="rating_number", ascending=False),
-        )
-        if not result.objects:
-            return {"ok": False, "error": "No products found"}
-
-        top_20 = sorted(
-            (obj.properties for obj in result.objects),
-            key=lambda x: x.get("average_rating", 0),
-            reverse=True,
-        )[:20]
-        await get_redis_client().setex("trending_products", 3600, json.dumps(top_20))
-        return {"ok": True, "products": top_20}
+@cache_control(120, stale_while_revalidate=600)
+@deadline(1.0)
+async def get_trending(request: Request, store: str = None):
+    logger.info("Fetching trending", extra={"event": "request", "store": store})
+    if store:
+        query_log.record("store", store)
+    entry = await trending_entry(store)
+    if entry is None:
+        return {"ok": False, "error": "No products found"}
+    return render(request, entry)
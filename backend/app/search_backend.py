@@ -0,0 +1,348 @@
+import asyncio
+import os
+from dataclasses import dataclass
+
+from weaviate.classes.query import Filter, HybridFusion, Sort
+
+from app.ingestion import product_uuid
+from app.logger_setup import logger
+from app.resilience import guarded
+from app.utils import get_product_collection
+
+# Properties searched by the keyword half of hybrid queries (title boosted)
+HYBRID_QUERY_PROPERTIES = ["title^2", "description", "store_text"]
+
+
+@dataclass(frozen=True)
+class Condition:
+    """
+    Engine-neutral filter on a product property.
+
+    `op` is one of "eq", "gt", "gte", "lt", "lte"; multiple conditions are
+    combined with AND.
+    """
+
+    prop: str
+    op: str
+    value: object
+
+
+class SearchBackend:
+    """
+    Interface the routes use to query the product catalog.
+
+    Every method returns a list of product property dicts, optionally
+    projected to `properties`.
+    """
+
+    async def near_vector(
+        self, vector, limit=20, offset=0, filters=(), properties=None
+    ) -> list:
+        raise NotImplementedError
+
+    async def near_text(
+        self, query, limit=20, offset=0, filters=(), properties=None
+    ) -> list:
+        raise NotImplementedError(
+            f"{type(self).__name__} cannot embed text; configure QUERY_EMBEDDER"
+        )
+
+    async def hybrid(
+        self,
+        query,
+        vector=None,
+        alpha=0.5,
+        limit=20,
+        offset=0,
+        filters=(),
+        properties=None,
+    ) -> list:
+        """
+        Keyword (BM25) search fused with vector similarity; `alpha` weighs
+        the vector side (1.0 is pure vector search, 0.0 pure keyword).
+
+        Engines without a keyword index fall back to vector search.
+        """
+        if vector is None:
+            return await self.near_text(query, limit, offset, filters, properties)
+        return await self.near_vector(vector, limit, offset, filters, properties)
+
+    async def fetch_by_ids(self, product_ids, properties=None) -> list:
+        """
+        Products for `product_ids`, in the same order, skipping unknown ids.
+        """
+        raise NotImplementedError
+
+    async def fetch_objects(
+        self,
+        limit=20,
+        offset=0,
+        sort_by=None,
+        descending=True,
+        filters=(),
+        properties=None,
+    ) -> list:
+        raise NotImplementedError
+
+    async def iter_products(self, properties=None, include_vector=False):
+        """
+        Async iterator over the whole catalog yielding (properties, vector);
+        vector is None unless `include_vector` is set.
+        """
+        raise NotImplementedError
+        yield
+
+    async def close(self):
+        pass
+
+
+def to_weaviate_filter(filters):
+    if not filters:
+        return None
+    clauses = []
+    for condition in filters:
+        prop = Filter.by_property(condition.prop)
+        if condition.op == "eq":
+            clauses.append(prop.equal(condition.value))
+        elif condition.op == "gt":
+            clauses.append(prop.greater_than(condition.value))
+        elif condition.op == "gte":
+            clauses.append(prop.greater_or_equal(condition.value))
+        elif condition.op == "lt":
+            clauses.append(prop.less_than(condition.value))
+        elif condition.op == "lte":
+            clauses.append(prop.less_or_equal(condition.value))
+        else:
+            raise ValueError(f"Unsupported filter {condition.op} on {condition.prop}")
+    return clauses[0] if len(clauses) == 1 else Filter.all_of(clauses)
+
+
+class WeaviateBackend(SearchBackend):
+    """
+    Adapter over the Weaviate `Product` collection using the shared clients.
+    """
+
+    async def near_vector(
+        self, vector, limit=20, offset=0, filters=(), properties=None
+    ):
+        async with get_product_collection() as (client, product_collection):
+            result = await product_collection.query.near_vector(
+                near_vector=vector,
+                limit=limit,
+                offset=offset or None,
+                filters=to_weaviate_filter(filters),
+                return_properties=properties,
+            )
+        return [obj.properties for obj in result.objects]
+
+    async def near_text(self, query, limit=20, offset=0, filters=(), properties=None):
+        async with get_product_collection() as (client, product_collection):
+            result = await product_collection.query.near_text(
+                query=query,
+                limit=limit,
+                offset=offset or None,
+                filters=to_weaviate_filter(filters),
+                return_properties=properties,
+            )
+        return [obj.properties for obj in result.objects]
+
+    async def hybrid(
+        self,
+        query,
+        vector=None,
+        alpha=0.5,
+        limit=20,
+        offset=0,
+        filters=(),
+        properties=None,
+    ):
+        async with get_product_collection() as (client, product_collection):
+            result = await product_collection.query.hybrid(
+                query=query,
+                vector=vector,
+                alpha=alpha,
+                query_properties=HYBRID_QUERY_PROPERTIES,
+                fusion_type=HybridFusion.RELATIVE_SCORE,
+                limit=limit,
+                offset=offset or None,
+                filters=to_weaviate_filter(filters),
+                return_properties=properties,
+            )
+        return [obj.properties for obj in result.objects]
+
+    async def fetch_by_ids(self, product_ids, properties=None):
+        if not product_ids:
+            return []
+        # Objects are stored under UUIDs derived from product_id, so this is
+        # a primary-key lookup rather than a filtered scan
+        uuids = {product_uuid(pid): pid for pid in product_ids}
+        async with get_product_collection() as (client, product_collection):
+            result = await product_collection.query.fetch_objects_by_ids(
+                list(uuids), limit=len(uuids), return_properties=properties
+            )
+            by_id = {uuids[str(obj.uuid)]: obj.properties for obj in result.objects}
+            missing = [pid for pid in uuids.values() if pid not in by_id]
+            if missing:
+                # Objects not yet moved off a legacy random UUID (see
+                # app.ingestion.rekey_legacy_objects)
+                keyed = properties is None or "product_id" in properties
+                result = await product_collection.query.fetch_objects(
+                    filters=Filter.by_property("product_id").contains_any(missing),
+                    limit=len(missing),
+                    return_properties=(
+                        properties if keyed else [*properties, "product_id"]
+                    ),
+                )
+                for obj in result.objects:
+                    props = dict(obj.properties)
+                    pid = props["product_id"] if keyed else props.pop("product_id")
+                    by_id[pid] = props
+        return [by_id[pid] for pid in product_ids if pid in by_id]
+
+    async def fetch_objects(
+        self,
+        limit=20,
+        offset=0,
+        sort_by=None,
+        descending=True,
+        filters=(),
+        properties=None,
+    ):
+        async with get_product_collection() as (client, product_collection):
+            result = await product_collection.query.fetch_objects(
+                limit=limit,
+                offset=offset or None,
+                sort=(
+                    Sort.by_property(name=sort_by, ascending=not descending)
+                    if sort_by
+                    else None
+                ),
+                filters=to_weaviate_filter(filters),
+                return_properties=properties,
+            )
+        return [obj.properties for obj in result.objects]
+
+    async def iter_products(self, properties=None, include_vector=False):
+        async with get_product_collection() as (client, product_collection):
+            async for obj in product_collection.iterator(
+                include_vector=include_vector, return_properties=properties
+            ):
+                vector = obj.vector
+                if isinstance(vector, dict):
+                    vector = vector.get("default")
+                yield obj.properties, (vector if include_vector else None)
+
+
+class LocalVectorBackend(SearchBackend):
+    """
+    Embedded engine over a memory-mapped local index (see app.vector_engine).
+    """
+
+    def __init__(self, path):
+        from app.vector_engine import LocalIndex
+
+        self.index = LocalIndex(path)
+        logger.info(
+            f"✅ Loaded local index with {self.index.count} products from {path}"
+        )
+
+    def _rows(self, rows, properties):
+        return [self.index.row(row, properties) for row in rows]
+
+    async def near_vector(
+        self, vector, limit=20, offset=0, filters=(), properties=None
+    ):
+        rows = await asyncio.to_thread(
+            self.index.search, vector, limit + offset, filters
+        )
+        return self._rows(rows[offset:], properties)
+
+    async def fetch_by_ids(self, product_ids, properties=None):
+        rows = self.index.rows_for_ids(list(product_ids))
+        return self._rows((row for row in rows if row >= 0), properties)
+
+    async def fetch_objects(
+        self,
+        limit=20,
+        offset=0,
+        sort_by=None,
+        descending=True,
+        filters=(),
+        properties=None,
+    ):
+        if sort_by:
+            rows = self.index.sorted_rows(sort_by, descending, filters)
+        else:
+            mask = self.index.mask(filters)
+            rows = range(self.index.count) if mask is None else mask.nonzero()[0]
+        return self._rows(rows[offset : offset + limit], properties)
+
+    async def iter_products(self, properties=None, include_vector=False):
+        for row in range(self.index.count):
+            vector = self.index.vectors[row] if include_vector else None
+            yield self.index.row(row, properties), vector
+
+
+class ResilientBackend(SearchBackend):
+    """
+    Runs the queries of another backend through `resilience.guarded`, so
+    they respect route deadlines, share the "search" circuit breaker and
+    can be hedged. Catalog scans pass through unguarded.
+    """
+
+    def __init__(self, backend: SearchBackend):
+        self.backend = backend
+
+    async def near_vector(self, *args, **kwargs):
+        return await guarded(
+            "search", lambda: self.backend.near_vector(*args, **kwargs), hedge=True
+        )
+
+    async def near_text(self, *args, **kwargs):
+        return await guarded(
+            "search", lambda: self.backend.near_text(*args, **kwargs), hedge=True
+        )
+
+    async def hybrid(self, *args, **kwargs):
+        return await guarded(
+            "search", lambda: self.backend.hybrid(*args, **kwargs), hedge=True
+        )
+
+    async def fetch_by_ids(self, *args, **kwargs):
+        return await guarded(
+            "search", lambda: self.backend.fetch_by_ids(*args, **kwargs), hedge=True
+        )
+
+    async def fetch_objects(self, *args, **kwargs):
+        return await guarded(
+            "search", lambda: self.backend.fetch_objects(*args, **kwargs), hedge=True
+        )
+
+    async def iter_products(self, *args, **kwargs):
+        async for item in self.backend.iter_products(*args, **kwargs):
+            yield item
+
+    async def close(self):
+        await self.backend.close()
+
+
+# Lazy search backend shared by all routes
+search_backend = None
+
+
+def get_search_backend():
+    """
+    Lazily builds the backend selected by SEARCH_BACKEND ("weaviate" or
+    "local"), wrapped in a ResilientBackend.
+    """
+    global search_backend
+    if search_backend is None:
+        name = os.getenv("SEARCH_BACKEND", "weaviate").lower()
+        if name == "weaviate":
+            backend = WeaviateBackend()
+        elif name == "local":
+            backend = LocalVectorBackend(os.getenv("LOCAL_INDEX_PATH", "data/index"))
+        else:
+            raise ValueError(f"Unknown SEARCH_BACKEND: {name}")
+        search_backend = ResilientBackend(backend)
+    return search_backend
@@ -0,0 +1,171 @@
+"""
+Lets near-duplicate search queries share cached results.
+
+Queries are first reduced to a canonical form (case, whitespace,
+punctuation, plurals and filler words), which keys the result cache, so
+"Beach outfits!" and "beach outfit" are the same entry. Each worker also
+keeps the embeddings of recently answered queries; a new query whose
+embedding is close enough to one of them is answered with that query's
+results instead of a search of its own.
+"""
+
+import os
+import unicodedata
+
+import numpy as np
+
+from app.embedder import normalize_query
+from app.metrics import count_semantic, timed
+from app.resilience import SearchUnavailable, guarded
+
+# Recent queries whose embeddings are kept per worker; 0 disables matching
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "4096"))
+# Cosine similarity from which a recent query's results are reused. Tune
+# with the semantic_cache_similarity histogram
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+STOPWORDS = frozenset(["a", "an", "and", "for", "in", "of", "on", "the", "to", "with"])
+
+
+def stem(token: str) -> str:
+    """
+    Strips English plural endings: "dresses" -> "dress", "puppies" ->
+    "puppy", "outfits" -> "outfit". Short tokens are left alone.
+    """
+    if len(token) <= 3 or token.endswith(("ss", "us", "is")):
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith(("sses", "xes", "zes", "ches", "shes")):
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def canonical_query(query: str) -> str:
+    """
+    Cache key form of a query. Word order is kept, since "shirt dress" and
+    "dress shirt" are different products; the similarity match covers
+    reorderings.
+    """
+    text = normalize_query(query).replace("'s", "").replace("'", "")
+    text = "".join(
+        " " if unicodedata.category(char).startswith(("P", "S")) else char
+        for char in text
+    )
+    tokens = text.split()
+    kept = [stem(token) for token in tokens if token not in STOPWORDS]
+    return " ".join(kept or tokens)
+
+
+class SemanticCache:
+    """
+    Bounded store of recently answered queries and their normalized
+    embeddings. Similarity is one matrix-vector product over all of them;
+    when full, the least recently used query is replaced.
+    """
+
+    def __init__(
+        self, capacity=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.stats = {"recent": 0, "similar": 0, "misses": 0, "evictions": 0}
+        self.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.vectors = None
+        # slot -> (canonical query, query text searched for it)
+        self.entries = []
+        self.slots = {}
+        self.last_used = np.zeros(self.capacity, dtype=np.int64)
+        self.clock = 0
+
+    def _touch(self, slot):
+        self.clock += 1
+        self.last_used[slot] = self.clock
+
+    def get(self, canonical: str):
+        slot = self.slots.get(canonical)
+        if slot is None:
+            return None
+        self._touch(slot)
+        return self.entries[slot]
+
+    def nearest(self, vector):
+        """
+        (slot, similarity) of the recent query closest to the normalized
+        `vector`, or (None, 0.0) when there is none.
+        """
+        if not self.entries:
+            return None, 0.0
+        scores = self.vectors[: len(self.entries)] @ vector
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def add(self, canonical: str, query: str, vector):
+        if canonical in self.slots:
+            self._touch(self.slots[canonical])
+            return
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+        if len(self.entries) < self.capacity:
+            slot = len(self.entries)
+            self.entries.append((canonical, query))
+        else:
+            slot = int(np.argmin(self.last_used))
+            del self.slots[self.entries[slot][0]]
+            self.entries[slot] = (canonical, query)
+            self.stats["evictions"] += 1
+        self.vectors[slot] = vector
+        self.slots[canonical] = slot
+        self._touch(slot)
+
+    async def resolve(self, query: str, embedder=None):
+        """
+        Picks the query whose cached results answer `query`: the recent one
+        with the same canonical form, else the most similar recent one at or
+        above the threshold, else `query` itself, which is remembered.
+
+        Returns (canonical query, query text to search, embedding). The
+        embedding is only returned when it was computed for `query`, so the
+        search can reuse it; None otherwise.
+        """
+        canonical = canonical_query(query)
+        known = self.get(canonical)
+        if known is not None:
+            self.stats["recent"] += 1
+            count_semantic("recent")
+            return known[0], known[1], None
+        if embedder is None or not self.capacity:
+            return canonical, query, None
+
+        try:
+            with timed("embed"):
+                embedding = await guarded("embed", lambda: embedder.embed(query))
+        except SearchUnavailable:
+            # Exact matches can still be served from the cache
+            return canonical, query, None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        slot, similarity = self.nearest(vector)
+        if slot is not None and similarity >= self.threshold:
+            self._touch(slot)
+            self.stats["similar"] += 1
+            count_semantic("similar", similarity)
+            canonical, query = self.entries[slot]
+            return canonical, query, None
+
+        self.stats["misses"] += 1
+        count_semantic("miss", similarity if slot is not None else None)
+        self.add(canonical, query, vector)
+        return canonical, query, embedding
+
+
+semantic_cache = SemanticCache()
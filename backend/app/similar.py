@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from app.locks import renewing_lock
+from app.logger_setup import logger
+from app.search_backend import (
+    LocalVectorBackend,
+    ResilientBackend,
+    get_search_backend,
+)
+from app.utils import get_redis_binary_client, get_redis_client
+from app.vector_engine import _normalize, top_k
+
+# Neighbors stored per product
+SIMILAR_K = int(os.getenv("SIMILAR_K", "20"))
+# Products whose neighbors are scored per matrix product
+SIMILAR_QUERY_BLOCK = int(os.getenv("SIMILAR_QUERY_BLOCK", "256"))
+# How often workers look for stale lists, and how often lists are fully rebuilt
+SIMILAR_REFRESH_SECONDS = int(os.getenv("SIMILAR_REFRESH_SECONDS", "300"))
+SIMILAR_REBUILD_SECONDS = int(os.getenv("SIMILAR_REBUILD_SECONDS", "86400"))
+# The lock is renewed while a build runs; the TTL only bounds how long a
+# dead builder blocks the others
+SIMILAR_LOCK_TTL_MS = int(os.getenv("SIMILAR_LOCK_TTL_MS", "30000"))
+# "false" leaves building to the offline job (`python -m app.similar`) so
+# serving workers never spend CPU on it
+SIMILAR_BUILD_IN_WORKERS = (
+    os.getenv("SIMILAR_BUILD_IN_WORKERS", "true").lower() == "true"
+)
+
+META_KEY = "similar:meta"
+# Product ids whose neighbor lists must be recomputed
+STALE_KEY = "similar:stale"
+LOCK_KEY = "similar:lock"
+
+# Neighbor lists are little-endian int32 product ids, nearest first
+ID_DTYPE = np.dtype("<i4")
+
+
+def similar_key(product_id) -> str:
+    return f"similar:{product_id}"
+
+
+async def get_similar_ids(product_id: int, limit: int = SIMILAR_K):
+    """
+    Precomputed nearest products of `product_id`; empty until built.
+    """
+    packed = await get_redis_binary_client().get(similar_key(product_id))
+    if not packed:
+        return []
+    return np.frombuffer(packed, dtype=ID_DTYPE)[:limit].tolist()
+
+
+async def load_vectors(backend):
+    """
+    (product ids, L2-normalized vector matrix) of the whole catalog. The
+    local engine's memory-mapped matrix is used as is.
+    """
+    if isinstance(backend, ResilientBackend):
+        backend = backend.backend
+    if isinstance(backend, LocalVectorBackend):
+        index = backend.index
+        return np.asarray(index.numeric["product_id"]), index.vectors
+    ids, vectors = [], []
+    async for props, vector in backend.iter_products(
+        properties=["product_id"], include_vector=True
+    ):
+        if vector is not None:
+            ids.append(props["product_id"])
+            vectors.append(np.asarray(vector, dtype=np.float32))
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return np.asarray(ids), _normalize(np.stack(vectors))
+
+
+def nearest_ids(ids, vectors, rows, k):
+    """
+    For each row in `rows`, the ids of its `k` nearest other products.
+    """
+    best_rows, _ = top_k(vectors, vectors[rows], k + 1)
+    neighbors = []
+    for row, candidates in zip(rows, best_rows):
+        candidates = candidates[candidates != row][:k]
+        neighbors.append(ids[candidates].astype(ID_DTYPE))
+    return neighbors
+
+
+async def build_similar(backend=None, product_ids=None, k=SIMILAR_K):
+    """
+    Recomputes the neighbor lists of `product_ids`, or of every product,
+    in blocks of SIMILAR_QUERY_BLOCK products. Lists of ids no longer in
+    the catalog are deleted. Returns the number of lists written.
+    """
+    backend = backend or get_search_backend()
+    started = time.monotonic()
+    ids, vectors = await load_vectors(backend)
+    if product_ids is None:
+        rows = np.arange(len(ids))
+        removed = []
+    else:
+        row_of = {int(pid): row for row, pid in enumerate(ids)}
+        rows = np.asarray(
+            [row_of[pid] for pid in product_ids if pid in row_of], dtype=np.int64
+        )
+        removed = [pid for pid in product_ids if pid not in row_of]
+
+    redis = get_redis_binary_client()
+    for start in range(0, len(rows), SIMILAR_QUERY_BLOCK):
+        block = rows[start : start + SIMILAR_QUERY_BLOCK]
+        # Scoring is pure numpy; keep it off the event loop
+        neighbors = await asyncio.to_thread(nearest_ids, ids, vectors, block, k)
+        pipe = redis.pipeline(transaction=False)
+        for row, neighbor_ids in zip(block, neighbors):
+            pipe.set(similar_key(int(ids[row])), neighbor_ids.tobytes())
+        await pipe.execute()
+    if removed:
+        await redis.delete(*(similar_key(pid) for pid in removed))
+
+    logger.info(
+        f"✅ Built {len(rows)} neighbor lists over {len(ids)} products "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return len(rows)
+
+
+def mark_stale(redis, product_ids=None):
+    """
+    Queues neighbor lists for recomputation, or a full rebuild without
+    `product_ids`.
+    """
+    if product_ids is None:
+        redis.delete(META_KEY)
+    elif product_ids:
+        redis.sadd(STALE_KEY, *product_ids)
+
+
+async def refresh_similar(backend=None):
+    """
+    Fully rebuilds the lists when they are missing or older than
+    SIMILAR_REBUILD_SECONDS, otherwise recomputes only the stale ones.
+    Returns 0 without building while another process holds the build lock.
+    """
+    redis = get_redis_client()
+    async with renewing_lock(LOCK_KEY, SIMILAR_LOCK_TTL_MS) as acquired:
+        if not acquired:
+            return 0
+        built_at = await redis.hget(META_KEY, "built_at")
+        if built_at is None or time.time() - float(built_at) > SIMILAR_REBUILD_SECONDS:
+            await redis.delete(STALE_KEY)
+            count = await build_similar(backend)
+            await redis.hset(META_KEY, "built_at", time.time())
+            return count
+        pending = await redis.scard(STALE_KEY)
+        if not pending:
+            return 0
+        stale = await redis.spop(STALE_KEY, pending)
+        try:
+            return await build_similar(backend, sorted(int(pid) for pid in stale))
+        except Exception:
+            await redis.sadd(STALE_KEY, *stale)
+            raise
+
+
+async def refresh_similar_periodically(is_ready):
+    """
+    Background task: keeps the neighbor lists fresh whenever
+    `await is_ready()`.
+    """
+    while not await is_ready():
+        await asyncio.sleep(5)
+    while True:
+        try:
+            if await is_ready():
+                await refresh_similar()
+        except Exception as e:
+            logger.error(f"Neighbor list refresh failed: {e}")
+        await asyncio.sleep(SIMILAR_REFRESH_SECONDS)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.init_db import load_ingestion_status
+    from app.weaviate_pool import get_weaviate_pool
+
+    parser = argparse.ArgumentParser(description="Build similar-product lists")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep refreshing every SIMILAR_REFRESH_SECONDS instead of once",
+    )
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            if args.watch:
+                await refresh_similar_periodically(load_ingestion_status)
+            else:
+                await refresh_similar()
+        finally:
+            await get_weaviate_pool().close()
+
+    asyncio.run(main())
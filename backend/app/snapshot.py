@@ -0,0 +1,123 @@
+"""
+Versioned catalog snapshots: the cleaned `Product` properties and their
+vectors in the local index layout (see app.vector_engine), so a new
+environment can be loaded without downloading, parsing or embedding.
+
+    python -m app.snapshot export data/snapshots
+    python -m app.snapshot restore data/snapshots          # latest
+    python -m app.snapshot restore data/snapshots/20250101T000000
+"""
+
+import os
+import time
+
+from app.ingestion import Manifest, content_hash, indexed_properties, product_uuid
+from app.logger_setup import logger
+from app.vector_engine import LocalIndex, export_collection
+
+SNAPSHOT_FORMAT_VERSION = 1
+# Name of the file in a snapshot root pointing at the newest snapshot
+LATEST_FILE = "LATEST"
+RESTORE_BATCH_SIZE = int(os.getenv("SNAPSHOT_RESTORE_BATCH_SIZE", "1000"))
+
+
+def export_snapshot(collection, root: str) -> str:
+    """
+    Writes the collection to a new `root/<version>` directory and points
+    `root/LATEST` at it. Returns the snapshot directory.
+    """
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    path = os.path.join(root, version)
+    count = export_collection(
+        collection,
+        path,
+        extra_meta={
+            "snapshot_format": SNAPSHOT_FORMAT_VERSION,
+            "snapshot_version": version,
+        },
+    )
+    tmp = os.path.join(root, f"{LATEST_FILE}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, LATEST_FILE))
+    logger.info(f"✅ Wrote snapshot {version} with {count} products to {path}")
+    return path
+
+
+def resolve_snapshot(path: str):
+    """
+    Snapshot directory for `path`, which is either a snapshot itself or a
+    root with a LATEST pointer. None if there is no complete snapshot.
+    """
+    if not path:
+        return None
+    latest = os.path.join(path, LATEST_FILE)
+    if os.path.exists(latest):
+        with open(latest) as f:
+            path = os.path.join(path, f.read().strip())
+    return path if os.path.exists(os.path.join(path, "meta.json")) else None
+
+
+def restore_snapshot(collection, path: str, manifest: Manifest = None) -> str:
+    """
+    Bulk-loads a snapshot into an empty collection with the stored vectors,
+    so nothing is embedded, and writes the delta-ingestion manifest for it.
+    Returns the snapshot version.
+    """
+    index = LocalIndex(path, use_hnsw=False)
+    version = index.meta.get("snapshot_version", os.path.basename(path))
+    logger.info(f"⏬ Restoring snapshot {version} ({index.count} products)")
+
+    entries = {}
+    failed = 0
+    for start in range(0, index.count, RESTORE_BATCH_SIZE):
+        rows = range(start, min(start + RESTORE_BATCH_SIZE, index.count))
+        by_uuid = {}
+        with collection.batch.dynamic() as batch:
+            for row in rows:
+                props = index.row(row)
+                product_id = props["product_id"]
+                sid = props.get("parent_asin") or f"#{product_id}"
+                uuid = product_uuid(product_id)
+                by_uuid[uuid] = sid
+                entries[sid] = (product_id, content_hash(props))
+                batch.add_object(
+                    properties=indexed_properties(props),
+                    uuid=uuid,
+                    vector=index.vectors[row].tolist(),
+                )
+        # Left out of the manifest, so the next delta run writes them
+        for error in collection.batch.failed_objects:
+            entries.pop(by_uuid.get(str(error.object_.uuid)), None)
+            failed += 1
+    if failed:
+        logger.warning(f"⚠️ {failed} objects failed to restore")
+
+    next_id = int(index.numeric["product_id"].max()) + 1 if index.count else 1
+    (manifest or Manifest()).save(entries, next_id)
+    logger.info(f"✅ Restored snapshot {version}")
+    return version
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.utils import get_weaviate_client
+
+    parser = argparse.ArgumentParser(description="Export or restore catalog snapshots")
+    parser.add_argument("command", choices=["export", "restore"])
+    parser.add_argument("path", help="Snapshot root, or one snapshot to restore")
+    args = parser.parse_args()
+
+    client = get_weaviate_client()
+    try:
+        collection = client.collections.get("Product")
+        if args.command == "export":
+            export_snapshot(collection, args.path)
+        else:
+            snapshot = resolve_snapshot(args.path)
+            if snapshot is None:
+                raise SystemExit(f"No snapshot found at {args.path}")
+            restore_snapshot(collection, snapshot)
+    finally:
+        client.close()
@@ -0,0 +1,338 @@
+"""
+Typeahead over product titles, store names and popular queries.
+
+Suggestions live in an on-disk index of sorted, normalized keys that every
+worker memory-maps, so lookups are a binary search plus a top-k over the
+matching range and never touch Redis or Weaviate. Prefixes matching more
+than SUGGEST_SCAN_LIMIT keys get their answers precomputed at build time.
+
+Layout of an index directory:
+  keys.bin / keys.offsets.npy      normalized keys, sorted by UTF-8 bytes
+  labels.bin / labels.offsets.npy  text shown to the user
+  weights.npy                      float32 ranking weights
+  kinds.npy                        int8 index into KINDS
+  product_ids.npy                  int64 product of title keys, else -1
+  meta.json                        written last; precomputed prefixes
+"""
+
+import asyncio
+import bisect
+import fcntl
+import json
+import math
+import os
+import shutil
+import time
+from array import array
+
+import numpy as np
+
+from app import query_log
+from app.catalog import get_catalog_version
+from app.logger_setup import logger
+from app.search_backend import get_search_backend
+
+SUGGEST_INDEX_PATH = os.getenv("SUGGEST_INDEX_PATH", "data/suggest")
+SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", "10"))
+# Larger matching ranges are answered from precomputed results
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", "2048"))
+SUGGEST_QUERIES = int(os.getenv("SUGGEST_QUERIES", "5000"))
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "60"))
+SUGGEST_REBUILD_SECONDS = int(os.getenv("SUGGEST_REBUILD_SECONDS", "3600"))
+
+KINDS = ["query", "product", "store"]
+# Popular queries first, then stores, then titles at equal popularity
+KIND_BOOST = {"query": 2.0, "product": 1.0, "store": 1.5}
+SUGGEST_PROPERTIES = ["product_id", "title", "store", "rating_number"]
+# Pointer file naming the index directory in use
+CURRENT_FILE = "CURRENT"
+# Sorts after every UTF-8 byte sequence, bounding prefix ranges
+PREFIX_END = b"\xff"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _write_strings(path, name, strings):
+    offsets = array("q", [0])
+    with open(os.path.join(path, f"{name}.bin"), "wb") as f:
+        for data in strings:
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(os.path.join(path, f"{name}.offsets.npy"), np.frombuffer(offsets, np.int64))
+
+
+def top_rows(weights, lo, hi, k):
+    """
+    Rows in [lo, hi) with the highest weights, best first.
+    """
+    window = weights[lo:hi]
+    if len(window) > k:
+        part = np.argpartition(-window, k - 1)[:k]
+    else:
+        part = np.arange(len(window))
+    order = part[np.argsort(-window[part], kind="stable")]
+    return (order + lo).tolist()
+
+
+def precompute_prefixes(keys, weights, scan_limit, k):
+    """
+    Top rows of every prefix matching more than `scan_limit` keys, keyed by
+    the prefix bytes in hex. Only children of such prefixes can qualify,
+    so this visits few ranges.
+    """
+    heavy = {}
+    ranges = [(0, len(keys))]
+    depth = 1
+    while ranges:
+        wide = []
+        for lo, hi in ranges:
+            i = lo
+            while i < hi:
+                if len(keys[i]) < depth:
+                    i += 1
+                    continue
+                prefix = keys[i][:depth]
+                j = bisect.bisect_left(keys, prefix + PREFIX_END, i, hi)
+                if j - i > scan_limit:
+                    heavy[prefix.hex()] = top_rows(weights, i, j, k)
+                    wide.append((i, j))
+                i = j
+        ranges = wide
+        depth += 1
+    return heavy
+
+
+def write_suggest_index(path, entries, extra_meta=None):
+    """
+    Writes `entries` of (label, kind, weight, product_id) to `path`. Keys
+    that normalize equally keep the heaviest entry.
+    """
+    os.makedirs(path, exist_ok=True)
+    best = {}
+    for label, kind, weight, product_id in entries:
+        key = normalize(label).encode("utf-8")
+        if key and (key not in best or weight > best[key][2]):
+            best[key] = (label, kind, weight, product_id)
+    keys = sorted(best)
+    rows = [best[key] for key in keys]
+    weights = np.array([row[2] for row in rows], dtype=np.float32)
+
+    _write_strings(path, "keys", keys)
+    _write_strings(path, "labels", (row[0].encode("utf-8") for row in rows))
+    np.save(os.path.join(path, "weights.npy"), weights)
+    np.save(
+        os.path.join(path, "kinds.npy"),
+        np.array([KINDS.index(row[1]) for row in rows], dtype=np.int8),
+    )
+    np.save(
+        os.path.join(path, "product_ids.npy"),
+        np.array([row[3] for row in rows], dtype=np.int64),
+    )
+    meta = {
+        "count": len(keys),
+        "limit": SUGGEST_LIMIT,
+        "prefixes": precompute_prefixes(
+            keys, weights, SUGGEST_SCAN_LIMIT, SUGGEST_LIMIT
+        ),
+        **(extra_meta or {}),
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return len(keys)
+
+
+class _Keys:
+    """
+    Sequence view over the mapped keys, for `bisect`. Goes through
+    memoryviews, which index much faster than numpy scalars.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = memoryview(blob)
+        self.offsets = memoryview(offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return bytes(self.blob[self.offsets[row] : self.offsets[row + 1]])
+
+
+class SuggestIndex:
+    """
+    Read-only, memory-mapped view of an index written by `write_suggest_index`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.keys = _Keys(self._blob("keys"), self._load("keys.offsets.npy"))
+        self.label_blob = memoryview(self._blob("labels"))
+        self.label_offsets = memoryview(self._load("labels.offsets.npy"))
+        self.weights = self._load("weights.npy")
+        self.kinds = self._load("kinds.npy")
+        self.product_ids = self._load("product_ids.npy")
+        self.prefixes = self.meta["prefixes"]
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name), mmap_mode="r")
+
+    def _blob(self, name):
+        path = os.path.join(self.path, f"{name}.bin")
+        if not os.path.getsize(path):
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+    def label(self, row):
+        start, end = self.label_offsets[row], self.label_offsets[row + 1]
+        return bytes(self.label_blob[start:end]).decode("utf-8")
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT):
+        key = normalize(prefix).encode("utf-8")
+        if not key:
+            return []
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + PREFIX_END, lo)
+        if hi - lo > SUGGEST_SCAN_LIMIT and key.hex() in self.prefixes:
+            rows = self.prefixes[key.hex()][:limit]
+        else:
+            rows = top_rows(self.weights, lo, hi, limit)
+        suggestions = []
+        for row in rows:
+            item = {"text": self.label(row), "type": KINDS[self.kinds[row]]}
+            product_id = int(self.product_ids[row])
+            if product_id >= 0:
+                item["product_id"] = product_id
+            suggestions.append(item)
+        return suggestions
+
+
+async def suggestion_entries(backend=None):
+    """
+    (label, kind, weight, product_id) of titles, stores and logged queries.
+    Titles weigh by review count, stores by their total, queries by count.
+    """
+    backend = backend or get_search_backend()
+    entries = []
+    store_reviews = {}
+    async for props, _ in backend.iter_products(properties=SUGGEST_PROPERTIES):
+        reviews = max(props.get("rating_number") or 0, 0)
+        if props.get("title"):
+            weight = KIND_BOOST["product"] * math.log1p(reviews)
+            entries.append((props["title"], "product", weight, props["product_id"]))
+        if props.get("store"):
+            store = props["store"]
+            store_reviews[store] = store_reviews.get(store, 0) + reviews
+    for store, reviews in store_reviews.items():
+        entries.append((store, "store", KIND_BOOST["store"] * math.log1p(reviews), -1))
+    queries = await query_log.top_with_counts("query", SUGGEST_QUERIES)
+    for query, count in queries:
+        entries.append((query, "query", KIND_BOOST["query"] * math.log1p(count), -1))
+    return entries
+
+
+async def build_suggest_index(root=SUGGEST_INDEX_PATH, backend=None):
+    """
+    Builds a new index directory under `root` and points CURRENT at it.
+    """
+    started = time.monotonic()
+    entries = await suggestion_entries(backend)
+    name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.getpid()}"
+    path = os.path.join(root, name)
+    meta = {"catalog_version": get_catalog_version(), "built_at": time.time()}
+    count = await asyncio.to_thread(write_suggest_index, path, entries, meta)
+    tmp = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+    # Older builds may still be mapped by other workers; keep the previous one
+    builds = sorted(
+        entry
+        for entry in os.listdir(root)
+        if os.path.isdir(os.path.join(root, entry)) and entry != name
+    )
+    for old in builds[:-1]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    logger.info(
+        f"✅ Built suggestion index with {count} keys "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return path
+
+
+# Index this worker has mapped
+suggest_index = None
+
+
+def current_index_path(root=SUGGEST_INDEX_PATH):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            path = os.path.join(root, f.read().strip())
+    except FileNotFoundError:
+        return None
+    return path if os.path.exists(os.path.join(path, "meta.json")) else None
+
+
+def get_suggest_index():
+    return suggest_index
+
+
+def load_suggest_index(root=SUGGEST_INDEX_PATH):
+    """
+    Maps the current index if it changed since the last call.
+    """
+    global suggest_index
+    path = current_index_path(root)
+    if path is not None and (suggest_index is None or suggest_index.path != path):
+        suggest_index = SuggestIndex(path)
+    return suggest_index
+
+
+def needs_rebuild(index):
+    if index is None:
+        return True
+    meta = index.meta
+    return (
+        meta.get("catalog_version") != get_catalog_version()
+        or time.time() - meta.get("built_at", 0) > SUGGEST_REBUILD_SECONDS
+    )
+
+
+async def refresh_suggest_index(root=SUGGEST_INDEX_PATH):
+    """
+    Rebuilds the index when the catalog version changed or it is older than
+    SUGGEST_REBUILD_SECONDS, then maps the current one. One worker per host
+    builds, under a file lock; the others pick the result up.
+    """
+    index = load_suggest_index(root)
+    if not needs_rebuild(index):
+        return index
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return index
+        # Another worker may have finished a build while we checked
+        if needs_rebuild(load_suggest_index(root)):
+            await build_suggest_index(root)
+    return load_suggest_index(root)
+
+
+async def refresh_suggest_periodically(is_ready):
+    """
+    Background task: builds the index once `await is_ready()`, then keeps
+    it current while the catalog stays ready.
+    """
+    while not await is_ready():
+        await asyncio.sleep(5)
+    while True:
+        try:
+            if await is_ready():
+                await refresh_suggest_index()
+        except Exception as e:
+            logger.error(f"Suggestion index refresh failed: {e}")
+        await asyncio.sleep(SUGGEST_REFRESH_SECONDS)
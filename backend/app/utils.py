@@ -2,14 +2,19 @@ from contextlib import asynccontextmanager
 from typing import Callable
 
 import dotenv
+import redis
 import redis.asyncio as aioredis
 import weaviate
 
+from app.weaviate_pool import get_weaviate_pool
+
 # Load environment variables
 dotenv.load_dotenv()
 
-# Lazy Redis connection
+# Lazy Redis connections
 redis_client = None
+redis_binary_client = None
+redis_sync_client = None
 
 
 def get_redis_client():
@@ -22,6 +27,29 @@ def get_redis_client():
     return redis_client
 
 
+def get_redis_binary_client():
+    """
+    Lazily initializes and returns a Redis client for raw bytes values.
+    """
+    global redis_binary_client
+    if redis_binary_client is None:
+        redis_binary_client = aioredis.from_url("redis://redis:6379/0")
+    return redis_binary_client
+
+
+def get_redis_sync_client():
+    """
+    Lazily initializes and returns a blocking Redis client, for code that
+    runs in threads (database initialization).
+    """
+    global redis_sync_client
+    if redis_sync_client is None:
+        redis_sync_client = redis.Redis.from_url(
+            "redis://redis:6379/0", decode_responses=True
+        )
+    return redis_sync_client
+
+
 def get_weaviate_client():
     return weaviate.connect_to_custom(
         http_host="weaviate",
@@ -35,23 +63,53 @@ def get_weaviate_client():
 
 @asynccontextmanager
 async def get_product_collection():
-    client = None
-    try:
-        client = get_weaviate_client()
-        collection = client.collections.get("Product")
-        yield client, collection
-    finally:
-        if client:
-            client.close()
+    """
+    Yields a shared async Weaviate client and its `Product` collection.
+    """
+    async with get_weaviate_pool().acquire() as client:
+        yield client, client.collections.get("Product")
 
 
-def rate_limit(limit_string: str):
+def rate_limit(limit_string: str, misses: str = None):
     """
-    Decorator to attach rate limit information to a function.
+    Decorator to attach rate limit information to a function: a per-client
+    request budget such as "60/minute", and optionally a stricter budget
+    for requests that miss the cache (see `app.rate_limiter`).
     """
 
     def decorator(func: Callable):
         func.__rate_limit__ = limit_string
+        if misses is not None:
+            func.__miss_rate_limit__ = misses
+        return func
+
+    return decorator
+
+
+def cache_control(max_age: int, stale_while_revalidate: int = 0):
+    """
+    Decorator to attach an HTTP caching policy to a route: browsers and
+    shared caches may reuse its responses for `max_age` seconds, and serve
+    them stale for `stale_while_revalidate` more while refetching in the
+    background (see `app.http_cache`).
+    """
+
+    def decorator(func: Callable):
+        func.__cache_control__ = (max_age, stale_while_revalidate)
+        return func
+
+    return decorator
+
+
+def deadline(seconds: float):
+    """
+    Decorator to attach a latency budget to a route: search and embedding
+    calls made while serving it fail once `seconds` have passed since the
+    request started (see `app.resilience`).
+    """
+
+    def decorator(func: Callable):
+        func.__deadline__ = seconds
         return func
 
     return decorator
@@ -0,0 +1,377 @@
+import json
+import os
+from array import array
+
+import numpy as np
+
+from app.logger_setup import logger
+
+try:
+    import hnswlib
+except ImportError:  # Optional: brute force is used without it
+    hnswlib = None
+
+# Column layout of the `Product` catalog in the local store
+PRODUCT_COLUMNS = {
+    "product_id": "int",
+    "parent_asin": "text",
+    "title": "text",
+    "average_rating": "float",
+    "rating_number": "int",
+    "features": "text_array",
+    "description": "text",
+    "price": "float",
+    "store": "category",
+    "details": "text",
+    "main_hi_res_image": "text",
+}
+
+INDEX_FORMAT_VERSION = 1
+# Rows scored per matrix product; bounds the temporary score buffer
+SCORE_BLOCK_ROWS = 65536
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(vectors, queries, k, rows=None):
+    """
+    Exact inner-product top-k for a batch of queries over the rows of an
+    L2-normalized `vectors` matrix (may be memory-mapped).
+
+    Scores are computed block by block so the temporary score matrix stays
+    bounded; `rows` optionally restricts the search to a subset of rows.
+    Returns (row indices, scores), each shaped (len(queries), k'), best first.
+    """
+    queries = _normalize(np.atleast_2d(queries))
+    candidates = len(vectors) if rows is None else len(rows)
+    k = min(k, candidates)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    if k <= 0:
+        return best_rows, best_scores
+    for start in range(0, candidates, SCORE_BLOCK_ROWS):
+        if rows is None:
+            block_rows = np.arange(start, min(start + SCORE_BLOCK_ROWS, candidates))
+            block = vectors[start : start + SCORE_BLOCK_ROWS]
+        else:
+            block_rows = rows[start : start + SCORE_BLOCK_ROWS]
+            block = vectors[block_rows]
+        scores = queries @ block.T
+        if scores.shape[1] > k:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, part, axis=1)
+            block_rows = block_rows[part]
+        else:
+            block_rows = np.broadcast_to(block_rows, scores.shape)
+        best_rows = np.concatenate([best_rows, block_rows], axis=1)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        if best_scores.shape[1] > k:
+            part = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(best_rows, part, axis=1)
+            best_scores = np.take_along_axis(best_scores, part, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best_rows, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+class LocalIndexWriter:
+    """
+    Streams products and their vectors into an on-disk local index.
+
+    Layout of the index directory:
+      vectors.f32            row-major float32 matrix, L2-normalized
+      <col>.npy              int64/float64 numeric columns
+      <col>.codes.npy        int32 codes of category columns (vocab in meta)
+      <col>.offsets.npy      int64 offsets into <col>.bin for text columns
+      hnsw.bin               optional HNSW graph (requires hnswlib)
+      meta.json              written last; its presence marks a complete index
+    """
+
+    def __init__(self, path, dim, columns=PRODUCT_COLUMNS, extra_meta=None):
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            os.remove(os.path.join(path, "meta.json"))
+        self.path = path
+        self.dim = dim
+        self.columns = columns
+        self.extra_meta = extra_meta or {}
+        self.count = 0
+        self._vectors = open(os.path.join(path, "vectors.f32"), "wb")
+        self._numeric = {}
+        self._codes = {}
+        self._vocab = {}
+        self._offsets = {}
+        self._blobs = {}
+        for name, kind in columns.items():
+            if kind == "int":
+                self._numeric[name] = array("q")
+            elif kind == "float":
+                self._numeric[name] = array("d")
+            elif kind == "category":
+                self._codes[name] = array("i")
+                self._vocab[name] = {}
+            else:
+                self._offsets[name] = array("q", [0])
+                self._blobs[name] = open(os.path.join(path, f"{name}.bin"), "wb")
+
+    def add(self, properties, vector):
+        self._vectors.write(_normalize(vector).astype("<f4").tobytes())
+        for name, values in self._numeric.items():
+            value = properties.get(name)
+            values.append(-1 if value is None else value)
+        for name, codes in self._codes.items():
+            vocab = self._vocab[name]
+            codes.append(vocab.setdefault(properties.get(name) or "", len(vocab)))
+        for name, offsets in self._offsets.items():
+            value = properties.get(name)
+            if self.columns[name] == "text_array":
+                value = json.dumps(value or [])
+            data = (value or "").encode("utf-8")
+            self._blobs[name].write(data)
+            offsets.append(offsets[-1] + len(data))
+        self.count += 1
+
+    def close(self, build_hnsw=False):
+        self._vectors.close()
+        for blob in self._blobs.values():
+            blob.close()
+        for name, values in self._numeric.items():
+            dtype = np.int64 if self.columns[name] == "int" else np.float64
+            np.save(self._file(f"{name}.npy"), np.frombuffer(values, dtype=dtype))
+        for name, codes in self._codes.items():
+            np.save(self._file(f"{name}.codes.npy"), np.frombuffer(codes, np.int32))
+        for name, offsets in self._offsets.items():
+            np.save(self._file(f"{name}.offsets.npy"), np.frombuffer(offsets, np.int64))
+        if build_hnsw and self.count:
+            self._build_hnsw()
+        meta = {
+            "format": INDEX_FORMAT_VERSION,
+            "count": self.count,
+            "dim": self.dim,
+            "columns": self.columns,
+            "vocab": {name: list(vocab) for name, vocab in self._vocab.items()},
+            **self.extra_meta,
+        }
+        with open(self._file("meta.json"), "w") as f:
+            json.dump(meta, f)
+        logger.info(f"✅ Wrote local index with {self.count} products to {self.path}")
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _build_hnsw(self):
+        if hnswlib is None:
+            logger.warning("hnswlib is not installed; skipping HNSW graph build")
+            return
+        vectors = np.memmap(
+            self._file("vectors.f32"),
+            dtype="<f4",
+            mode="r",
+            shape=(self.count, self.dim),
+        )
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=self.count, ef_construction=200, M=16)
+        for start in range(0, self.count, SCORE_BLOCK_ROWS):
+            block = vectors[start : start + SCORE_BLOCK_ROWS]
+            index.add_items(block, np.arange(start, start + len(block)))
+        index.save_index(self._file("hnsw.bin"))
+
+
+class LocalIndex:
+    """
+    Read-only, memory-mapped view of an index written by LocalIndexWriter.
+
+    Vectors and columns are mapped rather than loaded, so every worker
+    process on the host shares the same page-cached copy.
+    """
+
+    def __init__(self, path, use_hnsw=True):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.count = self.meta["count"]
+        self.dim = self.meta["dim"]
+        self.columns = self.meta["columns"]
+        self.vectors = (
+            np.memmap(
+                self._file("vectors.f32"),
+                dtype="<f4",
+                mode="r",
+                shape=(self.count, self.dim),
+            )
+            if self.count
+            else np.zeros((0, self.dim), dtype=np.float32)
+        )
+        self.numeric = {}
+        self.codes = {}
+        self.vocab = {}
+        self.offsets = {}
+        self.blobs = {}
+        for name, kind in self.columns.items():
+            if kind in ("int", "float"):
+                self.numeric[name] = np.load(self._file(f"{name}.npy"), mmap_mode="r")
+            elif kind == "category":
+                self.codes[name] = np.load(
+                    self._file(f"{name}.codes.npy"), mmap_mode="r"
+                )
+                self.vocab[name] = self.meta["vocab"][name]
+            else:
+                self.offsets[name] = np.load(
+                    self._file(f"{name}.offsets.npy"), mmap_mode="r"
+                )
+                blob = self._file(f"{name}.bin")
+                self.blobs[name] = (
+                    np.memmap(blob, dtype=np.uint8, mode="r")
+                    if os.path.getsize(blob)
+                    else np.zeros(0, dtype=np.uint8)
+                )
+        ids = self.numeric["product_id"]
+        self._id_order = np.argsort(ids, kind="stable")
+        self._sorted_ids = np.asarray(ids)[self._id_order]
+        self._sort_orders = {}
+        self.hnsw = None
+        if use_hnsw and hnswlib is not None and os.path.exists(self._file("hnsw.bin")):
+            self.hnsw = hnswlib.Index(space="ip", dim=self.dim)
+            self.hnsw.load_index(self._file("hnsw.bin"), max_elements=self.count)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def value(self, name, row):
+        kind = self.columns[name]
+        if kind == "int":
+            return int(self.numeric[name][row])
+        if kind == "float":
+            return float(self.numeric[name][row])
+        if kind == "category":
+            return self.vocab[name][self.codes[name][row]]
+        offsets = self.offsets[name]
+        text = bytes(self.blobs[name][offsets[row] : offsets[row + 1]]).decode("utf-8")
+        return json.loads(text) if kind == "text_array" else text
+
+    def row(self, row, properties=None):
+        return {name: self.value(name, row) for name in properties or self.columns}
+
+    def rows_for_ids(self, product_ids):
+        """
+        Maps product ids to row numbers; unknown ids map to -1.
+        """
+        ids = np.asarray(product_ids, dtype=np.int64)
+        if not self.count:
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, ids), self.count - 1)
+        return np.where(self._sorted_ids[pos] == ids, self._id_order[pos], -1)
+
+    def mask(self, filters):
+        """
+        Vectorized boolean mask of rows matching every filter condition.
+        """
+        if not filters:
+            return None
+        mask = np.ones(self.count, dtype=bool)
+        for condition in filters:
+            mask &= self._condition_mask(condition)
+        return mask
+
+    def _condition_mask(self, condition):
+        name, op, value = condition.prop, condition.op, condition.value
+        kind = self.columns[name]
+        if kind == "category":
+            vocab = self.vocab[name]
+            if op != "eq":
+                raise ValueError(f"Unsupported filter {op} on {name}")
+            if value not in vocab:
+                return np.zeros(self.count, dtype=bool)
+            return np.asarray(self.codes[name]) == vocab.index(value)
+        if kind in ("text", "text_array"):
+            if op != "eq":
+                raise ValueError(f"Unsupported filter {op} on {name}")
+            return np.fromiter(
+                (self.value(name, i) == value for i in range(self.count)),
+                dtype=bool,
+                count=self.count,
+            )
+        column = np.asarray(self.numeric[name])
+        if op == "eq":
+            return column == value
+        if op == "gte":
+            return column >= value
+        if op == "gt":
+            return column > value
+        if op == "lte":
+            return column <= value
+        if op == "lt":
+            return column < value
+        raise ValueError(f"Unsupported filter {op} on {name}")
+
+    def top_k(self, queries, k, rows=None):
+        """
+        Exact inner-product top-k of `queries` over this index; see `top_k`.
+        """
+        return top_k(self.vectors, queries, k, rows)
+
+    def search(self, vector, k, filters=()):
+        """
+        Rows of the `k` nearest products to `vector`, best first.
+        """
+        mask = self.mask(filters)
+        if mask is None and self.hnsw is not None and k <= self.count:
+            self.hnsw.set_ef(max(k * 2, 64))
+            labels, _ = self.hnsw.knn_query(_normalize(vector), k=k)
+            return [int(row) for row in labels[0]]
+        rows = None if mask is None else np.flatnonzero(mask)
+        best_rows, _ = self.top_k(vector, k, rows=rows)
+        return [int(row) for row in best_rows[0]]
+
+    def sorted_rows(self, sort_by, descending=True, filters=()):
+        """
+        Row numbers ordered by a numeric column; orders are cached per column.
+        """
+        key = (sort_by, descending)
+        if key not in self._sort_orders:
+            column = np.asarray(self.numeric[sort_by])
+            order = np.argsort(-column if descending else column, kind="stable")
+            self._sort_orders[key] = order
+        order = self._sort_orders[key]
+        mask = self.mask(filters)
+        return order if mask is None else order[mask[order]]
+
+
+def export_collection(collection, path, build_hnsw=False, extra_meta=None):
+    """
+    Copies a Weaviate `Product` collection (properties and vectors) into a
+    local index directory. Uses the synchronous client.
+    """
+    writer = None
+    for obj in collection.iterator(include_vector=True):
+        vector = obj.vector["default"] if isinstance(obj.vector, dict) else obj.vector
+        if writer is None:
+            writer = LocalIndexWriter(path, dim=len(vector), extra_meta=extra_meta)
+        writer.add(obj.properties, vector)
+    if writer is None:
+        raise RuntimeError("Collection is empty; nothing to export.")
+    writer.close(build_hnsw=build_hnsw)
+    return writer.count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.utils import get_weaviate_client
+
+    parser = argparse.ArgumentParser(description="Export the catalog to a local index")
+    parser.add_argument("path", help="Directory to write the index to")
+    parser.add_argument("--hnsw", action="store_true", help="Also build an HNSW graph")
+    args = parser.parse_args()
+
+    client = get_weaviate_client()
+    try:
+        export_collection(client.collections.get("Product"), args.path, args.hnsw)
+    finally:
+        client.close()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+from app import query_log
+from app.catalog import get_catalog_version, set_cache_warm
+from app.logger_setup import logger
+from app.routes.best_sellers import best_sellers_entry
+from app.routes.products import browse_entry, product_json, search_entry
+from app.routes.trending import trending_entry
+
+# How much of the popularity logs to pre-fill after a catalog switch
+CACHE_WARM_QUERIES = int(os.getenv("CACHE_WARM_QUERIES", "100"))
+CACHE_WARM_PRODUCTS = int(os.getenv("CACHE_WARM_PRODUCTS", "200"))
+CACHE_WARM_STORES = int(os.getenv("CACHE_WARM_STORES", "10"))
+# Result pages are warmed for this many of the most requested projections
+CACHE_WARM_PROJECTIONS = int(os.getenv("CACHE_WARM_PROJECTIONS", "2"))
+CACHE_WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", "8"))
+
+
+async def warm_jobs():
+    """
+    Fills for the rankings and the most requested queries and products,
+    most valuable first.
+    """
+    stores = await query_log.top("store", CACHE_WARM_STORES)
+    queries = await query_log.top("query", CACHE_WARM_QUERIES)
+    product_ids = await query_log.top("product_id", CACHE_WARM_PRODUCTS)
+    # Page keys include the projection, e.g. the grid's `fields=`
+    projections = [
+        None if fields == "*" else fields.split(",")
+        for fields in await query_log.top("fields", CACHE_WARM_PROJECTIONS)
+    ] or [None]
+
+    jobs = [lambda: best_sellers_entry(), lambda: trending_entry()]
+    for store in stores:
+        jobs.append(lambda store=store: best_sellers_entry(store))
+        jobs.append(lambda store=store: trending_entry(store))
+    jobs.extend(lambda props=props: browse_entry(props) for props in projections)
+    jobs.extend(
+        lambda query=query, props=props: search_entry(query, props)
+        for query in queries
+        for props in projections
+    )
+    jobs.extend(
+        lambda product_id=product_id: product_json(int(product_id))
+        for product_id in product_ids
+    )
+    return jobs
+
+
+async def warm_cache():
+    """
+    Pre-fills the namespace of the current catalog version, then marks the
+    cache warm. Fills go through the regular cache path, so workers warming
+    at the same time share the work through the fill locks.
+    """
+    set_cache_warm(False)
+    started = time.monotonic()
+    jobs = await warm_jobs()
+    semaphore = asyncio.Semaphore(CACHE_WARM_CONCURRENCY)
+    failed = 0
+
+    async def run(job):
+        nonlocal failed
+        async with semaphore:
+            try:
+                await job()
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Cache warm-up fill failed: {e}")
+
+    await asyncio.gather(*(run(job) for job in jobs))
+    set_cache_warm(True)
+    logger.info(
+        f"Warmed cache for catalog {get_catalog_version()}: {len(jobs) - failed}"
+        f"/{len(jobs)} entries in {time.monotonic() - started:.1f}s"
+    )
+
+
+async def warm_cache_safely():
+    """
+    Background variant of `warm_cache`: the cache counts as warm even if
+    warming fails, so a broken warm-up never holds back readiness.
+    """
+    try:
+        await warm_cache()
+    except Exception as e:
+        logger.error(f"Cache warm-up failed: {e}")
+        set_cache_warm(True)
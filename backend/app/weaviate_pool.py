@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import weaviate
+
+from app.logger_setup import logger
+
+# Long-lived clients per worker; each multiplexes any number of concurrent
+# queries over its HTTP/2 gRPC channel, so a few are enough
+WEAVIATE_POOL_SIZE = int(os.getenv("WEAVIATE_POOL_SIZE", "2"))
+WEAVIATE_HEALTH_CHECK_INTERVAL = float(
+    os.getenv("WEAVIATE_HEALTH_CHECK_INTERVAL", "30")
+)
+
+
+async def connect_async_client():
+    """
+    Opens a new async Weaviate client (HTTP + gRPC channels).
+    """
+    client = weaviate.use_async_with_custom(
+        http_host="weaviate",
+        http_port=8080,
+        http_secure=False,
+        grpc_host="weaviate",
+        grpc_port=50051,
+        grpc_secure=False,
+    )
+    await client.connect()
+    return client
+
+
+class WeaviatePool:
+    """
+    Fixed set of long-lived async Weaviate clients shared by all requests.
+
+    Clients are not leased exclusively: `acquire` hands them out round-robin
+    and any number of queries may be in flight on each. Slots are connected
+    lazily, health-checked when they have gone `health_check_interval`
+    without one and transparently replaced when a connection turns out to
+    be broken. A replaced client is closed once the queries still running
+    on it have finished.
+    """
+
+    def __init__(
+        self,
+        size=WEAVIATE_POOL_SIZE,
+        health_check_interval=WEAVIATE_HEALTH_CHECK_INTERVAL,
+        connect=connect_async_client,
+    ):
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self._connect = connect
+        self._slots = [None] * size
+        self._checked_at = [0.0] * size
+        self._locks = [asyncio.Lock() for _ in range(size)]
+        self._next = 0
+        # id(client) -> queries in flight, and retired clients still in use
+        self._in_flight = {}
+        self._retired = {}
+
+    async def open(self):
+        """
+        Connects every slot up front so the first requests skip the handshake.
+        """
+        for slot in range(self.size):
+            await self._client(slot)
+        logger.info(f"✅ Weaviate pool opened with {self.size} clients")
+
+    async def close(self):
+        clients, self._slots = self._slots, [None] * self.size
+        clients += list(self._retired.values())
+        self._retired.clear()
+        self._locks = [asyncio.Lock() for _ in range(self.size)]
+        for client in clients:
+            if client is not None:
+                await self._close_client(client)
+        logger.info("Weaviate pool closed")
+
+    async def _close_client(self, client):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Weaviate client: {e}")
+
+    def _check_due(self, slot) -> bool:
+        elapsed = time.monotonic() - self._checked_at[slot]
+        return elapsed >= self.health_check_interval
+
+    async def _client(self, slot):
+        client = self._slots[slot]
+        if client is not None and not self._check_due(slot):
+            return client
+        # One coroutine connects or checks a slot; the others wait for it
+        async with self._locks[slot]:
+            client = self._slots[slot]
+            if client is not None and self._check_due(slot):
+                try:
+                    healthy = await client.is_ready()
+                except Exception:
+                    healthy = False
+                if healthy:
+                    self._checked_at[slot] = time.monotonic()
+                else:
+                    logger.warning("Weaviate client failed health check; reconnecting")
+                    await self._retire(slot, client)
+                    client = None
+            if client is None:
+                client = await self._connect()
+                self._slots[slot] = client
+                self._checked_at[slot] = time.monotonic()
+        return client
+
+    async def _retire(self, slot, client):
+        """
+        Takes `client` out of rotation; it is closed now if idle, otherwise
+        when its last query finishes.
+        """
+        # Other queries may have failed on the same client and replaced it
+        if self._slots[slot] is not client:
+            return
+        self._slots[slot] = None
+        if self._in_flight.get(id(client)):
+            self._retired[id(client)] = client
+        else:
+            await self._close_client(client)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Yields the next shared client, round-robin. The client stays usable
+        by other requests for the duration of the block.
+        """
+        slot = self._next % self.size
+        self._next += 1
+        client = await self._client(slot)
+        key = id(client)
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield client
+        except weaviate.exceptions.WeaviateConnectionError:
+            # The next query on this slot reconnects
+            await self._retire(slot, client)
+            raise
+        finally:
+            self._in_flight[key] -= 1
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+                if key in self._retired:
+                    await self._close_client(self._retired.pop(key))
+
+
+# Process-wide pool, opened and closed by the app lifespan
+weaviate_pool = None
+
+
+def get_weaviate_pool():
+    """
+    Lazily initializes and returns the process-wide Weaviate pool.
+    """
+    global weaviate_pool
+    if weaviate_pool is None:
+        weaviate_pool = WeaviatePool()
+    return weaviate_pool
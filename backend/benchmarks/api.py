@@ -0,0 +1,178 @@
+"""
+Load test of the FastAPI app against in-process stand-ins.
+
+    python -m benchmarks.api --concurrency 32 --requests 2000 \
+        --output results.json --baseline baseline.json
+
+Redis is replaced by fakeredis and the `Product` collection by
+`FakeProductBackend`, so runs are reproducible and need no services.
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+import uuid
+
+import fakeredis
+import httpx
+
+from app import cache, rate_limiter, search_backend, utils
+from app.logger_setup import logger
+from app.ranking import refresh_rankings
+from benchmarks.fakes import STORES, WORDS, FakeProductBackend
+from benchmarks.report import build_report, summarize, write_report
+
+
+def workloads(catalog_size, seed=0):
+    """
+    Endpoint name -> pool of distinct request paths, most popular first.
+    """
+    rng = random.Random(seed)
+    queries = sorted({" ".join(rng.sample(WORDS, 2)) for _ in range(300)})[:200]
+    store_params = [""] + [f"?store={store}" for store in STORES]
+    return {
+        "products_query": [f"/products?query={query}" for query in queries],
+        "products_product_id": [
+            f"/products?product_id={i}" for i in range(1, min(catalog_size, 200) + 1)
+        ],
+        "products_browse": [
+            f"/products?limit=20&min_rating={rating}" for rating in range(5)
+        ]
+        + ["/products?limit=20"],
+        "trending": [f"/trending{params}" for params in store_params],
+        "best_sellers": [f"/best-sellers{params}" for params in store_params],
+    }
+
+
+def skewed(pool, seed=0):
+    """
+    Endless Zipf-like sample of `pool`: the i-th path has weight 1 / (i + 1).
+    """
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(pool))]
+    while True:
+        yield from rng.choices(pool, weights, k=1000)
+
+
+async def drive(client, paths, total, concurrency):
+    """
+    Sends `total` requests from `paths` with `concurrency` workers; returns
+    (latencies in seconds, error count, elapsed seconds).
+    """
+    latencies, errors = [], 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while next(counter) < total:
+            path = next(paths)
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                ok = response.status_code < 500
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def use_stand_ins(backend):
+    """
+    Points the app at fakeredis and `backend`; returns the binary client.
+    Rate limiting is off, since every request comes from one client.
+    """
+    server = fakeredis.FakeServer()
+    utils.redis_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    utils.redis_binary_client = fakeredis.FakeAsyncRedis(server=server)
+    search_backend.search_backend = search_backend.ResilientBackend(backend)
+    rate_limiter.RATE_LIMIT_ENABLED = False
+    os.environ["QUERY_EMBEDDER"] = "hash"
+    return utils.redis_binary_client
+
+
+async def run(args):
+    from main import app
+
+    # Per-request debug logging would dominate the measurements
+    logger.setLevel(args.log_level)
+    backend = FakeProductBackend(
+        size=args.catalog_size, latency=args.latency_ms / 1000, seed=args.seed
+    )
+    redis = use_stand_ins(backend)
+    await refresh_rankings(backend)
+
+    namespaced = cache.namespaced
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        for scenario in args.scenarios:
+            results[scenario] = {}
+            for name, pool in workloads(args.catalog_size, args.seed).items():
+                if args.endpoints and name not in args.endpoints:
+                    continue
+                await redis.flushdb()
+                await refresh_rankings(backend)
+                cache.local_cache.clear()
+                if scenario == "cold":
+                    # Every lookup lands in a fresh namespace: all misses
+                    cache.namespaced = lambda key: f"cold:{uuid.uuid4().hex}:{key}"
+                else:
+                    cache.namespaced = namespaced
+                    await drive(c, iter(pool), len(pool), args.concurrency)
+                before = backend.queries
+                latencies, errors, elapsed = await drive(
+                    c, skewed(pool, args.seed), args.requests, args.concurrency
+                )
+                stats = summarize(latencies, errors, elapsed)
+                stats["backend_queries"] = backend.queries - before
+                results[scenario][name] = stats
+                print(f"{scenario}/{name}: {stats}", file=sys.stderr)
+    cache.namespaced = namespaced
+
+    config = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "baseline", "tolerance", "log_level")
+    }
+    return build_report("api", config, results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--catalog-size", type=int, default=10000)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=["hot", "cold"], default=["hot", "cold"]
+    )
+    parser.add_argument("--endpoints", nargs="*", help="Subset of endpoints to run")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed regression fraction"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    ok = write_report(report, args.output, args.baseline, args.tolerance)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import json
+import random
+import time
+from contextlib import contextmanager
+
+from app.search_backend import SearchBackend
+
+STORES = ["Amazon Essentials", "Levi's", "Hanes", "Carhartt", "Columbia", "Crocs"]
+WORDS = [
+    "linen",
+    "cotton",
+    "shirt",
+    "dress",
+    "jacket",
+    "boots",
+    "sneakers",
+    "denim",
+    "wool",
+    "summer",
+    "winter",
+    "hoodie",
+    "socks",
+    "scarf",
+    "leather",
+    "running",
+]
+
+
+def synthetic_product(product_id: int, rng: random.Random) -> dict:
+    title = " ".join(rng.sample(WORDS, 3))
+    return {
+        "product_id": product_id,
+        "title": title.title(),
+        "average_rating": round(rng.uniform(1, 5), 1),
+        "rating_number": int(rng.paretovariate(1.2) * 3),
+        "features": [f"{word} feature" for word in rng.sample(WORDS, 4)],
+        "description": f"A {title} for every day. " * 8,
+        "price": round(rng.uniform(5, 200), 2),
+        "store": rng.choice(STORES),
+        "details": json.dumps({"Material": rng.choice(WORDS), "Fit": "Regular"}),
+        "main_hi_res_image": "71abc.jpg",
+    }
+
+
+def synthetic_record(rng: random.Random) -> dict:
+    """
+    Raw catalog line in the format ingestion reads.
+    """
+    product = synthetic_product(0, rng)
+    return {
+        "title": product["title"],
+        "average_rating": product["average_rating"],
+        "rating_number": product["rating_number"],
+        "features": product["features"],
+        "description": [product["description"]],
+        "price": product["price"],
+        "store": product["store"],
+        "details": json.loads(product["details"]),
+        "images": [
+            {"variant": "MAIN", "hi_res": "https://m.media-amazon.com/images/I/x.jpg"}
+        ],
+    }
+
+
+def write_catalog(path: str, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    with gzip.open(path, "wt") as f:
+        for _ in range(count):
+            f.write(json.dumps(synthetic_record(rng)) + "\n")
+
+
+def _matches(product, filters):
+    for condition in filters:
+        value = product.get(condition.prop)
+        if condition.op == "eq" and value != condition.value:
+            return False
+        if condition.op == "gt" and not value > condition.value:
+            return False
+        if condition.op == "gte" and not value >= condition.value:
+            return False
+        if condition.op == "lt" and not value < condition.value:
+            return False
+        if condition.op == "lte" and not value <= condition.value:
+            return False
+    return True
+
+
+def _project(product, properties):
+    if not properties:
+        return dict(product)
+    return {name: product[name] for name in properties if name in product}
+
+
+class FakeProductBackend(SearchBackend):
+    """
+    In-memory stand-in for the `Product` collection: a synthetic catalog
+    served after a configurable per-query latency (mean and jitter in
+    seconds), so the numbers reflect the app rather than the engine.
+    """
+
+    def __init__(self, size=10000, latency=0.02, jitter=0.005, seed=0):
+        rng = random.Random(seed)
+        self.products = [synthetic_product(i, rng) for i in range(1, size + 1)]
+        self.by_id = {p["product_id"]: p for p in self.products}
+        self.latency = latency
+        self.jitter = jitter
+        self.queries = 0
+        self._rng = random.Random(seed)
+        self._orders = {}
+
+    async def _wait(self):
+        self.queries += 1
+        delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(max(delay, 0))
+
+    def _candidates(self, seed, filters):
+        # Deterministic pseudo-ranking so equal queries return equal results
+        start = hash(seed) % len(self.products)
+        ordered = self.products[start:] + self.products[:start]
+        return [p for p in ordered if _matches(p, filters)] if filters else ordered
+
+    async def near_vector(
+        self, vector, limit=20, offset=0, filters=(), properties=None
+    ):
+        await self._wait()
+        rows = self._candidates(tuple(vector[:4]), filters)[offset : offset + limit]
+        return [_project(p, properties) for p in rows]
+
+    async def near_text(self, query, limit=20, offset=0, filters=(), properties=None):
+        await self._wait()
+        rows = self._candidates(query, filters)[offset : offset + limit]
+        return [_project(p, properties) for p in rows]
+
+    async def hybrid(
+        self,
+        query,
+        vector=None,
+        alpha=0.5,
+        limit=20,
+        offset=0,
+        filters=(),
+        properties=None,
+    ):
+        return await self.near_text(query, limit, offset, filters, properties)
+
+    async def fetch_by_ids(self, product_ids, properties=None):
+        await self._wait()
+        found = (self.by_id.get(pid) for pid in product_ids)
+        return [_project(p, properties) for p in found if p is not None]
+
+    async def fetch_objects(
+        self,
+        limit=20,
+        offset=0,
+        sort_by=None,
+        descending=True,
+        filters=(),
+        properties=None,
+    ):
+        await self._wait()
+        rows = self.products
+        if sort_by:
+            key = (sort_by, descending)
+            if key not in self._orders:
+                self._orders[key] = sorted(
+                    rows, key=lambda p: p[sort_by], reverse=descending
+                )
+            rows = self._orders[key]
+        if filters:
+            rows = [p for p in rows if _matches(p, filters)]
+        return [_project(p, properties) for p in rows[offset : offset + limit]]
+
+    async def iter_products(self, properties=None, include_vector=False):
+        for product in self.products:
+            yield _project(product, properties), None
+
+
+class FakeBatch:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def add_object(self, properties, uuid=None):
+        self.collection.objects += 1
+        if self.collection.objects % self.collection.flush_every == 0:
+            time.sleep(self.collection.flush_latency)
+
+
+class FakeCollection:
+    """
+    Synchronous `Product` collection stand-in for ingestion: objects are
+    counted, and every `flush_every` objects costs `flush_latency` seconds,
+    like a batch round trip.
+    """
+
+    def __init__(self, flush_every=100, flush_latency=0.005):
+        self.objects = 0
+        self.flush_every = flush_every
+        self.flush_latency = flush_latency
+        self.batch = self
+        self.failed_objects = []
+
+    @contextmanager
+    def dynamic(self):
+        yield FakeBatch(self)
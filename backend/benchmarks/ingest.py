@@ -0,0 +1,83 @@
+"""
+Ingestion benchmark of `populate_collection` on a synthetic gzip JSONL file.
+
+    python -m benchmarks.ingest --records 50000 --workers 1 4 --output ingest.json
+
+Objects go to an in-memory collection whose batch flushes cost a fixed
+latency, so the numbers reflect download, parsing and batching.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from app.init_db import populate_collection
+from app.logger_setup import logger
+from benchmarks.fakes import FakeCollection, write_catalog
+from benchmarks.report import build_report, write_report
+
+
+def run(args):
+    logger.setLevel(args.log_level)
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "catalog.jsonl.gz")
+        write_catalog(source, args.records, args.seed)
+        os.environ["RAW_URL"] = source
+        os.environ["NO_OF_PRODUCTS"] = str(args.records)
+        # Checkpoints go to a relative data/ directory; keep them out of the repo
+        os.chdir(tmp)
+        try:
+            for workers in args.workers:
+                collection = FakeCollection(
+                    args.flush_every, args.flush_latency_ms / 1000
+                )
+                started = time.perf_counter()
+                populate_collection(collection, workers=workers)
+                elapsed = time.perf_counter() - started
+                stats = {
+                    "records": collection.objects,
+                    "elapsed_s": round(elapsed, 3),
+                    "records_per_second": round(collection.objects / elapsed, 1),
+                }
+                results[f"workers_{workers}"] = stats
+                print(f"workers={workers}: {stats}", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+
+    config = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "baseline", "tolerance", "log_level")
+    }
+    return build_report("ingest", config, results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--flush-every", type=int, default=100)
+    parser.add_argument("--flush-latency-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed regression fraction"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    ok = write_report(report, args.output, args.baseline, args.tolerance)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import json
+import platform
+import sys
+import time
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Throughput and latency percentiles (milliseconds) of one run.
+    """
+    values = sorted(latencies)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+    }
+
+
+def build_report(name, config, results):
+    return {
+        "benchmark": name,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": config,
+        "results": results,
+    }
+
+
+# Compared figures and whether higher values are better
+COMPARED = {
+    "p95_ms": False,
+    "throughput_rps": True,
+    "records_per_second": True,
+}
+
+
+def _flatten(results, prefix=()):
+    for key, value in results.items():
+        if any(isinstance(v, dict) for v in value.values()):
+            yield from _flatten(value, prefix + (key,))
+        else:
+            yield "/".join(prefix + (key,)), value
+
+
+def compare(results, baseline_results, tolerance):
+    """
+    Lines describing each case against the baseline, and whether any
+    regressed: a compared figure worse than the baseline by more than
+    `tolerance` (a fraction).
+    """
+    baseline = dict(_flatten(baseline_results))
+    lines, regressed = [], False
+    for case, stats in _flatten(results):
+        before = baseline.get(case)
+        if before is None:
+            lines.append(f"{case}: no baseline")
+            continue
+        parts, worse = [], False
+        for figure, higher_is_better in COMPARED.items():
+            if figure not in stats or figure not in before:
+                continue
+            old, new = before[figure], stats[figure]
+            change = (new - old) / old if old else 0.0
+            worse = worse or (-change if higher_is_better else change) > tolerance
+            parts.append(f"{figure} {old} -> {new} ({change:+.0%})")
+        regressed = regressed or worse
+        lines.append(f"{case}: " + ", ".join(parts) + ("  REGRESSION" if worse else ""))
+    return lines, regressed
+
+
+def write_report(report, output=None, baseline=None, tolerance=0.25):
+    """
+    Prints the report as JSON (or writes it to `output`) and compares it
+    against a baseline report file. Returns False if anything regressed.
+    """
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if not baseline:
+        return True
+    with open(baseline) as f:
+        baseline_report = json.load(f)
+    lines, regressed = compare(report["results"], baseline_report["results"], tolerance)
+    print("\n".join(lines), file=sys.stderr)
+    return not regressed
@@ -1,12 +1,11 @@
 import os
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.util import get_remote_address
 
+from app.http_cache import http_cache
+from app.metrics import label_route, track_requests
 from app.middleware import (
     custom_http_exception_handler,
     generic_exception_handler,
@@ -15,6 +14,16 @@ from app.middleware import (
     log_slow_requests,
     validation_exception_handler,
 )
+from app.rate_limiter import (
+    RateLimitExceeded,
+    enforce_rate_limit,
+    rate_limit_exceeded_handler,
+)
+from app.resilience import (
+    SearchUnavailable,
+    search_unavailable_handler,
+    start_deadline,
+)
 from app.routes import routers
 
 # Initialize FastAPI app
@@ -23,16 +32,18 @@ app = FastAPI(
     description="A semantic search API for fashion recommendations.",
     version="1.0.0",
     lifespan=lifespan,
+    dependencies=[
+        Depends(label_route),
+        Depends(enforce_rate_limit),
+        Depends(start_deadline),
+    ],
 )
 
-# Middleware
+# Middleware (the last one added runs first)
+app.middleware("http")(http_cache)
 app.middleware("http")(log_slow_requests)
 app.middleware("http")(log_error_responses)
-
-# Global rate limiter
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
+app.middleware("http")(track_requests)
 
 # Read FRONT_END_URL env var and split by commas into a list
 allowed_origins = os.getenv("FRONT_END_URL", "").split(",")
@@ -53,7 +64,10 @@ app.add_middleware(
 app.exception_handler(Exception)(generic_exception_handler)
 app.exception_handler(RequestValidationError)(validation_exception_handler)
 app.exception_handler(HTTPException)(custom_http_exception_handler)
+app.exception_handler(RateLimitExceeded)(rate_limit_exceeded_handler)
+app.exception_handler(SearchUnavailable)(search_unavailable_handler)
 
-# Include all API routers (each router should use app.state.limiter)
+# Include all API routers (limits, deadlines and cache policies come from
+# their annotations)
 for router in routers:
     app.include_router(router)
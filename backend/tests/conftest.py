@@ -0,0 +1,27 @@
+import fakeredis
+import pytest
+
+from app import utils
+from app.cache import local_cache
+from app.semantic_cache import semantic_cache
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Points the shared Redis clients at an in-process fake server and starts
+    from empty in-process caches.
+    """
+    server = fakeredis.FakeServer()
+    text_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    binary_client = fakeredis.FakeAsyncRedis(server=server)
+    monkeypatch.setattr(utils, "redis_client", text_client)
+    monkeypatch.setattr(utils, "redis_binary_client", binary_client)
+    monkeypatch.setattr(
+        utils,
+        "redis_sync_client",
+        fakeredis.FakeRedis(server=server, decode_responses=True),
+    )
+    local_cache.clear()
+    semantic_cache.clear()
+    return binary_client
@@ -0,0 +1,41 @@
+import asyncio
+from collections import Counter
+
+from app import query_log, rate_limiter, search_backend, utils
+from app.logger_setup import logger
+from benchmarks import api
+from benchmarks.report import compare, summarize
+
+
+def test_summarize_and_compare_flag_regressions():
+    stats = summarize([0.01] * 90 + [0.1] * 10, errors=0, elapsed=1.0)
+    assert stats["p50_ms"] == 10.0
+    assert stats["p99_ms"] == 100.0
+
+    slower = dict(stats, p95_ms=stats["p95_ms"] * 2)
+    lines, regressed = compare({"hot": {"x": slower}}, {"hot": {"x": stats}}, 0.25)
+    assert regressed and "REGRESSION" in lines[0]
+    assert not compare({"hot": {"x": stats}}, {"hot": {"x": stats}}, 0.25)[1]
+
+
+def test_api_benchmark_smoke(monkeypatch):
+    for name in ("redis_client", "redis_binary_client"):
+        monkeypatch.setattr(utils, name, None)
+    monkeypatch.setattr(search_backend, "search_backend", None)
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setenv("QUERY_EMBEDDER", "hash")
+    monkeypatch.setattr(logger, "level", logger.level)
+    monkeypatch.setattr(query_log, "pending", {k: Counter() for k in query_log.pending})
+
+    args = api.parse_args(
+        ["--requests", "20", "--concurrency", "4", "--catalog-size", "300"]
+        + ["--latency-ms", "0", "--endpoints", "products_query", "trending"]
+    )
+    report = asyncio.run(api.run(args))
+
+    for scenario in ("hot", "cold"):
+        results = report["results"][scenario]
+        assert set(results) == {"products_query", "trending"}
+        assert all(r["errors"] == 0 and r["requests"] == 20 for r in results.values())
+    assert report["results"]["hot"]["trending"]["backend_queries"] == 0
+    assert report["results"]["cold"]["trending"]["backend_queries"] == 20
@@ -0,0 +1,144 @@
+import asyncio
+
+from app import cache
+from app.cache import (
+    CACHE_STALE_SECONDS,
+    SingleFlight,
+    cached,
+    decode_entry,
+    encode_entry,
+    should_refresh_early,
+)
+from app.catalog import namespaced, set_catalog_version
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("k", compute) for _ in range(10)))
+
+    assert asyncio.run(scenario()) == [1] * 10
+    assert calls == 1
+
+
+def test_cached_computes_once_for_concurrent_misses(fake_redis):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"payload"
+
+    async def scenario():
+        results = await asyncio.gather(*(cached("query:x", compute) for _ in range(10)))
+        again = await cached("query:x", compute)
+        stored = decode_entry(await fake_redis.get(namespaced("query:x")))[0]
+        return results, again, stored
+
+    results, again, stored = asyncio.run(scenario())
+    assert results == [b"payload"] * 10
+    assert again == stored == b"payload"
+    assert calls == 1
+
+
+def test_cached_does_not_store_none(fake_redis):
+    async def compute():
+        return None
+
+    async def scenario():
+        return await cached("product_id:1", compute), await fake_redis.exists(
+            namespaced("product_id:1")
+        )
+
+    assert asyncio.run(scenario()) == (None, 0)
+
+
+def test_cached_waits_for_other_worker_holding_the_lock(fake_redis):
+    async def compute():
+        raise AssertionError("should reuse the other worker's result")
+
+    async def other_worker():
+        key = namespaced("best_sellers")
+        await fake_redis.set(f"lock:{key}", "other", px=1000)
+        await asyncio.sleep(0.1)
+        await fake_redis.set(key, b"\x00\x00\x00\x00ranked")
+        await fake_redis.delete(f"lock:{key}")
+
+    async def scenario():
+        worker = asyncio.ensure_future(other_worker())
+        await asyncio.sleep(0.01)
+        result = await cached("best_sellers", compute)
+        await worker
+        return result
+
+    assert asyncio.run(scenario()) == b"ranked"
+
+
+def test_should_refresh_early():
+    assert not should_refresh_early(0, 1000)
+    assert not should_refresh_early(10, 3_600_000, beta=0)
+    assert should_refresh_early(10_000, 1, beta=1.0)
+
+
+def test_new_catalog_version_switches_namespace(fake_redis, monkeypatch):
+    monkeypatch.setattr("app.catalog.catalog_version", "a")
+
+    async def scenario(value):
+        async def compute():
+            return value
+
+        return await cached("trending_products", compute)
+
+    assert asyncio.run(scenario(b"old")) == b"old"
+    assert asyncio.run(scenario(b"new")) == b"old"
+    set_catalog_version("b")
+    assert asyncio.run(scenario(b"new")) == b"new"
+
+
+def test_expired_entries_are_served_stale_when_a_refresh_fails(fake_redis):
+    key = namespaced("trending_products")
+
+    async def failing():
+        raise ConnectionError("search engine down")
+
+    async def scenario():
+        # Within its grace period: past CACHE_TTL, still in Redis
+        await fake_redis.set(key, encode_entry(b"stale", 5), ex=60)
+        served = await cached("trending_products", failing)
+
+        async def fresh():
+            return b"fresh"
+
+        refreshed = await cached("trending_products", fresh)
+        return served, refreshed, await fake_redis.ttl(key)
+
+    served, refreshed, ttl = asyncio.run(scenario())
+    assert served == b"stale"
+    assert refreshed == b"fresh"
+    assert ttl > CACHE_STALE_SECONDS
+
+
+def test_expired_entries_skip_recompute_while_degraded(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache, "degraded", lambda: True)
+
+    async def compute():
+        raise AssertionError("must not reach the search engine")
+
+    async def scenario():
+        await fake_redis.set(namespaced("best_sellers"), encode_entry(b"old", 5), ex=60)
+        return await cached("best_sellers", compute)
+
+    assert asyncio.run(scenario()) == b"old"
+
+
+def test_invalidate_without_keys_is_a_no_op(fake_redis):
+    asyncio.run(cache.invalidate())
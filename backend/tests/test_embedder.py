@@ -0,0 +1,64 @@
+import asyncio
+
+from app.embedder import (
+    CachedQueryEmbedder,
+    EmbeddingCache,
+    HashEmbedder,
+    normalize_query,
+    pack_vector,
+    unpack_vector,
+)
+
+
+class MemoryEmbeddingCache(EmbeddingCache):
+    def __init__(self):
+        super().__init__("test")
+        self.store = {}
+
+    async def get(self, normalized):
+        data = self.store.get(self.key(normalized))
+        return unpack_vector(data) if data else None
+
+    async def set(self, normalized, vector):
+        self.store[self.key(normalized)] = pack_vector(vector)
+
+
+class CountingEmbedder(HashEmbedder):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.calls = 0
+
+    async def embed(self, text):
+        self.calls += 1
+        return await super().embed(text)
+
+
+def test_normalize_query():
+    assert normalize_query("  Outfit  for\tBEACH ") == "outfit for beach"
+
+
+def test_pack_roundtrip_is_float32():
+    data = pack_vector([0.5, -1.25, 3.0])
+    assert len(data) == 12
+    assert unpack_vector(data) == [0.5, -1.25, 3.0]
+
+
+def test_hash_embedder_is_deterministic_and_normalized():
+    embedder = HashEmbedder(dim=64)
+    a = embedder.embed_sync("linen shirt")
+    assert a == embedder.embed_sync("Linen   SHIRT")
+    assert abs(sum(x * x for x in a) - 1.0) < 1e-9
+
+
+def test_cached_embedder_embeds_each_normalized_query_once():
+    embedder = CountingEmbedder()
+    cached = CachedQueryEmbedder(embedder, MemoryEmbeddingCache())
+
+    async def scenario():
+        first = await cached.embed("Beach outfit")
+        second = await cached.embed("beach   outfit")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert embedder.calls == 1
+    assert max(abs(a - b) for a, b in zip(first, second)) < 1e-6
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.embedder import HashEmbedder
+from app.facets import (
+    LOCK_KEY,
+    FacetCounter,
+    bucket_counts,
+    facets_from_index,
+    rebuild_global_facets,
+    save_global_facets,
+)
+from app.routes import facets as facets_route
+from app.routes import products as products_route
+from app.search_backend import SearchBackend
+from app.utils import get_redis_sync_client
+from app.vector_engine import LocalIndex, LocalIndexWriter
+from backend.main import app
+
+client = TestClient(app)
+
+PRODUCTS = [
+    {"product_id": 1, "store": "Sunny", "price": 9.99, "average_rating": 4.6},
+    {"product_id": 2, "store": "Nordic", "price": 120.0, "average_rating": 3.2},
+    {"product_id": 3, "store": "Sunny", "price": 10.0, "average_rating": None},
+    {"product_id": 4, "store": "", "price": -1.0, "average_rating": 1.0},
+]
+
+
+def test_bucket_counts_uses_lower_bounds_and_skips_missing():
+    counts = bucket_counts([0, 9.99, 10, 250, None, -1], (0, 10, 25))
+    assert counts.tolist() == [2, 1, 1]
+
+
+def test_counter_table():
+    counter = FacetCounter()
+    counter.add(PRODUCTS[:2])
+    counter.add(PRODUCTS[2:])
+    table = counter.table()
+
+    assert table["total"] == 4
+    facets = table["facets"]
+    assert facets["store"] == [
+        {"value": "Sunny", "count": 2},
+        {"value": "Nordic", "count": 1},
+    ]
+    assert facets["price"][0] == {"min": 0, "max": 10, "count": 1}
+    assert facets["price"][1]["count"] == 1
+    assert facets["price"][-1] == {"min": 200, "max": None, "count": 0}
+    assert [band["count"] for band in facets["average_rating"]] == [1, 0, 1, 0, 1]
+
+
+def test_facets_from_local_index_match_counted_records(tmp_path):
+    embedder = HashEmbedder(dim=16)
+    writer = LocalIndexWriter(str(tmp_path), dim=16)
+    for product in PRODUCTS:
+        writer.add(product, embedder.embed_sync(product["store"] or "none"))
+    writer.close()
+
+    expected = FacetCounter()
+    expected.add(PRODUCTS)
+    index = LocalIndex(str(tmp_path), use_hnsw=False)
+    assert facets_from_index(index).table() == expected.table()
+
+
+class FacetBackend(SearchBackend):
+    def __init__(self):
+        self.calls = 0
+
+    async def hybrid(self, query, vector, alpha, limit, offset, filters, properties):
+        self.calls += 1
+        return [{k: p[k] for k in properties} for p in PRODUCTS[:3]]
+
+
+@pytest.fixture
+def backend(fake_redis, monkeypatch):
+    fake = FacetBackend()
+    monkeypatch.setattr(products_route, "get_search_backend", lambda: fake)
+    monkeypatch.setattr(products_route, "get_query_embedder", lambda: None)
+    monkeypatch.setattr(facets_route, "get_query_embedder", lambda: None)
+    return fake
+
+
+def test_global_facets_come_from_the_ingestion_table(backend):
+    assert client.get("/products/facets").status_code == 404
+
+    counter = FacetCounter()
+    counter.add(PRODUCTS)
+    save_global_facets(get_redis_sync_client(), counter)
+    body = client.get("/products/facets").json()
+    assert body["ok"] and body["total"] == 4
+    assert backend.calls == 0
+
+
+def test_missing_global_table_is_rebuilt_from_the_catalog(backend):
+    class CatalogBackend(SearchBackend):
+        async def iter_products(self, properties=None, include_vector=False):
+            for product in PRODUCTS:
+                yield {k: product[k] for k in properties}, None
+
+    # Left to the worker already counting
+    get_redis_sync_client().set(LOCK_KEY, "other-worker")
+    assert not asyncio.run(rebuild_global_facets(CatalogBackend()))
+    get_redis_sync_client().delete(LOCK_KEY)
+
+    assert asyncio.run(rebuild_global_facets(CatalogBackend()))
+    assert client.get("/products/facets").json()["total"] == 4
+    # Only a missing table is rebuilt
+    assert not asyncio.run(rebuild_global_facets(CatalogBackend()))
+
+
+def test_query_facets_count_candidates_once(backend):
+    first = client.get("/products/facets?query=Beach shirts").json()
+    assert first["total"] == 3 and first["truncated"] is False
+    assert first["facets"]["store"][0] == {"value": "Sunny", "count": 2}
+
+    client.get("/products/facets?query=beach shirt")
+    assert backend.calls == 1
+
+
+def test_filter_facets_flag_truncated_counts(backend, monkeypatch):
+    class FilterBackend(SearchBackend):
+        async def fetch_objects(self, limit, filters, properties, **kwargs):
+            return [{k: p[k] for k in properties} for p in PRODUCTS[:limit]]
+
+    monkeypatch.setattr(facets_route, "get_search_backend", FilterBackend)
+    monkeypatch.setattr(facets_route, "FACET_CANDIDATES", 2)
+    body = client.get("/products/facets?store=Sunny").json()
+    assert body["total"] == 2 and body["truncated"] is True
@@ -1,12 +1,156 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
 from fastapi.testclient import TestClient
 
+from app import catalog, init_db, middleware
+from app.init_db import (
+    INGESTION_STATUS_KEY,
+    IngestionLock,
+    load_ingestion_status,
+    reset_ingestion_status,
+    set_ingestion_complete,
+)
+from app.routes import health
 from backend.main import app
 
 client = TestClient(app)
 
 
-def test_health_check():
+def use_probes(monkeypatch, weaviate_up=True):
+    async def ping_weaviate():
+        if not weaviate_up:
+            raise RuntimeError("down")
+
+    monkeypatch.setattr(health, "PROBES", {**health.PROBES, "weaviate": ping_weaviate})
+    monkeypatch.setattr(health, "probe_results", {})
+    monkeypatch.setattr(init_db, "ingestion_complete", False)
+    monkeypatch.setattr(init_db, "INGESTION_STATUS_TTL", 0.0)
+    monkeypatch.setattr(catalog, "warmed_once", True)
+
+
+def test_health_check(fake_redis, monkeypatch):
+    use_probes(monkeypatch)
     response = client.get("/health")
     assert response.status_code == 200
     data = response.json()
     assert data.get("ok") is True
+    assert data["redis"] == data["weaviate"] == "ok"
+
+
+def test_readiness_follows_shared_ingestion_status(fake_redis, monkeypatch):
+    use_probes(monkeypatch)
+    assert client.get("/health/live").status_code == 200
+
+    not_ready = client.get("/health/ready")
+    assert not_ready.status_code == 503
+    assert not_ready.json()["ingestion_complete"] is False
+
+    # Another worker finishing ingestion makes this one ready
+    set_ingestion_complete()
+    monkeypatch.setattr(init_db, "ingestion_complete", False)
+    assert client.get("/health/ready").status_code == 200
+
+    # ...and starting a re-ingestion takes it out of rotation again
+    reset_ingestion_status()
+    monkeypatch.setattr(init_db, "ingestion_complete", True)
+    assert client.get("/health/ready").status_code == 503
+
+
+def test_status_is_republished_after_redis_loses_it(fake_redis, monkeypatch):
+    use_probes(monkeypatch)
+    set_ingestion_complete()
+    assert asyncio.run(load_ingestion_status())
+
+    init_db.get_redis_sync_client().flushall()
+    assert asyncio.run(load_ingestion_status())
+    assert init_db.get_redis_sync_client().get(INGESTION_STATUS_KEY) == "complete"
+
+    # A reset is recorded, not deleted, so it is never taken for data loss
+    reset_ingestion_status()
+    monkeypatch.setattr(init_db, "ingestion_complete", True)
+    assert not asyncio.run(load_ingestion_status())
+
+
+def test_startup_does_not_wait_for_ingestion(fake_redis, monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+
+    def initialize_database():
+        started.set()
+        finish.wait(5)
+        return "new-catalog"
+
+    async def idle(*args):
+        await asyncio.Event().wait()
+
+    async def noop():
+        pass
+
+    monkeypatch.setattr(catalog, "catalog_version", None)
+    monkeypatch.setattr(middleware, "initialize_database", initialize_database)
+    monkeypatch.setattr(
+        middleware, "get_weaviate_pool", lambda: SimpleNamespace(open=noop, close=noop)
+    )
+    for name in (
+        "refresh_rankings_periodically",
+        "refresh_similar_periodically",
+        "refresh_suggest_periodically",
+        "rebuild_facets_periodically",
+        "listen_for_invalidations",
+        "flush_periodically",
+        "warm_cache_safely",
+        "watch_catalog_version",
+    ):
+        monkeypatch.setattr(middleware, name, idle)
+
+    async def scenario():
+        async with middleware.lifespan(app):
+            # Serving while the database is still being initialized
+            await asyncio.to_thread(started.wait, 5)
+            assert catalog.get_catalog_version() != catalog.version_for("new-catalog")
+            finish.set()
+            for _ in range(100):
+                if catalog.get_catalog_version() == catalog.version_for("new-catalog"):
+                    break
+                await asyncio.sleep(0.01)
+            assert catalog.get_catalog_version() == catalog.version_for("new-catalog")
+
+    asyncio.run(scenario())
+
+
+def test_readiness_waits_for_first_warm_up(fake_redis, monkeypatch):
+    use_probes(monkeypatch)
+    set_ingestion_complete()
+    monkeypatch.setattr(catalog, "warmed_once", False)
+    monkeypatch.setattr(catalog, "warm_started_at", None)
+    catalog.set_cache_warm(False)
+    assert client.get("/health/ready").status_code == 503
+
+    # A warm-up that hangs stops holding readiness back after the timeout
+    monkeypatch.setattr(catalog, "CACHE_WARM_TIMEOUT", 0.0)
+    assert client.get("/health/ready").status_code == 200
+
+    # Once warmed, re-warming after a catalog switch keeps the worker ready
+    monkeypatch.setattr(catalog, "CACHE_WARM_TIMEOUT", 60.0)
+    catalog.set_cache_warm(True)
+    catalog.set_cache_warm(False)
+    assert client.get("/health/ready").status_code == 200
+    catalog.set_cache_warm(True)
+
+
+def test_readiness_reports_failed_probe(fake_redis, monkeypatch):
+    use_probes(monkeypatch, weaviate_up=False)
+    set_ingestion_complete()
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["weaviate"] == "error"
+
+
+def test_only_one_worker_holds_the_ingestion_lock(fake_redis):
+    leader, follower = IngestionLock(ttl_ms=1000), IngestionLock(ttl_ms=1000)
+    assert leader.acquire()
+    assert not follower.acquire()
+    leader.release()
+    assert follower.acquire()
+    follower.release()
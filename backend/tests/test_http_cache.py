@@ -0,0 +1,86 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import http_cache
+from app.routes import suggest as suggest_route
+from backend.main import app
+
+client = TestClient(app)
+
+
+class CountingIndex:
+    def __init__(self, text="linen shirt"):
+        self.text = text
+        self.calls = 0
+
+    def suggest(self, prefix, limit):
+        self.calls += 1
+        return [{"text": self.text, "type": "query"}] * limit
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = CountingIndex()
+    monkeypatch.setattr(suggest_route, "get_suggest_index", lambda: index)
+    monkeypatch.setattr(http_cache, "get_catalog_version", lambda: "v1")
+    http_cache.validators.clear()
+    yield index
+    http_cache.validators.clear()
+
+
+def test_matching_etag_uses_weak_comparison():
+    etags = ('W/"v1-aa"', 'W/"v1-bb"')
+    assert http_cache.matching_etag('"v1-bb", "v1-cc"', etags) == 'W/"v1-bb"'
+    assert http_cache.matching_etag("*", etags) == 'W/"v1-aa"'
+    assert http_cache.matching_etag('W/"v2-aa"', etags) is None
+    assert http_cache.matching_etag(None, etags) is None
+
+
+def test_conditional_get_is_answered_without_running_the_handler(index):
+    first = client.get("/suggest?prefix=li&limit=2")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"v1-')
+    assert first.headers["cache-control"] == (
+        "public, max-age=60, stale-while-revalidate=600"
+    )
+
+    again = client.get("/suggest?prefix=li&limit=2", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+    assert index.calls == 1
+
+    # Unknown URLs run the handler, then compare against the fresh body
+    other = client.get("/suggest?prefix=lin&limit=2", headers={"If-None-Match": etag})
+    assert other.status_code == 304
+    assert index.calls == 2
+
+
+def test_new_catalog_version_changes_validators(index, monkeypatch):
+    etag = client.get("/suggest?prefix=li").headers["etag"]
+    monkeypatch.setattr(http_cache, "get_catalog_version", lambda: "v2")
+
+    response = client.get("/suggest?prefix=li", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert index.calls == 2
+
+
+def test_large_bodies_are_compressed_for_clients_that_accept_it(index):
+    index.text = "x" * 200
+    response = client.get(
+        "/suggest?prefix=x&limit=10", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["suggestions"][0]["text"] == index.text
+
+    plain = client.get(
+        "/suggest?prefix=x&limit=10", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in plain.headers
+    # Same representation before transport compression, same validator
+    assert plain.headers["etag"] == response.headers["etag"]
+
+    small = client.get("/suggest?prefix=x&limit=1", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
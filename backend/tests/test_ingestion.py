@@ -0,0 +1,256 @@
+import gzip
+import json
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.facets import FacetCounter, facets_from_collection
+from app.ingestion import (
+    Checkpoint,
+    DeltaIngestion,
+    IngestionPipeline,
+    Manifest,
+    has_legacy_uuids,
+    product_uuid,
+    rekey_legacy_objects,
+    transform_record,
+)
+
+
+class FakeBatch:
+    def __init__(self, sink):
+        self.sink = sink
+
+    def add_object(self, properties, uuid=None, vector=None):
+        self.sink.fail_countdown -= 1
+        if self.sink.fail_countdown == 0:
+            raise RuntimeError("connection lost")
+        self.sink.objects[uuid] = properties
+        if vector is None:
+            # Stands in for text2vec-openai embedding the object
+            self.sink.embedded += 1
+            vector = [float(len(properties["title"]))]
+        self.sink.vectors[uuid] = vector
+
+
+class FakeCollection:
+    def __init__(self, fail_after=None):
+        self.objects = {}
+        self.vectors = {}
+        self.embedded = 0
+        self.fail_countdown = fail_after or -1
+        self.batch = self.data = self.query = self
+        self.failed_objects = []
+
+    @contextmanager
+    def dynamic(self):
+        yield FakeBatch(self)
+
+    def delete_many(self, where):
+        if where.target == "product_id":
+            ids = set(where.value)
+            uuids = [u for u, p in self.objects.items() if p["product_id"] in ids]
+        else:
+            uuids = [str(uuid) for uuid in where.value]
+        for uuid in uuids:
+            self.objects.pop(uuid, None)
+
+    def fetch_objects(self, limit, return_properties):
+        return SimpleNamespace(objects=list(self.iterator())[:limit])
+
+    def fetch_objects_by_ids(self, uuids, limit, include_vector, return_properties):
+        return SimpleNamespace(
+            objects=[
+                SimpleNamespace(uuid=uuid, vector={"default": self.vectors[uuid]})
+                for uuid in uuids
+                if uuid in self.objects
+            ]
+        )
+
+    def iterator(self, return_properties=None, include_vector=False):
+        for uuid, props in list(self.objects.items()):
+            yield SimpleNamespace(
+                uuid=uuid, properties=props, vector={"default": self.vectors[uuid]}
+            )
+
+
+def write_catalog(path, count, changes=None, skip=()):
+    with gzip.open(path, "wt") as f:
+        for i in range(count):
+            if i in skip:
+                continue
+            record = {
+                "parent_asin": f"B{i:04d}",
+                "title": f"Product {i}",
+                "store": "Store",
+                "description": ["A", "thing"],
+                "average_rating": 4.0,
+                "rating_number": i,
+                "price": None,
+                "images": [
+                    {
+                        "variant": "MAIN",
+                        "hi_res": "https://m.media-amazon.com/images/I/x.jpg",
+                    }
+                ],
+            }
+            record.update((changes or {}).get(i, {}))
+            f.write(json.dumps(record) + "\n")
+
+
+def test_transform_record_defaults():
+    props = transform_record({"title": "Hat", "description": ["Warm", "hat"]}, 7)
+    assert props["product_id"] == 7
+    assert props["description"] == "Warm hat"
+    assert props["price"] == -1.0
+    assert props["rating_number"] == -1
+    assert props["details"] == "{}"
+    assert props["main_hi_res_image"] == ""
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pipeline_ingests_local_gzip(tmp_path, workers):
+    source = str(tmp_path / "catalog.jsonl.gz")
+    write_catalog(source, 23)
+    collection = FakeCollection()
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+
+    facets = FacetCounter()
+    inserted = IngestionPipeline(
+        collection,
+        source,
+        limit=20,
+        workers=workers,
+        chunk_lines=3,
+        checkpoint_every=5,
+        checkpoint=checkpoint,
+        facets=facets,
+    ).run()
+
+    assert inserted == 20
+    assert facets.total == 20
+    assert facets.stores == {"Store": 20}
+    assert facets_from_collection(collection).table() == facets.table()
+    assert sorted(p["product_id"] for p in collection.objects.values()) == list(
+        range(1, 21)
+    )
+    assert collection.objects[product_uuid(1)]["main_hi_res_image"] == "x.jpg"
+    assert not checkpoint.exists()
+
+
+def test_pipeline_resumes_from_checkpoint(tmp_path):
+    source = str(tmp_path / "catalog.jsonl.gz")
+    write_catalog(source, 30)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    options = dict(workers=1, chunk_lines=4, checkpoint_every=8, checkpoint=checkpoint)
+
+    crashing = FakeCollection(fail_after=20)
+    with pytest.raises(RuntimeError):
+        IngestionPipeline(crashing, source, **options).run()
+    state = checkpoint.load(source)
+    assert state["last_product_id"] == 16
+
+    resumed = FakeCollection()
+    pipeline = IngestionPipeline(resumed, source, **options)
+    inserted = pipeline.run()
+    assert inserted == 30
+    assert pipeline.resumed
+    assert sorted(p["product_id"] for p in resumed.objects.values()) == list(
+        range(17, 31)
+    )
+
+
+def test_delta_ingestion_writes_only_changes(tmp_path):
+    source = str(tmp_path / "catalog.jsonl.gz")
+    write_catalog(source, 10)
+    collection = FakeCollection()
+    IngestionPipeline(
+        collection, source, workers=1, checkpoint=Checkpoint(str(tmp_path / "c"))
+    ).run()
+    manifest = Manifest(str(tmp_path / "manifest.json.gz"))
+
+    # First run has no manifest: it is built from the collection
+    result = DeltaIngestion(collection, source, manifest=manifest).run()
+    assert result.unchanged == 10 and result.changed == 0
+    assert manifest.load() is not None
+
+    collection.embedded = 0
+    write_catalog(source, 11, changes={0: {"title": "Renamed"}, 1: {"price": 9.5}})
+    result = DeltaIngestion(collection, source, limit=None, manifest=manifest).run()
+    assert (result.added, result.reembedded, result.updated) == (1, 1, 1)
+    assert result.unchanged == 8
+    # The price change kept its stored vector; only title changes embed
+    assert collection.embedded == 2
+    assert collection.objects[product_uuid(2)]["price"] == 9.5
+    assert sorted(p["product_id"] for p in result.rescored) == [1, 2, 11]
+
+    write_catalog(source, 9)
+    result = DeltaIngestion(collection, source, manifest=manifest).run()
+    assert result.deleted == 2
+    assert sorted(result.removed) == [10, 11]
+    assert product_uuid(10) not in collection.objects
+    assert len(collection.objects) == 9
+
+
+def test_delta_ingestion_keeps_ids_when_records_move(tmp_path):
+    source = str(tmp_path / "catalog.jsonl.gz")
+    write_catalog(source, 10)
+    collection = FakeCollection()
+    IngestionPipeline(
+        collection, source, workers=1, checkpoint=Checkpoint(str(tmp_path / "c"))
+    ).run()
+    manifest = Manifest(str(tmp_path / "manifest.json.gz"))
+    DeltaIngestion(collection, source, manifest=manifest).run()
+    ids = {p["parent_asin"]: p["product_id"] for p in collection.objects.values()}
+
+    # Removing the first record only deletes it; later lines keep their ids
+    write_catalog(source, 10, skip={0})
+    result = DeltaIngestion(collection, source, manifest=manifest).run()
+    assert (result.deleted, result.changed, result.unchanged) == (1, 1, 9)
+    assert result.vector_changes == [ids["B0000"]]
+    assert product_uuid(ids["B0005"]) in collection.objects
+
+    # A record inserted mid-file gets a new id; deleted ids are not reused
+    with gzip.open(source, "rt") as f:
+        lines = f.readlines()
+    lines.insert(
+        4,
+        json.dumps({"parent_asin": "B9999", "title": "New", "description": []}) + "\n",
+    )
+    with gzip.open(source, "wt") as f:
+        f.writelines(lines)
+    result = DeltaIngestion(collection, source, manifest=manifest).run()
+    assert (result.added, result.changed, result.unchanged) == (1, 1, 9)
+    assert result.vector_changes == [11]
+    assert collection.objects[product_uuid(11)]["parent_asin"] == "B9999"
+
+    lines[4] = lines[4].replace("B9999", "B8888")
+    with gzip.open(source, "wt") as f:
+        f.writelines(lines)
+    result = DeltaIngestion(collection, source, manifest=manifest).run()
+    assert result.removed == [11] and result.vector_changes == [12, 11]
+
+
+def test_legacy_objects_are_rekeyed_with_their_vectors(tmp_path):
+    source = str(tmp_path / "catalog.jsonl.gz")
+    write_catalog(source, 5)
+    collection = FakeCollection()
+    IngestionPipeline(
+        collection, source, workers=1, checkpoint=Checkpoint(str(tmp_path / "c"))
+    ).run()
+    assert not has_legacy_uuids(collection)
+
+    # Objects written before UUIDs were derived from product_id
+    for pid in (2, 4):
+        legacy = f"00000000-0000-0000-0000-00000000000{pid}"
+        collection.objects[legacy] = collection.objects.pop(product_uuid(pid))
+        collection.vectors[legacy] = [float(pid)]
+    assert has_legacy_uuids(collection)
+
+    collection.embedded = 0
+    assert rekey_legacy_objects(collection, batch_size=1) == 2
+    assert not has_legacy_uuids(collection)
+    assert len(collection.objects) == 5
+    assert collection.vectors[product_uuid(4)] == [4.0]
+    assert collection.embedded == 0
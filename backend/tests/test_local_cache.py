@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from app.cache import listen_for_invalidations, local_cache
+from app.local_cache import LocalCache
+
+
+def test_size_aware_lru_eviction():
+    cache = LocalCache(max_bytes=10, max_ttl=60)
+    cache.set("a", b"1234", 60)
+    cache.set("b", b"1234", 60)
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.set("c", b"1234", 60)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size == 8
+    assert cache.stats["evictions"] == 1
+
+
+def test_ttl_is_capped_and_expires(monkeypatch):
+    cache = LocalCache(max_bytes=100, max_ttl=5)
+    now = time.monotonic()
+    cache.set("k", b"v", ttl=3600, metadata="m")
+    assert cache.get("k") == (b"v", "m")
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    assert cache.get("k") is None
+    assert cache.stats == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_invalidation_is_applied_from_pubsub(fake_redis):
+    async def scenario():
+        listener = asyncio.ensure_future(listen_for_invalidations())
+        await asyncio.sleep(0.05)
+        local_cache.set("best_sellers", b"stale", 60)
+        await fake_redis.publish("cache:invalidate", "best_sellers")
+        for _ in range(50):
+            if local_cache.get("best_sellers") is None:
+                break
+            await asyncio.sleep(0.01)
+        listener.cancel()
+        return local_cache.get("best_sellers")
+
+    assert asyncio.run(scenario()) is None
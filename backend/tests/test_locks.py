@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+from app.locks import RenewingLock, renewing_lock
+from app.utils import get_redis_sync_client
+
+
+def test_lock_is_renewed_while_held(fake_redis):
+    holder = RenewingLock("job:lock", ttl_ms=150)
+    assert holder.acquire()
+    # Held well past its TTL while the holder is alive
+    time.sleep(0.4)
+    assert not RenewingLock("job:lock", ttl_ms=150).acquire()
+    holder.release()
+    assert get_redis_sync_client().get("job:lock") is None
+
+
+def test_only_the_lock_holder_runs_the_job(fake_redis):
+    async def scenario():
+        async with renewing_lock("job:lock", 1000) as first:
+            async with renewing_lock("job:lock", 1000) as second:
+                assert first and not second
+        async with renewing_lock("job:lock", 1000) as again:
+            assert again
+
+    asyncio.run(scenario())
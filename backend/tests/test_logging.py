@@ -0,0 +1,42 @@
+import json
+import logging
+import queue
+
+from app.logger_setup import DroppingQueueHandler, JsonFormatter, SamplingFilter
+
+
+def make_record(level=logging.INFO, msg="Received query", **fields):
+    record = logging.makeLogRecord({"levelno": level, "msg": msg})
+    record.__dict__.update(fields)
+    return record
+
+
+def test_json_formatter_emits_structured_fields():
+    record = make_record(event="request", query="linen shirt", product_id=None)
+    line = json.loads(JsonFormatter().format(record))
+    assert line["message"] == "Received query"
+    assert line["event"] == "request"
+    assert line["query"] == "linen shirt"
+    assert "args" not in line and "levelno" not in line
+
+
+def test_sampling_filter_samples_and_rate_limits_tagged_events():
+    sampler = SamplingFilter(rates={"cache_hit": 0.0}, limit=3)
+    assert not sampler.filter(make_record(event="cache_hit"))
+    assert [sampler.filter(make_record(event="request")) for _ in range(5)] == [
+        True,
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert sampler.filter(make_record(level=logging.WARNING, event="request"))
+    assert sampler.filter(make_record())
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    for _ in range(3):
+        handler.handle(make_record(msg="%s items", args=(2,)))
+    assert handler.queue.qsize() == 1
+    assert handler.queue.get_nowait().getMessage() == "2 items"
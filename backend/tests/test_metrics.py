@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+
+from app.metrics import key_family
+from app.routes import products as products_route
+from app.search_backend import SearchBackend
+from backend.main import app
+
+client = TestClient(app)
+
+
+class FakeBackend(SearchBackend):
+    async def fetch_objects(self, limit=20, offset=0, **kwargs):
+        return [{"product_id": 1, "title": "linen shirt"}]
+
+
+def test_key_family():
+    assert key_family("product_id:12") == "product_id"
+    assert key_family("best_sellers") == "best_sellers"
+
+
+def test_metrics_expose_stage_timings_and_cache_counters(fake_redis, monkeypatch):
+    monkeypatch.setattr(products_route, "get_search_backend", FakeBackend)
+    client.get("/products?limit=7")
+    client.get("/products?limit=7")
+
+    body = client.get("/metrics").text
+    assert 'request_stage_seconds_count{route="/products",stage="search"} ' in body
+    assert 'request_stage_seconds_count{route="/products",stage="total"} ' in body
+    assert 'cache_requests_total{family="browse",result="hit",tier="l1"}' in body
+    assert 'requests_in_flight{route="/metrics"} 1.0' in body
@@ -0,0 +1,156 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import search_backend
+from app.ingestion import product_uuid
+from app.routes import products as products_route
+from app.search_backend import Condition, SearchBackend, WeaviateBackend
+from backend.main import app
+
+client = TestClient(app)
+
+CATALOG = [
+    {"product_id": i, "title": f"product {i}", "details": "{}", "price": float(i)}
+    for i in range(1, 8)
+]
+
+
+class FakeBackend(SearchBackend):
+    def __init__(self):
+        self.calls = []
+
+    async def fetch_objects(self, limit=20, offset=0, properties=None, **kwargs):
+        self.calls.append((limit, offset, properties))
+        rows = CATALOG[offset : offset + limit]
+        if properties:
+            rows = [{k: v for k, v in row.items() if k in properties} for row in rows]
+        return rows
+
+    async def hybrid(self, query, vector, alpha, limit, offset, filters, properties):
+        self.calls.append((query, alpha, filters))
+        return [row for row in CATALOG if row["price"] <= 3][offset : offset + limit]
+
+    async def fetch_by_ids(self, product_ids, properties=None):
+        self.calls.append(list(product_ids))
+        rows = [row for row in CATALOG if row["product_id"] in product_ids]
+        if properties:
+            rows = [{k: v for k, v in row.items() if k in properties} for row in rows]
+        return rows
+
+
+@pytest.fixture
+def backend(fake_redis, monkeypatch):
+    fake = FakeBackend()
+    monkeypatch.setattr(products_route, "get_search_backend", lambda: fake)
+    return fake
+
+
+def test_cursor_roundtrip_and_rejects_garbage():
+    assert products_route.decode_cursor(products_route.encode_cursor(40)) == 40
+    with pytest.raises(ValueError):
+        products_route.decode_cursor("not-a-cursor")
+
+
+def test_browse_pages_with_projection(backend):
+    first = client.get("/products?fields=title,price&limit=3").json()
+    assert first["products"][0] == {"product_id": 1, "title": "product 1", "price": 1}
+    assert backend.calls == [(3, 0, ["price", "product_id", "title"])]
+
+    cursor = first["next_cursor"]
+    second = client.get(f"/products?fields=price,title&limit=3&cursor={cursor}")
+    assert [p["product_id"] for p in second.json()["products"]] == [4, 5, 6]
+
+    last = client.get(
+        f"/products?fields=title,price&limit=3&cursor={second.json()['next_cursor']}"
+    ).json()
+    assert [p["product_id"] for p in last["products"]] == [7]
+    assert last["next_cursor"] is None
+
+    # Same canonical projection and page: served from the cache
+    client.get(f"/products?fields=title,price&limit=3&cursor={cursor}")
+    assert len(backend.calls) == 3
+
+
+def test_product_detail_projection_and_bad_fields(backend):
+    slim = client.get("/products?product_id=2&fields=title").json()
+    assert slim == {"ok": True, "product": {"product_id": 2, "title": "product 2"}}
+    full = client.get("/products?product_id=2").json()
+    assert full["product"]["details"] == "{}"
+
+    response = client.get("/products?fields=title,vector")
+    assert response.status_code == 400
+
+
+def test_batch_fetches_only_missing_products_once(backend):
+    client.get("/products?product_id=3")
+    backend.calls.clear()
+
+    response = client.get("/products/batch?ids=5,3,99,5").json()
+    assert [p["product_id"] for p in response["products"]] == [5, 3]
+    assert response["missing"] == [99]
+    assert backend.calls == [[5, 99]]
+
+    client.get("/products/batch?ids=3,5")
+    assert backend.calls == [[5, 99]]
+    assert client.get("/products/batch?ids=a,b").status_code == 400
+
+
+def test_hybrid_search_pushes_filters_down_and_keys_cache_by_them(backend, monkeypatch):
+    monkeypatch.setattr(products_route, "get_query_embedder", lambda: None)
+
+    response = client.get("/products?query=linen shirt&max_price=3&alpha=0.25")
+    assert [p["product_id"] for p in response.json()["products"]] == [1, 2, 3]
+    price = (Condition("price", "gte", 0), Condition("price", "lte", 3.0))
+    assert backend.calls == [("linen shirt", 0.25, price)]
+
+    client.get("/products?query=linen shirt&max_price=3&alpha=0.25")
+    client.get("/products?query=linen shirt&max_price=4&alpha=0.25")
+    assert len(backend.calls) == 2
+
+
+def test_near_duplicate_queries_share_one_search(backend, monkeypatch):
+    monkeypatch.setattr(products_route, "get_query_embedder", lambda: None)
+
+    client.get("/products?query=Beach outfits!")
+    response = client.get("/products?query=beach  outfit")
+    assert [p["product_id"] for p in response.json()["products"]] == [1, 2, 3]
+    assert backend.calls == [("Beach outfits!", 0.5, ())]
+
+
+def test_fetch_by_ids_finds_objects_under_legacy_uuids(monkeypatch):
+    # Product 2 still lives under a random UUID from before ids were derived
+    stored = {product_uuid(1): CATALOG[0], "legacy-uuid": CATALOG[1]}
+
+    class Query:
+        async def fetch_objects_by_ids(self, uuids, limit, return_properties):
+            return SimpleNamespace(
+                objects=[
+                    SimpleNamespace(
+                        uuid=uuid,
+                        properties={k: stored[uuid][k] for k in return_properties},
+                    )
+                    for uuid in uuids
+                    if uuid in stored
+                ]
+            )
+
+        async def fetch_objects(self, filters, limit, return_properties):
+            assert filters.target == "product_id"
+            objects = [
+                SimpleNamespace(properties={k: props[k] for k in return_properties})
+                for props in stored.values()
+                if props["product_id"] in filters.value
+            ]
+            return SimpleNamespace(objects=objects[:limit])
+
+    @asynccontextmanager
+    async def collection():
+        yield None, SimpleNamespace(query=Query())
+
+    monkeypatch.setattr(search_backend, "get_product_collection", collection)
+    found = asyncio.run(WeaviateBackend().fetch_by_ids([2, 9, 1], ["title"]))
+    assert found == [{"title": "product 2"}, {"title": "product 1"}]
@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+
+from app import ranking
+from app.cache import namespaced
+from app.ranking import bayesian_average, compute_rankings, ranking_key
+from app.utils import get_redis_client, get_redis_sync_client
+
+
+def test_bayesian_average_shrinks_small_samples():
+    scores = bayesian_average(
+        np.array([5.0, 4.8, -1.0]), np.array([2, 2000, -1]), 4.0, 50.0
+    )
+    assert scores[1] > scores[0]
+    assert scores[2] == 4.0
+
+
+def test_compute_rankings_builds_global_and_store_slices():
+    product_ids = [1, 2, 3, 4, 5, 6]
+    average_rating = [5.0, 4.5, 4.9, 3.0, 4.7, 4.0]
+    rating_number = [1, 900, 400, 1000, 50, 10]
+    stores = ["A", "A", "A", "A", "A", "B"]
+
+    tables, prior_mean, prior_weight = compute_rankings(
+        product_ids, average_rating, rating_number, stores
+    )
+
+    trending = [pid for pid, _ in tables[ranking_key("trending")]]
+    best_sellers = [pid for pid, _ in tables[ranking_key("best_sellers")]]
+    assert trending[0] == 3
+    assert trending.index(1) > trending.index(2)
+    assert best_sellers[0] == 2
+    assert [pid for pid, _ in tables[ranking_key("trending", "A")]][0] == 3
+    # Store B is below the minimum slice size
+    assert ranking_key("trending", "B") not in tables
+    assert prior_weight > 1
+
+
+class FakeRankingBackend:
+    def __init__(self, products):
+        self.products = products
+
+    async def iter_products(self, properties=None, include_vector=False):
+        for product in self.products:
+            yield product, None
+
+
+def catalog():
+    stores = ["A"] * 5 + ["B"] * 5
+    return [
+        {
+            "product_id": pid,
+            "average_rating": 4.0 + pid / 100,
+            "rating_number": 100,
+            "store": stores[pid - 1],
+        }
+        for pid in range(1, 11)
+    ]
+
+
+def test_refresh_invalidates_store_slices_and_runs_once(fake_redis):
+    redis = get_redis_client()
+    backend = FakeRankingBackend(catalog())
+    asyncio.run(redis.set(namespaced("trending_products:store:A"), "old"))
+
+    assert asyncio.run(ranking.refresh_rankings_if_stale(backend)) == 6
+    assert asyncio.run(redis.get(namespaced("trending_products:store:A"))) is None
+    # Fresh tables are not rebuilt by the next worker to check
+    assert asyncio.run(ranking.refresh_rankings_if_stale(backend)) == 0
+    ranking.reset_rankings(get_redis_sync_client())
+    # ...and stale ones are left alone while another worker rebuilds them
+    get_redis_sync_client().set(ranking.LOCK_KEY, "other-worker")
+    assert asyncio.run(ranking.refresh_rankings_if_stale(backend)) == 0
+    get_redis_sync_client().delete(ranking.LOCK_KEY)
+    assert asyncio.run(ranking.refresh_rankings_if_stale(backend)) == 6
+
+
+def test_update_rankings_rescores_moves_and_removes(fake_redis):
+    products = catalog()
+    asyncio.run(ranking.refresh_rankings(FakeRankingBackend(products)))
+    sync_redis = get_redis_sync_client()
+
+    # Product 1 becomes the best rated and moves to store B; 10 is removed
+    moved = dict(products[0], average_rating=5.0, rating_number=5000, store="B")
+    ranking.update_rankings(sync_redis, [moved], removed_ids=[10])
+
+    assert asyncio.run(ranking.get_ranked_ids("trending"))[0] == 1
+    assert asyncio.run(ranking.get_ranked_ids("trending", "B"))[0] == 1
+    assert 1 not in asyncio.run(ranking.get_ranked_ids("trending", "A"))
+    assert 10 not in asyncio.run(ranking.get_ranked_ids("best_sellers"))
+    assert 10 not in asyncio.run(ranking.get_ranked_ids("best_sellers", "B"))
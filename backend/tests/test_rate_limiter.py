@@ -0,0 +1,64 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError
+
+from app import rate_limiter
+from app.cache import cached
+from app.rate_limiter import (
+    RateLimitExceeded,
+    enforce_rate_limit,
+    parse_limit,
+    rate_limit_exceeded_handler,
+)
+from app.utils import rate_limit
+
+
+def make_app():
+    app = FastAPI(dependencies=[Depends(enforce_rate_limit)])
+    app.exception_handler(RateLimitExceeded)(rate_limit_exceeded_handler)
+
+    @app.get("/items/{name}")
+    @rate_limit("3/minute", misses="1/minute")
+    async def get_item(name: str):
+        async def compute():
+            return name.encode()
+
+        return {"item": (await cached(f"item:{name}", compute)).decode()}
+
+    @app.get("/open")
+    async def get_open():
+        return {"ok": True}
+
+    return app
+
+
+def test_parse_limit():
+    assert parse_limit("60/minute") == (60, 60000)
+    assert parse_limit("5/seconds") == (5, 1000)
+
+
+def test_request_and_miss_budgets(fake_redis):
+    client = TestClient(make_app())
+
+    assert client.get("/items/a").status_code == 200
+    # A second miss exceeds the stricter miss budget...
+    shed = client.get("/items/b")
+    assert shed.status_code == 429
+    assert shed.json() == {"ok": False, "error": "Rate limit exceeded"}
+    assert int(shed.headers["Retry-After"]) >= 1
+    # ...while cache hits only draw on the request budget, until it runs out
+    assert client.get("/items/a").status_code == 200
+    assert client.get("/items/a").status_code == 429
+
+    # Routes without an annotation are not limited
+    assert all(client.get("/open").status_code == 200 for _ in range(5))
+
+
+def test_fails_open_without_redis(fake_redis, monkeypatch):
+    class DownRedis:
+        async def eval(self, *args):
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(rate_limiter, "get_redis_client", lambda: DownRedis())
+    client = TestClient(make_app())
+    assert all(client.get(f"/items/{i}").status_code == 200 for i in range(5))
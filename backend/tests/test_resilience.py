@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import resilience
+from app.resilience import (
+    CircuitBreaker,
+    CircuitOpen,
+    DeadlineExceeded,
+    LatencyTracker,
+    current_deadline,
+    guarded,
+    hedged,
+)
+from app.routes import products as products_route
+from app.search_backend import ResilientBackend, SearchBackend
+from backend.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "breakers", {})
+    monkeypatch.setattr(resilience, "latencies", {})
+
+
+def test_breaker_trips_on_errors_and_closes_after_a_good_probe():
+    breaker = CircuitBreaker("search", min_calls=4, error_rate=0.5, open_seconds=5)
+    for failed in [False, True, False, True]:
+        breaker.before_call()
+        breaker.record(0.01, failed)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.opened_at -= 5
+    assert breaker.before_call() is True
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record(0.01, False, probe=True)
+    assert breaker.state == "closed"
+
+
+def test_breaker_trips_on_slow_calls():
+    breaker = CircuitBreaker("embed", min_calls=3, slow_rate=0.6, slow_seconds=0.5)
+    for seconds in [0.9, 0.1, 0.8]:
+        breaker.record(seconds, False)
+    assert breaker.state == "open"
+
+
+def test_latency_tracker_p95():
+    tracker = LatencyTracker(size=100, min_samples=50)
+    for i in range(40):
+        tracker.record(i / 100)
+    assert tracker.p95() is None
+    for i in range(40, 96):
+        tracker.record(i / 100)
+    assert 0.90 < tracker.p95() < 0.91
+
+
+def test_guarded_enforces_the_request_deadline():
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        current_deadline.set(time.monotonic() + 0.05)
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await guarded("search", slow)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_hedged_returns_the_first_successful_copy():
+    calls = []
+
+    async def call():
+        calls.append(len(calls))
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    async def scenario():
+        started = time.monotonic()
+        result = await hedged(call, 0.02, "search")
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == 2
+    assert calls == [0, 1]
+    assert elapsed < 0.5
+
+
+class SlowBackend(SearchBackend):
+    async def hybrid(self, *args, **kwargs):
+        await asyncio.sleep(1)
+        return []
+
+
+def test_slow_search_answers_503_within_the_route_deadline(fake_redis, monkeypatch):
+    backend = ResilientBackend(SlowBackend())
+    monkeypatch.setattr(products_route, "get_search_backend", lambda: backend)
+    monkeypatch.setattr(products_route, "get_query_embedder", lambda: None)
+    monkeypatch.setattr(products_route.get_products, "__deadline__", 0.05)
+
+    started = time.monotonic()
+    response = client.get("/products?query=linen")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,70 @@
+import asyncio
+import gzip
+import json
+
+from starlette.requests import Request
+
+from app.response_cache import (
+    accepts_encoding,
+    cached_response,
+    dumps,
+    pack_body,
+    render,
+    unpack_body,
+)
+
+
+def make_request(accept_encoding=None):
+    headers = []
+    if accept_encoding is not None:
+        headers.append((b"accept-encoding", accept_encoding.encode()))
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+def test_dumps_is_compact():
+    assert dumps({"ok": True, "products": [1]}) == b'{"ok":true,"products":[1]}'
+
+
+def test_small_bodies_are_stored_uncompressed():
+    assert unpack_body(pack_body(b"{}")) == ("identity", "application/json", b"{}")
+
+
+def test_large_bodies_are_compressed_once_and_served_raw():
+    body = dumps({"products": [{"title": "linen shirt"}] * 200})
+    entry = pack_body(body)
+    encoding, _, stored = unpack_body(entry)
+    assert encoding == "gzip"
+
+    response = render(make_request("gzip, br"), entry)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.body == stored
+    assert gzip.decompress(response.body) == body
+
+    plain = render(make_request(), entry)
+    assert "content-encoding" not in plain.headers
+    assert plain.body == body
+
+
+def test_accepts_encoding_respects_q_zero():
+    assert accepts_encoding(make_request("gzip;q=0.5"), "gzip")
+    assert not accepts_encoding(make_request("gzip;q=0"), "gzip")
+    assert not accepts_encoding(make_request("br"), "gzip")
+
+
+def test_cached_response_serializes_only_on_fill(fake_redis):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return {"ok": True, "products": [{"product_id": 1}]}
+
+    async def scenario():
+        first = await cached_response(make_request(), "query:x", compute)
+        second = await cached_response(make_request(), "query:x", compute)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert calls == 1
+    assert first.body == second.body
+    assert json.loads(second.body)["products"] == [{"product_id": 1}]
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+
+from app.embedder import QueryEmbedder
+from app.semantic_cache import SemanticCache, canonical_query, stem
+
+
+class TableEmbedder(QueryEmbedder):
+    name = "table"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = []
+
+    async def embed(self, text):
+        self.calls.append(text)
+        return self.vectors[text]
+
+
+def test_canonical_query_folds_case_punctuation_plurals_and_filler():
+    assert canonical_query("Beach Outfits!") == "beach outfit"
+    assert canonical_query("outfit for the beach") == "outfit beach"
+    assert canonical_query("Men's T-Shirts") == "men t shirt"
+    assert canonical_query("the") == "the"
+    assert [stem(w) for w in ["dresses", "puppies", "glass", "bus", "boxes"]] == [
+        "dress",
+        "puppy",
+        "glass",
+        "bus",
+        "box",
+    ]
+
+
+def test_resolve_reuses_the_most_similar_recent_query():
+    embedder = TableEmbedder(
+        {
+            "beach outfit": [1.0, 0.0, 0.0],
+            "outfit for the beach": [0.98, 0.2, 0.0],
+            "winter coat": [0.0, 0.0, 2.0],
+        }
+    )
+    cache = SemanticCache(capacity=8, threshold=0.95)
+
+    async def scenario():
+        return [
+            await cache.resolve(query, embedder)
+            for query in [
+                "beach outfit",
+                "outfit for the beach",
+                "winter coat",
+                "Beach outfits",
+            ]
+        ]
+
+    first, similar, other, recent = asyncio.run(scenario())
+    assert first == ("beach outfit", "beach outfit", [1.0, 0.0, 0.0])
+    assert similar == ("beach outfit", "beach outfit", None)
+    assert other[:2] == ("winter coat", "winter coat")
+    assert recent == ("beach outfit", "beach outfit", None)
+    # Same canonical form: no embedding needed
+    assert embedder.calls == ["beach outfit", "outfit for the beach", "winter coat"]
+    assert cache.stats == {"recent": 1, "similar": 1, "misses": 2, "evictions": 0}
+
+
+def test_add_evicts_the_least_recently_used_query():
+    cache = SemanticCache(capacity=2, threshold=0.95)
+    cache.add("a", "a", np.array([1.0, 0.0], dtype=np.float32))
+    cache.add("b", "b", np.array([0.0, 1.0], dtype=np.float32))
+    cache.get("a")
+    cache.add("c", "c", np.array([0.6, 0.8], dtype=np.float32))
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == ("a", "a")
+    slot, similarity = cache.nearest(np.array([0.6, 0.8], dtype=np.float32))
+    assert cache.entries[slot] == ("c", "c")
+    assert abs(similarity - 1.0) < 1e-6
+    assert cache.stats["evictions"] == 1
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from tests.test_vector_engine import PRODUCTS
+
+from app import similar
+from app.embedder import HashEmbedder
+from app.routes import products as products_route
+from app.search_backend import LocalVectorBackend
+from app.utils import get_redis_binary_client, get_redis_sync_client
+from app.vector_engine import LocalIndexWriter
+from backend.main import app
+
+
+@pytest.fixture
+def backend(tmp_path, fake_redis, monkeypatch):
+    embedder = HashEmbedder(dim=64)
+    writer = LocalIndexWriter(str(tmp_path), dim=64)
+    for product in PRODUCTS:
+        writer.add(product, embedder.embed_sync(product["title"]))
+    writer.close()
+    local = LocalVectorBackend(str(tmp_path))
+    monkeypatch.setattr(similar, "get_search_backend", lambda: local)
+    monkeypatch.setattr(products_route, "get_search_backend", lambda: local)
+    return local
+
+
+def test_full_build_then_only_stale_lists(backend):
+    assert asyncio.run(similar.refresh_similar()) == 3
+    neighbors = asyncio.run(similar.get_similar_ids(1))
+    assert sorted(neighbors) == [2, 3]
+    assert len(asyncio.run(similar.get_similar_ids(1, limit=1))) == 1
+
+    # Nothing stale: no work until ingestion marks products
+    assert asyncio.run(similar.refresh_similar()) == 0
+    redis = get_redis_binary_client()
+    asyncio.run(redis.set(similar.similar_key(99), b"\x01\x00\x00\x00"))
+    similar.mark_stale(get_redis_sync_client(), [2, 99])
+    assert asyncio.run(similar.refresh_similar()) == 1
+    assert asyncio.run(similar.get_similar_ids(99)) == []
+
+
+def test_similar_endpoint_serves_precomputed_lists(backend):
+    client = TestClient(app)
+    assert client.get("/products/1/similar").json() == {"ok": True, "products": []}
+
+    asyncio.run(similar.build_similar())
+    response = client.get("/products/1/similar?limit=2").json()
+    assert response["ok"] is True
+    assert {p["product_id"] for p in response["products"]} == {2, 3}
+    assert client.get("/products/1/similar?limit=500").status_code == 422
@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from tests.test_vector_engine import PRODUCTS
+
+from app.ingestion import Manifest, content_hash, indexed_properties, product_uuid
+from app.snapshot import export_snapshot, resolve_snapshot, restore_snapshot
+
+
+class FakeCollection:
+    def __init__(self, products=()):
+        self.objects = {
+            product_uuid(p["product_id"]): (p, [float(p["product_id"]), 1.0])
+            for p in products
+        }
+        self.batch = self
+        self.failed_objects = []
+
+    @contextmanager
+    def dynamic(self):
+        yield self
+
+    def add_object(self, properties, uuid, vector):
+        self.objects[uuid] = (properties, vector)
+
+    def iterator(self, include_vector):
+        for props, vector in self.objects.values():
+            yield SimpleNamespace(properties=props, vector={"default": vector})
+
+
+def test_snapshot_round_trip(tmp_path):
+    root = str(tmp_path / "snapshots")
+    assert resolve_snapshot(root) is None
+
+    path = export_snapshot(FakeCollection(PRODUCTS), root)
+    assert resolve_snapshot(root) == path
+
+    restored = FakeCollection()
+    manifest = Manifest(str(tmp_path / "manifest.json.gz"))
+    version = restore_snapshot(restored, resolve_snapshot(root), manifest)
+    assert version == path.rsplit("/", 1)[-1]
+
+    for product in PRODUCTS:
+        props, vector = restored.objects[product_uuid(product["product_id"])]
+        assert props == indexed_properties(product)
+        # Stored vectors are L2-normalized, which cosine distance ignores
+        norm = (product["product_id"] ** 2 + 1) ** 0.5
+        assert vector == pytest.approx([product["product_id"] / norm, 1 / norm])
+    # Delta ingestion can pick up from the restored catalog
+    assert manifest.load() == {
+        p["parent_asin"]: (p["product_id"], content_hash(p)) for p in PRODUCTS
+    }
+    assert manifest.next_id == 4
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app import query_log, suggest
+from app.suggest import SuggestIndex, write_suggest_index
+from backend.main import app
+from benchmarks.fakes import FakeProductBackend
+
+ENTRIES = [
+    ("Linen Beach Shirt", "product", 3.0, 1),
+    ("linen dress", "product", 5.0, 2),
+    ("Linen", "store", 1.0, -1),
+    ("linen shirt", "query", 9.0, -1),
+    ("LINEN SHIRT", "product", 1.0, 3),
+    ("wool coat", "product", 4.0, 4),
+]
+
+
+def test_prefix_lookup_ranks_by_weight(tmp_path):
+    write_suggest_index(str(tmp_path), ENTRIES)
+    index = SuggestIndex(str(tmp_path))
+
+    # Equal keys keep the heaviest entry
+    assert index.meta["count"] == 5
+    assert index.suggest("  LINEN s", limit=5) == [
+        {"text": "linen shirt", "type": "query"}
+    ]
+    assert [s["text"] for s in index.suggest("lin")] == [
+        "linen shirt",
+        "linen dress",
+        "Linen Beach Shirt",
+        "Linen",
+    ]
+    assert index.suggest("wool")[0] == {
+        "text": "wool coat",
+        "type": "product",
+        "product_id": 4,
+    }
+    assert index.suggest("x") == [] and index.suggest(" ") == []
+
+
+def test_wide_prefixes_are_precomputed(tmp_path, monkeypatch):
+    entries = [(f"shirt {i:04d}", "product", float(i % 97), i) for i in range(3000)]
+    monkeypatch.setattr(suggest, "SUGGEST_SCAN_LIMIT", 100)
+    write_suggest_index(str(tmp_path), entries)
+    index = SuggestIndex(str(tmp_path))
+    assert "73" in index.prefixes  # "s"
+
+    expected = suggest.top_rows(index.weights, 0, 3000, 10)
+    assert [s["product_id"] for s in index.suggest("s")] == [
+        int(index.product_ids[row]) for row in expected
+    ]
+    started = time.perf_counter()
+    for _ in range(1000):
+        index.suggest("shirt 1")
+    assert time.perf_counter() - started < 1.0
+
+
+def test_built_from_catalog_and_query_log(tmp_path, fake_redis, monkeypatch):
+    monkeypatch.setattr(suggest, "suggest_index", None)
+    monkeypatch.setattr(
+        suggest, "get_search_backend", lambda: FakeProductBackend(50, latency=0)
+    )
+    query_log.record("query", "zzz popular query")
+    asyncio.run(query_log.flush())
+
+    client = TestClient(app)
+    assert client.get("/suggest?prefix=zzz").json() == {"ok": True, "suggestions": []}
+
+    root = str(tmp_path / "suggest")
+    index = asyncio.run(suggest.refresh_suggest_index(root))
+    assert not suggest.needs_rebuild(index)
+    assert asyncio.run(suggest.refresh_suggest_index(root)) is index
+
+    response = client.get("/suggest?prefix=ZZZ").json()
+    assert response["suggestions"] == [{"text": "zzz popular query", "type": "query"}]
+    stores = client.get("/suggest?prefix=carh").json()["suggestions"]
+    assert stores[0] == {"text": "Carhartt", "type": "store"}
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.embedder import HashEmbedder
+from app.routes.products import build_filters
+from app.search_backend import Condition, LocalVectorBackend
+from app.vector_engine import LocalIndexWriter
+
+PRODUCTS = [
+    {
+        "product_id": 1,
+        "parent_asin": "B0001",
+        "title": "linen beach shirt",
+        "average_rating": 4.5,
+        "rating_number": 120,
+        "features": ["linen", "short sleeve"],
+        "description": "Light linen shirt for the beach",
+        "price": 25.0,
+        "store": "Sunny",
+        "details": "{}",
+        "main_hi_res_image": "a.jpg",
+    },
+    {
+        "product_id": 2,
+        "parent_asin": "B0002",
+        "title": "wool winter coat",
+        "average_rating": 4.8,
+        "rating_number": 30,
+        "features": [],
+        "description": "Warm coat",
+        "price": 120.0,
+        "store": "Nordic",
+        "details": "{}",
+        "main_hi_res_image": "b.jpg",
+    },
+    {
+        "product_id": 3,
+        "parent_asin": "B0003",
+        "title": "beach sandals",
+        "average_rating": 3.9,
+        "rating_number": 500,
+        "features": ["rubber"],
+        "description": "Sandals",
+        "price": 15.0,
+        "store": "Sunny",
+        "details": "{}",
+        "main_hi_res_image": "",
+    },
+]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    embedder = HashEmbedder(dim=64)
+    writer = LocalIndexWriter(str(tmp_path), dim=64)
+    for product in PRODUCTS:
+        writer.add(product, embedder.embed_sync(product["title"]))
+    writer.close()
+    return LocalVectorBackend(str(tmp_path)), embedder
+
+
+def test_near_vector_returns_closest_product_with_properties(backend):
+    backend, embedder = backend
+    vector = embedder.embed_sync("wool winter coat")
+    results = asyncio.run(backend.near_vector(vector, limit=2))
+    assert results[0] == PRODUCTS[1]
+    assert len(results) == 2
+
+
+def test_near_vector_applies_filters_and_projection(backend):
+    backend, embedder = backend
+    vector = embedder.embed_sync("wool winter coat")
+    filters = (Condition("store", "eq", "Sunny"), Condition("price", "lte", 20))
+    results = asyncio.run(
+        backend.near_vector(vector, limit=5, filters=filters, properties=["title"])
+    )
+    assert results == [{"title": "beach sandals"}]
+
+
+def test_price_bounds_skip_unpriced_products(tmp_path):
+    embedder = HashEmbedder(dim=64)
+    writer = LocalIndexWriter(str(tmp_path), dim=64)
+    for product in [*PRODUCTS, {**PRODUCTS[2], "product_id": 4, "price": -1.0}]:
+        writer.add(product, embedder.embed_sync(product["title"]))
+    writer.close()
+    backend = LocalVectorBackend(str(tmp_path))
+
+    results = asyncio.run(
+        backend.fetch_objects(
+            limit=10, filters=build_filters(max_price=30), properties=["product_id"]
+        )
+    )
+    assert sorted(p["product_id"] for p in results) == [1, 3]
+
+
+def test_fetch_by_ids_keeps_order_and_skips_unknown(backend):
+    backend, _ = backend
+    results = asyncio.run(backend.fetch_by_ids([3, 42, 1], properties=["product_id"]))
+    assert results == [{"product_id": 3}, {"product_id": 1}]
+
+
+def test_fetch_objects_sorted(backend):
+    backend, _ = backend
+    results = asyncio.run(
+        backend.fetch_objects(
+            limit=2, sort_by="rating_number", properties=["product_id"]
+        )
+    )
+    assert results == [{"product_id": 3}, {"product_id": 1}]
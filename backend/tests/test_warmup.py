@@ -0,0 +1,92 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import query_log, warmup
+from app.catalog import get_cache_warm_status, load_catalog_version
+from backend.main import app
+
+
+def test_query_log_flush_and_top(fake_redis):
+    for query in ["shoes", "shirt", "shoes", "shoes", "shirt", "hat"]:
+        query_log.record("query", query)
+
+    async def scenario():
+        await query_log.flush()
+        return await query_log.top("query", 2)
+
+    assert asyncio.run(scenario()) == ["shoes", "shirt"]
+    assert not query_log.pending["query"]
+
+
+def test_catalog_version_is_kept_until_a_new_catalog_is_ingested(
+    fake_redis, monkeypatch
+):
+    monkeypatch.setattr("app.catalog.catalog_version", "0")
+
+    async def scenario():
+        first = await load_catalog_version()
+        restarted = await load_catalog_version()
+        ingested = await load_catalog_version("source:100:100:1")
+        return first, restarted, ingested
+
+    first, restarted, ingested = asyncio.run(scenario())
+    assert first == restarted
+    assert ingested != first
+
+
+def test_warm_cache_fills_popular_entries(fake_redis, monkeypatch):
+    warmed = []
+
+    async def entry(*args):
+        warmed.append(args)
+        return b"entry"
+
+    async def failing_entry():
+        raise RuntimeError("backend down")
+
+    monkeypatch.setattr(warmup, "best_sellers_entry", failing_entry)
+    monkeypatch.setattr(warmup, "trending_entry", entry)
+    monkeypatch.setattr(warmup, "search_entry", entry)
+    monkeypatch.setattr(warmup, "browse_entry", entry)
+    monkeypatch.setattr(warmup, "product_json", entry)
+    monkeypatch.setattr("app.catalog.cache_warm", False)
+    query_log.record("query", "linen shirt")
+    query_log.record("product_id", 42)
+
+    async def scenario():
+        await query_log.flush()
+        await warmup.warm_cache()
+
+    asyncio.run(scenario())
+    assert set(warmed) == {(), (None,), (42,), ("linen shirt", None)}
+    assert get_cache_warm_status()
+
+
+def test_warm_cache_replays_requested_projection(fake_redis, monkeypatch):
+    keys = []
+
+    async def entry(key, fill):
+        keys.append(key)
+        return b"identity\napplication/json\n{}"
+
+    monkeypatch.setattr("app.routes.products.cached_entry", entry)
+    monkeypatch.setattr("app.routes.products.get_query_embedder", lambda: None)
+    client = TestClient(app)
+    grid = "title,price,product_id"
+    client.get("/products", params={"query": "linen shirt", "fields": grid})
+    client.get("/products", params={"fields": grid})
+    requested = set(keys)
+    assert len(requested) == 2
+
+    async def scenario():
+        await query_log.flush()
+        keys.clear()
+        for job in await warmup.warm_jobs():
+            try:
+                await job()
+            except Exception:
+                pass
+
+    asyncio.run(scenario())
+    assert requested <= set(keys)
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+import weaviate
+
+from app.weaviate_pool import WeaviatePool
+
+
+class FakeClient:
+    def __init__(self):
+        self.ready = True
+        self.closed = False
+
+    async def is_ready(self):
+        return self.ready
+
+    async def close(self):
+        self.closed = True
+
+
+def make_pool(size=2, health_check_interval=0.0):
+    created = []
+
+    async def connect():
+        client = FakeClient()
+        created.append(client)
+        return client
+
+    pool = WeaviatePool(
+        size=size, health_check_interval=health_check_interval, connect=connect
+    )
+    return pool, created
+
+
+def test_pool_reuses_clients():
+    async def scenario():
+        pool, created = make_pool(size=2)
+        for _ in range(5):
+            async with pool.acquire():
+                pass
+        await pool.close()
+        return created
+
+    created = asyncio.run(scenario())
+    assert len(created) == 2
+    assert all(client.closed for client in created)
+
+
+def test_pool_multiplexes_concurrent_queries():
+    async def scenario():
+        pool, created = make_pool(size=2, health_check_interval=30.0)
+        in_flight = 0
+        peak = 0
+
+        async def worker():
+            nonlocal in_flight, peak
+            async with pool.acquire():
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(worker() for _ in range(200)))
+        await pool.close()
+        return peak, created
+
+    peak, created = asyncio.run(scenario())
+    assert peak == 200
+    assert len(created) == 2
+
+
+def test_pool_reconnects_unhealthy_and_broken_clients():
+    async def scenario():
+        pool, created = make_pool(size=1)
+        async with pool.acquire() as client:
+            client.ready = False
+        async with pool.acquire() as client:
+            assert client is created[1]
+        with pytest.raises(weaviate.exceptions.WeaviateConnectionError):
+            async with pool.acquire():
+                raise weaviate.exceptions.WeaviateConnectionError("gone")
+        async with pool.acquire() as client:
+            assert client is created[2]
+        await pool.close()
+        return created
+
+    created = asyncio.run(scenario())
+    assert created[0].closed and created[1].closed
+
+
+def test_pool_open_connects_every_slot():
+    async def scenario():
+        pool, created = make_pool(size=3)
+        await pool.open()
+        await pool.close()
+        return created
+
+    assert len(asyncio.run(scenario())) == 3
+
+
+def test_broken_client_is_closed_after_its_other_queries_finish():
+    async def scenario():
+        pool, created = make_pool(size=1, health_check_interval=30.0)
+        other_started, release = asyncio.Event(), asyncio.Event()
+
+        async def long_query():
+            async with pool.acquire() as client:
+                other_started.set()
+                await release.wait()
+                return client.closed
+
+        task = asyncio.ensure_future(long_query())
+        await other_started.wait()
+        with pytest.raises(weaviate.exceptions.WeaviateConnectionError):
+            async with pool.acquire():
+                raise weaviate.exceptions.WeaviateConnectionError("gone")
+        closed_mid_query = created[0].closed
+        async with pool.acquire() as client:
+            assert client is created[1]
+        release.set()
+        assert not await task
+        await pool.close()
+        return closed_mid_query, created
+
+    closed_mid_query, created = asyncio.run(scenario())
+    assert not closed_mid_query
+    assert created[0].closed
@@ -5,6 +5,9 @@ export const load = async ({ params, fetch }) => {
   console.log(productID)
 
   const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+  const similarRequest = fetch(`${BACKEND_URL}/products/${encodeURIComponent(productID)}/similar?limit=12`)
+    .then((similarRes) => (similarRes.ok ? similarRes.json() : { products: [] }))
+    .catch(() => ({ products: [] }));
   const res = await fetch(`${BACKEND_URL}/products?product_id=${encodeURIComponent(productID)}`);
 
   if (!res.ok) {
@@ -17,7 +20,9 @@ export const load = async ({ params, fetch }) => {
     throw error(404, data.error || "Product not found");
   }
 
+  const similar = await similarRequest;
   return {
-    product: data.product
+    product: data.product,
+    similar: similar.products || []
   };
 };
\ No newline at end of file
@@ -1,9 +1,16 @@
 
 import { backendReady } from "$stores/main";
 
+// Properties the product grid renders; the detail page fetches full records
+const GRID_FIELDS = "product_id,title,price,average_rating,rating_number,store,features,main_hi_res_image";
+
 export async function fetchProducts(query = "") {
     const BACKEND_URL = import.meta.env.VITE_BACKEND_URL
-    const endpoint = query ? `${BACKEND_URL}/products?query=${encodeURIComponent(query)}` : `${BACKEND_URL}/products`;
+    const params = new URLSearchParams({ fields: GRID_FIELDS });
+    if (query) {
+        params.set("query", query);
+    }
+    const endpoint = `${BACKEND_URL}/products?${params}`;
     try {
         const res = await fetch(endpoint);
         const data = await res.json();
@@ -20,6 +27,20 @@ export async function fetchProducts(query = "") {
 
 
 
+export async function fetchSuggestions(prefix) {
+    const BACKEND_URL = import.meta.env.VITE_BACKEND_URL
+    if (!prefix.trim()) {
+        return [];
+    }
+    try {
+        const res = await fetch(`${BACKEND_URL}/suggest?${new URLSearchParams({ prefix })}`);
+        const data = await res.json();
+        return data.ok ? data.suggestions : [];
+    } catch (error) {
+        return [];
+    }
+}
+
 export async function waitForBackendReady() {
     const BACKEND_URL = import.meta.env.VITE_BACKEND_URL
     const healthUrl = `${BACKEND_URL}/health`;